@@ -16,8 +16,13 @@ import astropy.table
 
 import plot3
 from variables_data_filterer import source_photometry
-from tablemate_comparisons import ukvar_spread, ukvar_periods
-from table_maker import make_megeath_class_column, megeath2012_by_ukvar
+from tablemate_comparisons import ukvar_spread, ukvar_periods, mated_ukvar
+from tablemate_script import Megeath2012
+from tablemate_core import index_secondary_by_primary
+from table_maker import make_megeath_class_column
+
+# a full table, since we .where() it below (table_maker's is a lazy view)
+megeath2012_by_ukvar = index_secondary_by_primary(mated_ukvar, Megeath2012)
 
 megeath_class_column = make_megeath_class_column()
 
@@ -10,14 +10,192 @@ same physical location.
 from __future__ import division
 
 import numpy as np
+import scipy.sparse
+from scipy.sparse.csgraph import connected_components
 
+from sky_index import pairs_within
+from photometry_index import PhotometryIndex
 
-def clone_flagger(table, max_offset=0.1):
+
+def groups_from_pairs(n_sources, pairs):
+    """
+    Builds groups out of linked pairs of sources.
+
+    The groups are the connected components of the pairs, so a chain 
+    A-B-C is one group even if A and C are not linked themselves.
+
+    Parameters
+    ----------
+    n_sources : int
+        Total number of sources.
+    pairs : np.ndarray
+        Integer array of shape (M, 2) of linked source indices.
+
+    Returns
+    -------
+    group_leader : np.ndarray of int
+        For each source, the index of the first (lowest-index) source 
+        in its group. Sources with no partners are their own leaders.
+
+    """
+
+    adjacency = scipy.sparse.coo_matrix(
+        (np.ones(len(pairs), dtype=np.int8), (pairs[:,0], pairs[:,1])),
+        shape=(n_sources, n_sources))
+
+    n_groups, labels = connected_components(adjacency, directed=False)
+
+    # the first occurrence of each label is its lowest-index member
+    unique_labels, first_member = np.unique(labels, return_index=True)
+    
+    group_leader = first_member[labels]
+
+    return group_leader
+
+
+def clone_groups(ra, dec, max_offset):
+    """
+    Groups positions that lie within `max_offset` of one another.
+
+    Every pair of sources closer than `max_offset` (in any direction, 
+    not just in Dec) is joined; see `groups_from_pairs()`.
+
+    Parameters
+    ----------
+    ra, dec : array_like
+        Coordinates of each source, in radians.
+    max_offset : float
+        Maximum separation, in radians, between two sources to be 
+        considered clones.
+
+    Returns
+    -------
+    group_leader : np.ndarray of int
+        For each source, the index of the first (lowest-index) source 
+        in its group. Sources with no clones are their own leaders.
+
+    """
+
+    pairs = pairs_within(ra, dec, max_offset)
+
+    return groups_from_pairs(len(ra), pairs)
+
+
+def lightcurve_similarity(photometry_index, sourceids_a, sourceids_b,
+                          bands='jhk', tolerance=0.001):
+    """
+    Compares the lightcurves of many pairs of stars in one batch.
+
+    Only datapoints taken at the same MEANMJDOBS in both stars (and 
+    not nulled out, i.e. with a positive magnitude) are compared.
+
+    Parameters
+    ----------
+    photometry_index : photometry_index.PhotometryIndex
+        Index into the photometry table of the stars in question.
+    sourceids_a, sourceids_b : array_like
+        SOURCEIDs of the first and second member of each pair.
+    bands : str, optional
+        Which bands to compare. Default 'jhk'.
+    tolerance : float, optional
+        Two magnitudes closer than this are counted as identical.
+        Default 0.001 mag.
+
+    Returns
+    -------
+    correlation : np.ndarray
+        Pearson correlation of each pair's lightcurves, with each band
+        centered on its own mean (NaN if undefined).
+    identical_fraction : np.ndarray
+        Fraction of shared datapoints that are identical in both stars
+        (NaN if there are no shared datapoints).
+    n_shared : np.ndarray of int
+        Number of shared datapoints, summed over `bands`.
+
+    """
+
+    data = photometry_index.data
+    n_pairs = len(sourceids_a)
+
+    rows_a, owner_a = photometry_index.rows_many(sourceids_a)
+    rows_b, owner_b = photometry_index.rows_many(sourceids_b)
+
+    # Line up all "a" and "b" datapoints by (pair, timestamp); a shared
+    # timestamp shows up as an "a" entry immediately followed by a "b".
+    rows = np.concatenate((rows_a, rows_b))
+    owner = np.concatenate((owner_a, owner_b))
+    is_b = np.concatenate((np.zeros(len(rows_a), dtype=bool),
+                           np.ones(len(rows_b), dtype=bool)))
+    times = np.asarray(data.MEANMJDOBS)[rows]
+
+    order = np.lexsort((is_b, times, owner))
+    rows, owner, is_b, times = (rows[order], owner[order], 
+                                is_b[order], times[order])
+
+    shared = ((owner[:-1] == owner[1:]) & (times[:-1] == times[1:]) &
+              ~is_b[:-1] & is_b[1:])
+    shared_a = rows[:-1][shared]
+    shared_b = rows[1:][shared]
+    shared_owner = owner[:-1][shared]
+
+    n_shared = np.zeros(n_pairs, dtype=int)
+    n_identical = np.zeros(n_pairs)
+    cov_sum = np.zeros(n_pairs)
+    var_a_sum = np.zeros(n_pairs)
+    var_b_sum = np.zeros(n_pairs)
+
+    for band in bands:
+
+        col = np.asarray(data[band.upper()+"APERMAG3"])
+
+        mag_a = col[shared_a]
+        mag_b = col[shared_b]
+
+        good = (mag_a > 0) & (mag_b > 0)
+        mag_a, mag_b, who = mag_a[good], mag_b[good], shared_owner[good]
+
+        n = np.bincount(who, minlength=n_pairs)
+        n_safe = np.maximum(n, 1)
+
+        sum_a = np.bincount(who, mag_a, minlength=n_pairs)
+        sum_b = np.bincount(who, mag_b, minlength=n_pairs)
+
+        # centered sums, so that each band contributes its own 
+        # variations rather than its offset from the other bands
+        cov_sum += (np.bincount(who, mag_a*mag_b, minlength=n_pairs) - 
+                    sum_a*sum_b/n_safe)
+        var_a_sum += (np.bincount(who, mag_a**2, minlength=n_pairs) - 
+                      sum_a**2/n_safe)
+        var_b_sum += (np.bincount(who, mag_b**2, minlength=n_pairs) - 
+                      sum_b**2/n_safe)
+
+        n_shared += n
+        n_identical += np.bincount(
+            who, (np.abs(mag_a - mag_b) < tolerance).astype(float), 
+            minlength=n_pairs)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correlation = cov_sum / np.sqrt(var_a_sum * var_b_sum)
+        identical_fraction = n_identical / n_shared
+
+    return correlation, identical_fraction, n_shared
+
+
+def clone_flagger(table, max_offset=0.1, photometry=None, 
+                  min_correlation=0.9, min_identical_fraction=0.5,
+                  min_shared=10):
     """
     Flags which sources in a table are clones of a previous source.
 
     Returns a version `table`, sorted by RA, with a new `clone` column.
 
+    If `photometry` is given, each pair of sources within `max_offset`
+    is only treated as a clone pair if their lightcurves agree too 
+    (see `lightcurve_similarity()`): they must share at least 
+    `min_shared` datapoints, and either at least `min_identical_fraction`
+    of those must be identical or their correlation must be at least
+    `min_correlation`. This allows a looser `max_offset`.
+
     Parameters
     ----------
     table : atpy.Table
@@ -26,6 +204,15 @@ def clone_flagger(table, max_offset=0.1):
     max_offset : float, optional
         Maximum separation, in arcseconds, between two sources to be 
         considered "clones". Default 0.1.
+    photometry : atpy.Table or photometry_index.PhotometryIndex, optional
+        Photometry data for the sources in `table`. If None (default),
+        clones are identified by position alone.
+    min_correlation : float, optional
+        Default 0.9.
+    min_identical_fraction : float, optional
+        Default 0.5.
+    min_shared : int, optional
+        Default 10.
 
     Returns
     -------
@@ -42,18 +229,30 @@ def clone_flagger(table, max_offset=0.1):
     # convert max_offset to radians
     max_offsetr = np.radians(max_offset / 3600)
 
-    clone = np.zeros(len(ft),dtype=np.int64)
+    pairs = pairs_within(ft.RA, ft.DEC, max_offsetr)
+
+    if photometry is not None and len(pairs) > 0:
+
+        if not isinstance(photometry, PhotometryIndex):
+            photometry = PhotometryIndex(photometry)
+
+        correlation, identical_fraction, n_shared = lightcurve_similarity(
+            photometry, ft.SOURCEID[pairs[:,0]], ft.SOURCEID[pairs[:,1]])
+
+        # NaN comparisons come out False, which is what we want
+        with np.errstate(invalid='ignore'):
+            confirmed = (n_shared >= min_shared) & (
+                (identical_fraction >= min_identical_fraction) |
+                (correlation >= min_correlation) )
 
-    for i in range(1,len(ft)):
+        pairs = pairs[confirmed]
 
-        # compare Dec to the previous source
-        if np.abs(ft.DEC[i] - ft.DEC[i-1]) < max_offsetr:
+    group_leader = groups_from_pairs(len(ft), pairs)
 
-            # if it's a clone, check if the previous guy was a clone
-            if clone[i-1] != 0:
-                clone[i] = clone[i-1]
-            else:
-                clone[i] = ft.SOURCEID[i-1]
+    # each clone points at the SOURCEID of the first (lowest-RA) member
+    # of its group; that first member, and every loner, gets a zero.
+    clone = np.where(group_leader == np.arange(len(ft)), 0, 
+                     ft.SOURCEID[group_leader]).astype(np.int64)
 
     # now add the clone column
     ft.add_column("clone", clone)
@@ -96,7 +295,7 @@ def clone_killer(flagged_table, invert=False):
     return decloned_table
     
     
-def clone_hunterkiller(table, max_offset=0.1, invert=False):
+def clone_hunterkiller(table, max_offset=0.1, invert=False, photometry=None):
     """
     Combines `clone_flagger()` and `clone_killer()` in one stroke.
 
@@ -111,6 +310,9 @@ def clone_hunterkiller(table, max_offset=0.1, invert=False):
     invert : bool, optional
         If True, return a table containing _only_ clones, rather than
         removing all clones.
+    photometry : atpy.Table or photometry_index.PhotometryIndex, optional
+        If given, confirm clones by their lightcurves; see 
+        `clone_flagger()`.
 
     Returns
     -------
@@ -120,7 +322,7 @@ def clone_hunterkiller(table, max_offset=0.1, invert=False):
 
     """
     
-    ft = clone_flagger(table, max_offset)
+    ft = clone_flagger(table, max_offset, photometry=photometry)
     decloned_table = clone_killer(ft)
 
     return decloned_table
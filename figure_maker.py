@@ -47,7 +47,8 @@ from helpers3 import band_cut
 import robust as rb
 
 # Let's grab IRAC colors from Megeath.
-megeath2012_by_ukvar = index_secondary_by_primary(mated_ukvar, Megeath2012)
+megeath2012_by_ukvar = index_secondary_by_primary(mated_ukvar, Megeath2012,
+                                                  lazy=True)
 
 color_dict = {}
 color_dict['disk'] = '#e41a1c' # red
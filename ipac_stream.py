@@ -0,0 +1,455 @@
+"""
+Streams big IPAC table (.tbl) files a chunk of rows at a time.
+
+The 2MASS and WISE box searches we match against come as IPAC tables,
+and reading the whole thing through atpy means holding every column of
+every row in memory at once -- fine for a one-degree box, not for a
+wider field or a deeper catalog. Here, we read only the columns we
+need, `chunk_size` rows at a time, and throw away everything that
+isn't near the primary table's footprint before matching. The best
+match for each primary star is kept as we go, so memory use depends on
+the chunk size and the primary table, not on the size of the file.
+
+`StreamingCatalog` stands in for a `TableParameters` in
+`tablemate_core.tablemater()`.
+
+"""
+
+from __future__ import division
+
+import hashlib
+import itertools
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from sky_index import (radec_to_xyz, angle_to_chord, chord_to_angle,
+                       _to_radians, _neighbors_within)
+
+
+def read_ipac_header(lines):
+    """
+    Reads the header off an iterator over the lines of an IPAC table.
+
+    Parameters
+    ----------
+    lines : iterator of str
+        Lines of the file; the header lines are consumed.
+
+    Returns
+    -------
+    columns : list of dict
+        One dict per column, with keys 'name', 'type', 'null',
+        'start' and 'end' (where its values sit in each data line).
+    data_lines : iterator of str
+        The remaining lines: the data.
+
+    """
+
+    header_rows = []
+    first_data_line = None
+
+    for line in lines:
+        if line.startswith('\\'):
+            # keywords and comments
+            continue
+        elif line.startswith('|'):
+            header_rows.append(line.rstrip('\r\n'))
+        elif line.strip() == '':
+            continue
+        else:
+            first_data_line = line
+            break
+
+    if not header_rows:
+        raise ValueError("This doesn't look like an IPAC table: no header.")
+
+    # Column boundaries are wherever the first header row has a bar.
+    bars = [i for i, character in enumerate(header_rows[0])
+            if character == '|']
+
+    def fields(row):
+        return [row[start+1:end].strip()
+                for start, end in zip(bars[:-1], bars[1:])]
+
+    names = fields(header_rows[0])
+    types = (fields(header_rows[1]) if len(header_rows) > 1
+             else ['char'] * len(names))
+    nulls = (fields(header_rows[3]) if len(header_rows) > 3
+             else ['null'] * len(names))
+
+    columns = [{'name': name, 'type': type_.lower(), 'null': null or 'null',
+                'start': start+1, 'end': end}
+               for name, type_, null, start, end
+               in zip(names, types, nulls, bars[:-1], bars[1:])]
+
+    if first_data_line is None:
+        data_lines = iter([])
+    else:
+        data_lines = itertools.chain([first_data_line], lines)
+
+    return columns, data_lines
+
+
+def _convert_column(values, column):
+    """ Turns a list of strings from one IPAC column into an array. """
+
+    values = np.array(values)
+    null = values == column['null']
+
+    if column['type'].startswith(('char', 'date')):
+        return values
+
+    if column['type'].startswith(('int', 'long')) and not null.any():
+        return values.astype(np.int64)
+
+    converted = np.nan * np.ones(len(values))
+    converted[~null] = values[~null].astype(np.float64)
+    return converted
+
+
+def iter_ipac_chunks(filename, columns=None, chunk_size=100000):
+    """
+    Reads an IPAC table `chunk_size` rows at a time.
+
+    Parameters
+    ----------
+    filename : str
+        Path to the .tbl file.
+    columns : list of str, optional
+        Which columns to read. Default None (all of them).
+    chunk_size : int, optional
+        How many rows to read at once. Default 100000.
+
+    Yields
+    ------
+    start_row : int
+        Row number (starting at zero) of the first row in this chunk.
+    chunk : dict
+        Maps each column name to an array of that column's values.
+        Numeric nulls are np.nan (and make an int column float).
+
+    """
+
+    with open(filename) as f:
+
+        header, data_lines = read_ipac_header(iter(f))
+
+        if columns is None:
+            wanted = header
+        else:
+            by_name = dict((column['name'], column) for column in header)
+            try:
+                wanted = [by_name[name] for name in columns]
+            except KeyError, e:
+                raise KeyError("No column %s in %s" % (e, filename))
+
+        start_row = 0
+
+        while True:
+            lines = list(itertools.islice(data_lines, chunk_size))
+            if not lines:
+                break
+
+            chunk = {}
+            for column in wanted:
+                start, end = column['start'], column['end']
+                chunk[column['name']] = _convert_column(
+                    [line[start:end].strip() for line in lines], column)
+
+            yield start_row, chunk
+
+            start_row += len(lines)
+
+
+def footprint_cap(xyz, padding):
+    """
+    A spherical cap around a set of positions, widened by `padding`.
+
+    Parameters
+    ----------
+    xyz : np.ndarray
+        Unit vectors of shape (N, 3).
+    padding : float
+        Extra radius, in radians.
+
+    Returns
+    -------
+    center : np.ndarray or None
+        Unit vector at the middle of the cap (None if the cap is the
+        whole sky).
+    max_chord : float
+        Chord radius of the cap.
+
+    """
+
+    center = xyz.mean(axis=0)
+    length = np.sqrt((center**2).sum())
+
+    if len(xyz) == 0 or length < 1e-8:
+        return None, 2.
+
+    center = center / length
+
+    radius = chord_to_angle(np.sqrt(((xyz - center)**2).sum(axis=1)).max())
+
+    if radius + padding >= np.pi:
+        return None, 2.
+
+    return center, float(angle_to_chord(radius + padding))
+
+
+def stream_nearest_match_xyz(xyz, chunks, max_match):
+    """
+    Matches primary positions to a catalog that arrives in chunks.
+
+    For every chunk, the rows outside the primary's footprint (plus
+    `max_match`) are dropped, the rest are checked against a tree of
+    the primary positions, and each primary position's two nearest
+    candidates so far are updated.
+
+    Parameters
+    ----------
+    xyz : np.ndarray
+        Unit vectors of the primary positions, shape (N, 3).
+    chunks : iterable of (int, np.ndarray, np.ndarray)
+        Each chunk's first row number, RA and Dec (in radians).
+    max_match : float
+        Largest allowed separation, in arcseconds.
+
+    Returns
+    -------
+    match_index, separation, n_candidates, second_separation
+        Just like `sky_index.nearest_match_xyz()` with
+        `return_diagnostics`; `match_index` counts rows from the
+        start of the catalog.
+
+    """
+
+    n_primary = len(xyz)
+
+    max_angle = np.radians(max_match / 3600)
+    max_chord = angle_to_chord(max_angle)
+
+    center, cap_chord = footprint_cap(xyz, max_angle)
+    primary_tree = cKDTree(xyz)
+
+    # the nearest and second-nearest candidates so far, for each star
+    best_distance = np.inf * np.ones((n_primary, 2))
+    best_row = -np.ones(n_primary, dtype=np.int64)
+    n_candidates = np.zeros(n_primary, dtype=int)
+
+    for start_row, ra, dec in chunks:
+
+        chunk_xyz = radec_to_xyz(ra, dec)
+        rows = start_row + np.arange(len(chunk_xyz))
+
+        if center is not None:
+            nearby = ((chunk_xyz - center)**2).sum(axis=1) <= cap_chord**2
+            chunk_xyz, rows = chunk_xyz[nearby], rows[nearby]
+
+        if len(chunk_xyz) == 0:
+            continue
+
+        # Every (catalog row, primary star) pair within max_match
+        distance, neighbor = _neighbors_within(chunk_xyz, primary_tree,
+                                               max_chord, k=2)
+        candidate = np.isfinite(distance)
+        pair_row = rows[np.nonzero(candidate)[0]]
+        pair_primary = neighbor[candidate]
+        pair_distance = distance[candidate]
+
+        if len(pair_distance) == 0:
+            continue
+
+        n_candidates += np.bincount(pair_primary, minlength=n_primary)
+
+        # Each star's two nearest pairs in this chunk...
+        order = np.lexsort((pair_row, pair_distance, pair_primary))
+        pair_row = pair_row[order]
+        pair_primary = pair_primary[order]
+        pair_distance = pair_distance[order]
+
+        stars, first = np.unique(pair_primary, return_index=True)
+        second = first + 1
+        has_second = np.zeros(len(first), dtype=bool)
+        has_second[second < len(pair_primary)] = (
+            pair_primary[second[second < len(pair_primary)]] ==
+            stars[second < len(pair_primary)])
+
+        chunk_distance = np.inf * np.ones((len(stars), 2))
+        chunk_distance[:, 0] = pair_distance[first]
+        chunk_distance[has_second, 1] = pair_distance[second[has_second]]
+
+        # ... merged with the two nearest from earlier chunks. Ties go
+        # to the earlier row, as they would in one big query.
+        merged = np.hstack((best_distance[stars], chunk_distance))
+        merged_order = np.argsort(merged, axis=1, kind='mergesort')
+
+        new_best = merged_order[:, 0] == 2
+        best_row[stars[new_best]] = pair_row[first[new_best]]
+
+        best_distance[stars] = np.sort(merged, axis=1)[:, :2]
+
+    matched = np.isfinite(best_distance[:, 0])
+    match_index = np.where(matched, best_row, -1)
+
+    separation, second_separation = [
+        np.nan * np.ones(n_primary) for i in range(2)]
+    for arcsec, chords in ((separation, best_distance[:, 0]),
+                           (second_separation, best_distance[:, 1])):
+        finite = np.isfinite(chords)
+        arcsec[finite] = np.degrees(chord_to_angle(chords[finite])) * 3600
+
+    return match_index, separation, n_candidates, second_separation
+
+
+class StreamingCatalog(object):
+    """
+    An IPAC table too big to load, set up for matching like a table.
+
+    Takes the same arguments as `tablemate_core.TableParameters` (for
+    tables with single RA and Dec columns in decimal units), and can
+    be handed to `tablemate_core.tablemater()` as a secondary table.
+    Its rows are only ever read `chunk_size` at a time.
+
+    """
+
+    def __init__(self, data, alias, full_name,
+                 ra_cols, dec_cols, radec_fmt,
+                 name_col, max_match=1.0, chunk_size=100000):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        data : str
+            The location of the IPAC table file.
+        alias : str
+            A consise string describing the table's name.
+        full_name : str
+            The full name of the table, including the name
+            and reference of the article it came from.
+        ra_cols, dec_cols : list of str
+            Which column contains RA and DEC data, respectively.
+        radec_fmt : str
+            Units of the RA and DEC columns: decimal degrees or radians.
+        name_col : str
+            The name of the column containing names in this table.
+        max_match : float, optional
+            Largest possible match radius for this table, in arcseconds.
+            Default value: 1.0
+        chunk_size : int, optional
+            How many rows to read at a time. Default 100000.
+
+        """
+
+        if len(ra_cols) != 1 or len(dec_cols) != 1 or 'sex' in radec_fmt:
+            raise ValueError("Can only stream single-column, decimal "
+                             "RA and Dec.")
+
+        self.path = data
+        self.alias = alias
+        self.full_name = full_name
+        self.ra_cols, self.dec_cols = ra_cols, dec_cols
+        self.radec_fmt = radec_fmt
+        self.name_col = name_col
+        self.max_match = max_match
+        self.chunk_size = chunk_size
+
+        self._units = 'radians' if 'rad' in radec_fmt.lower() else 'degrees'
+
+    def radec_chunks(self):
+        """ Yields (first row, RA, Dec) for each chunk, in radians. """
+
+        ra_col, dec_col = self.ra_cols[0], self.dec_cols[0]
+
+        for start_row, chunk in iter_ipac_chunks(
+            self.path, [ra_col, dec_col], self.chunk_size):
+
+            yield (start_row, _to_radians(chunk[ra_col], self._units),
+                   _to_radians(chunk[dec_col], self._units))
+
+    def match_xyz(self, xyz, max_match=None, mode='nearest'):
+        """
+        Matches primary positions (unit vectors) to this catalog.
+
+        See `stream_nearest_match_xyz()`. Only the 'nearest' mode can
+        be done one chunk at a time.
+
+        """
+
+        if mode != 'nearest':
+            raise ValueError("Streaming catalogs only support the "
+                             "'nearest' match mode, not '%s'" % mode)
+
+        if max_match is None:
+            max_match = self.max_match
+
+        return stream_nearest_match_xyz(xyz, self.radec_chunks(),
+                                        max_match)
+
+    def names_at(self, rows):
+        """
+        Reads the names of the given rows (one more pass over the file).
+
+        Parameters
+        ----------
+        rows : array_like of int
+            Row numbers; -1 gets an empty name.
+
+        Returns
+        -------
+        names : np.ndarray
+            The `name_col` value of each row in `rows`.
+
+        """
+
+        rows = np.asarray(rows)
+        wanted = np.unique(rows[rows >= 0])
+
+        found_rows = []
+        found_names = []
+
+        for start_row, chunk in iter_ipac_chunks(
+            self.path, [self.name_col], self.chunk_size):
+
+            chunk_names = chunk[self.name_col]
+            in_chunk = wanted[(wanted >= start_row) &
+                              (wanted < start_row + len(chunk_names))]
+
+            found_rows.append(in_chunk)
+            found_names.append(chunk_names[in_chunk - start_row])
+
+        if found_names:
+            found_rows = np.concatenate(found_rows)
+            found_names = np.concatenate(found_names)
+        else:
+            found_rows = np.zeros(0, dtype=int)
+            found_names = np.zeros(0, dtype=str)
+
+        names = np.zeros(len(rows), dtype=found_names.dtype)
+        names[rows >= 0] = found_names[np.searchsorted(found_rows,
+                                                       rows[rows >= 0])]
+
+        return names
+
+    @property
+    def content_hash(self):
+        """
+        A hex digest of the file's contents (read a block at a time).
+
+        Plays the same part as `TableParameters.content_hash`.
+
+        """
+
+        if getattr(self, '_content_hash', None) is None:
+            sha = hashlib.sha1()
+            sha.update(("%s %s %s" % (self.ra_cols[0], self.dec_cols[0],
+                                      self._units)).encode('ascii'))
+            with open(self.path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(block)
+            self._content_hash = sha.hexdigest()
+
+        return self._content_hash
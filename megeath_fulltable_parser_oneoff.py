@@ -13,6 +13,7 @@ in particular,
 from __future__ import division
 
 import os
+import shutil
 import scipy.io
 
 import numpy as np
@@ -45,10 +46,169 @@ def clobber_table_write(table, filename, **kwargs):
         table.write(filename, **kwargs)
 
 
+megeath_savefile = dropbox_aux_catalogs+'spitzer_orion_survey_082112.sav'
+megeath_cache_directory = dropbox_aux_catalogs+'spitzer_orion_survey_082112_cache/'
+
+column_names = ['RA', 
+                'Dec', 
+                'J',
+                'H',
+                'K',
+                '3.6', 
+                '4.5', 
+                '5.8', 
+                '8', 
+                '24', 
+                'e_J',
+                'e_H',
+                'e_K',
+                'e_3.6', 
+                'e_4.5', 
+                'e_5.8', 
+                'e_8', 
+                'e_24']
+
+# Loaded caches, by directory, so that asking for several variants of the
+# table (as tablemate_script does) only touches the disk once.
+_loaded_caches = {}
+
+
+def _column_filename(cache_directory, i):
+    return os.path.join(cache_directory, "ctotal_%02d.npy" % i)
+
+
+def in_field(ra, dec):
+    """ Which sources fall (strictly) inside our RA, Dec bounds? """
+
+    return (ra < max_RA) & (ra > min_RA) & (dec < max_Dec) & (dec > min_Dec)
+
+
+def convert_megeath_savefile(savefile=megeath_savefile,
+                             cache_directory=megeath_cache_directory):
+    """
+    Converts the IDL save file into a columnar binary cache.
+
+    Reading the .sav with scipy.io.readsav is slow, so we do it once
+    and write every column of `ctotal` to its own .npy file, alongside
+    the `all` and `IR` index arrays. (Which sources are inside our 
+    field is worked out when rows are picked, not cached, so that 
+    changing `max_RA` and friends takes effect straight away.)
+
+    Parameters
+    ----------
+    savefile : str, optional
+        The IDL save file to convert.
+    cache_directory : str, optional
+        Where to write the cache. Created if it doesn't exist.
+
+    """
+
+    megeath_fulltable_idl = scipy.io.readsav(savefile)
+    ctotal = megeath_fulltable_idl.ctotal
+
+    # Write into a scratch directory and move it into place at the end,
+    # so an interrupted conversion never looks like a finished cache.
+    cache_directory = cache_directory.rstrip('/')
+    scratch_directory = cache_directory + '.tmp%d' % os.getpid()
+    if not os.path.exists(scratch_directory):
+        os.makedirs(scratch_directory)
+
+    for i in range(len(column_names)):
+        np.save(_column_filename(scratch_directory, i),
+                np.ascontiguousarray(ctotal[:,i]))
+
+    np.save(os.path.join(scratch_directory, "all.npy"),
+            np.asarray(megeath_fulltable_idl.all))
+    np.save(os.path.join(scratch_directory, "IR.npy"),
+            np.asarray(megeath_fulltable_idl.IR))
+
+    if os.path.exists(cache_directory):
+        shutil.rmtree(cache_directory)
+    os.rename(scratch_directory, cache_directory)
+
+
+def load_megeath_cache(savefile=megeath_savefile,
+                       cache_directory=megeath_cache_directory):
+    """
+    Loads the columnar cache of the Megeath table, making it if needed.
+
+    The cache is (re)built from `savefile` if it's missing or older
+    than the save file. Columns are memory-mapped, so only the rows
+    somebody actually asks for get read.
+
+    Returns
+    -------
+    cache : dict
+        'columns' : list of arrays, in the order of `column_names`
+        'all', 'IR' : index arrays, as in the IDL save file
+
+    """
+
+    if cache_directory in _loaded_caches:
+        return _loaded_caches[cache_directory]
+
+    marker = os.path.join(cache_directory, "IR.npy")
+    if (not os.path.exists(marker) or 
+        (os.path.exists(savefile) and 
+         os.path.getmtime(savefile) > os.path.getmtime(marker))):
+        print "Converting %s to a binary cache in %s" % (savefile, 
+                                                          cache_directory)
+        convert_megeath_savefile(savefile, cache_directory)
+
+    cache = {}
+    cache['columns'] = [np.load(_column_filename(cache_directory, i), 
+                                mmap_mode='r')
+                        for i in range(len(column_names))]
+    for key in ['all', 'IR']:
+        cache[key] = np.load(os.path.join(cache_directory, key+".npy"))
+
+    _loaded_caches[cache_directory] = cache
+
+    return cache
+
+
+def megeath_rows(cache, truncated=True, all=False, nondisks=False):
+    """
+    Which rows of the full table does a given variant keep?
+
+    Parameters are as in `get_full_megeath_table`; `cache` is what
+    `load_megeath_cache` returns. `truncated` uses the bounds as they
+    are right now.
+
+    Returns
+    -------
+    rows : array of int
+        Indices into the full table (i.e. `IDL_index` values).
+
+    """
+
+    if all and nondisks:
+        raise ValueError("`all` and `nondisks` cannot both be True! Pick one.")
+
+    if all:
+        rows = cache['all']
+    elif nondisks:
+        # setdiff(a,b) takes all elements in a that are not in b
+        rows = np.setdiff1d(cache['all'], cache['IR'])
+    else:
+        rows = np.arange(len(cache['columns'][0]))
+
+    rows = np.asarray(rows, dtype=int)
+    if truncated:
+        ra, dec = cache['columns'][0], cache['columns'][1]
+        rows = rows[in_field(ra[rows], dec[rows])]
+
+    return rows
+
+
 def get_full_megeath_table(truncated=True, all=False, nondisks=False):
     """
     Turns the Megeath table into an ATpy table.
 
+    Reads from the binary cache made by `load_megeath_cache` (which 
+    converts the IDL save file the first time through), so each 
+    variant is just a selection of rows from the same columns.
+
     Parameters
     ----------
     truncated : bool, optional (default True)
@@ -73,9 +233,9 @@ def get_full_megeath_table(truncated=True, all=False, nondisks=False):
     if all and nondisks:
         raise ValueError("`all` and `nondisks` cannot both be True! Pick one.")
 
-    # Read this guy in originally
-    megeath_fulltable_idl = scipy.io.readsav(
-        dropbox_aux_catalogs+'spitzer_orion_survey_082112.sav')
+    cache = load_megeath_cache()
+    rows = megeath_rows(cache, truncated=truncated, all=all, 
+                        nondisks=nondisks)
 
     # Make it into an ATpy table
     table = atpy.Table()
@@ -88,46 +248,12 @@ def get_full_megeath_table(truncated=True, all=False, nondisks=False):
 
     addc = table.add_column
 
-    column_names = ['RA', 
-                    'Dec', 
-                    'J',
-                    'H',
-                    'K',
-                    '3.6', 
-                    '4.5', 
-                    '5.8', 
-                    '8', 
-                    '24', 
-                    'e_J',
-                    'e_H',
-                    'e_K',
-                    'e_3.6', 
-                    'e_4.5', 
-                    'e_5.8', 
-                    'e_8', 
-                    'e_24']
-
-    addc('IDL_index', np.arange(len(megeath_fulltable_idl.ctotal[:,0])))
-
-    for column_name, i in zip(column_names, range(len(column_names))):
-        addc(column_name, megeath_fulltable_idl.ctotal[:,i])
+    addc('IDL_index', rows)
 
-    if all:
-        table = table.where(megeath_fulltable_idl.all)
+    for column_name, column in zip(column_names, cache['columns']):
+        addc(column_name, column[rows])
 
-    elif nondisks:
-        table = table.where( 
-        # setdiff(a,b) takes all elements in a that are not in b
-            np.setdiff1d(megeath_fulltable_idl.all, 
-                         megeath_fulltable_idl.IR) )
-        
-    if truncated:
-        truncated_table = table.where((table.RA < max_RA) & (table.RA > min_RA) &
-                                      (table.Dec < max_Dec) & (table.Dec > min_Dec))
-        
-        return truncated_table
-    else:
-        return table
+    return table
 
 def write_full_megeath_table(truncated=True, all=False):
     """
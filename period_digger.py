@@ -29,6 +29,69 @@ Parihar2009_periods = atpy.Table(dpath+"Parihar2009_table5.fits")
 
 RL2009_periods = atpy.Table(dpath+"RodriguezLedesma2009_table2.fits")
 
+
+class IDIndex(object):
+    """
+    Looks up which row of a table has a given ID, without scanning it.
+
+    Built once per period table. Each ID maps to the first row that 
+    has it (just like `np.where(table.ID == id)[0][0]` would find).
+    Single IDs are looked up in a dict; whole arrays of IDs at once by
+    binary search over the sorted unique IDs.
+
+    """
+
+    def __init__(self, ids):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        ids : array_like
+            The ID column of the table to index.
+
+        """
+
+        # np.unique's return_index gives the first row with each ID
+        self.keys, self.rows = np.unique(np.asarray(ids), return_index=True)
+
+        self._row_of = dict(zip(self.keys.tolist(), self.rows.tolist()))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, id):
+        """ Returns the row with ID `id`, or -1 if there isn't one. """
+
+        try:
+            return self._row_of.get(id, -1)
+        except TypeError:
+            # unhashable, e.g. a masked value: can't be in the table
+            return -1
+
+    def lookup_many(self, ids):
+        """
+        Returns the row of each ID in `ids` (-1 where there isn't one).
+
+        """
+
+        ids = np.asarray(ids)
+
+        if len(self.keys) == 0:
+            return -np.ones(len(ids), dtype=np.intp)
+
+        position = np.clip(np.searchsorted(self.keys, ids), 
+                           0, len(self.keys)-1)
+        found = self.keys[position] == ids
+
+        return np.where(found, self.rows[position], -1)
+
+
+Carpenter2001_id_index = IDIndex(Carpenter2001_periods.ID)
+YSOVAR_id_index = IDIndex(YSOVAR_periods['Source^a'])
+Parihar2009_id_index = IDIndex(Parihar2009_periods.Seq)
+RL2009_id_index = IDIndex(RL2009_periods.__H97b_)
+
 def GCVS_period_get(mated_table, primary_index, gcvs_direct=False):
     """ 
     Gets a period for an input star from the GCVS table.
@@ -111,10 +174,9 @@ def CHS01_period_get(mated_table, primary_index):
     if chs_ID == -1:
         return np.NaN
 
-    # should be unique, so [0][0] is justified, unless there's no match
-    try:
-        chs_p_index = np.where(Carpenter2001_periods.ID == chs_ID)[0][0]
-    except IndexError, e:
+    # should be unique, so the first row is justified, unless there's no match
+    chs_p_index = Carpenter2001_id_index.lookup(chs_ID)
+    if chs_p_index == -1:
         return np.NaN
 
     # grab the three periods, take the median - will probs be a safe bet
@@ -162,10 +224,9 @@ def YSOVAR_period_get(mated_table, primary_index):
     else:
         return np.NaN
 
-    # should be unique, so [0][0] is justified, unless there's no match
-    try:
-        ysovar_p_index = np.where(YSOVAR_periods['Source^a'] == ysovar_ID)[0][0]
-    except IndexError, e:
+    # should be unique, so the first row is justified, unless there's no match
+    ysovar_p_index = YSOVAR_id_index.lookup(ysovar_ID)
+    if ysovar_p_index == -1:
         return np.NaN
 
     ysovar_period = YSOVAR_periods['Period (days)'][ysovar_p_index]
@@ -254,10 +315,9 @@ def Parihar_period_get(mated_table, primary_index):
     if par_ID == -1:
         return np.NaN
 
-    # should be unique, so [0][0] is justified, unless there's no match
-    try:
-        par_p_index = np.where(Parihar2009_periods.Seq == par_ID)[0][0]
-    except IndexError, e:
+    # should be unique, so the first row is justified, unless there's no match
+    par_p_index = Parihar2009_id_index.lookup(par_ID)
+    if par_p_index == -1:
         return np.NaN
 
     # grab the three periods, take the median - will probs be a safe bet
@@ -298,10 +358,9 @@ def RL_period_get(mated_table, primary_index):
     if RL_ID == -1:
         return np.NaN
 
-    # should be unique, so [0][0] is justified, unless there's no match
-    try:
-        RL_p_index = np.where(RL2009_periods.__H97b_ == RL_ID)[0][0]
-    except IndexError, e:
+    # should be unique, so the first row is justified, unless there's no match
+    RL_p_index = RL2009_id_index.lookup(RL_ID)
+    if RL_p_index == -1:
         return np.NaN
 
     RL_period = RL2009_periods.Per[RL_p_index]
@@ -314,3 +373,182 @@ def RL_period_get(mated_table, primary_index):
 period_funcs = [GCVS_period_get, CHS01_period_get, YSOVAR_period_get,
                 Herbst_period_get, Parihar_period_get, RL_period_get]
 
+
+# The functions below do the same as the ones above, but for every star 
+# in a mated table at once. Each returns an array of periods, with 
+# np.NaN wherever the one-star version would give np.NaN (or None).
+
+def _periods_from_rows(period_column, rows):
+    """ Reads `period_column` at `rows`, or np.NaN where `rows` is -1. """
+
+    periods = np.nan * np.ones(len(rows))
+
+    found = rows != -1
+    periods[found] = np.asarray(period_column)[rows[found]]
+
+    return periods
+
+
+def GCVS_period_get_all(mated_table):
+    """
+    Gets GCVS periods for every star in a mated table.
+
+    Parameters
+    ----------
+    mated_table : atpy.Table
+        Output of tablemate_script containing desired sources.
+        Must have a GCVS index column.
+
+    Returns
+    -------
+    gcvs_periods : np.ndarray
+        The GCVS-listed Period for each star, or np.NaN.
+
+    """
+
+    return _periods_from_rows(GCVS.data.Period, 
+                              np.asarray(mated_table.GCVS_index))
+
+
+def CHS01_period_get_all(mated_table):
+    """
+    Gets Carpenter 2001 periods for every star in a mated table.
+
+    Parameters
+    ----------
+    mated_table : atpy.Table
+        Output of tablemate_script containing desired sources.
+        Must have a CHS2001 ID column.
+
+    Returns
+    -------
+    chs_periods : np.ndarray
+        The median of the CHS01-listed J, H, K periods for each star,
+        or np.NaN.
+
+    """
+
+    chs_IDs = np.asarray(mated_table.CHS2001_ID)
+
+    rows = Carpenter2001_id_index.lookup_many(chs_IDs)
+    rows[chs_IDs == -1] = -1
+
+    chs_periods = np.median([_periods_from_rows(Carpenter2001_periods.PerJ, 
+                                                rows),
+                             _periods_from_rows(Carpenter2001_periods.PerH, 
+                                                rows),
+                             _periods_from_rows(Carpenter2001_periods.PerK, 
+                                                rows)], axis=0)
+
+    # non-positive (or missing) periods don't count
+    with np.errstate(invalid='ignore'):
+        chs_periods[~(chs_periods > 0)] = np.nan
+
+    return chs_periods
+
+
+def YSOVAR_period_get_all(mated_table):
+    """
+    Gets YSOVAR periods for every star in a mated table.
+
+    Parameters
+    ----------
+    mated_table : atpy.Table
+        Output of tablemate_script containing desired sources.
+        Must have both YSOVAR ID columns.
+
+    Returns
+    -------
+    ysovar_periods : np.ndarray
+        The YSOVAR-listed Period for each star, or np.NaN.
+
+    """
+
+    ysovar_yso_IDs = np.asarray(mated_table.YSOVAR_OrionYSOs_ID)
+    ysovar_noex_IDs = np.asarray(mated_table.YSOVAR_OrionNoExcess_ID)
+
+    # the YSO table gets first dibs, like in YSOVAR_period_get()
+    ysovar_IDs = np.where(ysovar_yso_IDs != '-1', 
+                          ysovar_yso_IDs, ysovar_noex_IDs)
+
+    rows = YSOVAR_id_index.lookup_many(ysovar_IDs)
+    rows[ysovar_IDs == '-1'] = -1
+
+    return _periods_from_rows(YSOVAR_periods['Period (days)'], rows)
+
+
+def Herbst_period_get_all(mated_table):
+    """
+    Gets Herbst 2002 periods for every star in a mated table.
+
+    Parameters
+    ----------
+    mated_table : atpy.Table
+        Output of tablemate_script containing desired sources.
+        Must have a Herbst index column.
+
+    Returns
+    -------
+    herbst_periods : np.ndarray
+        The Herbst2002-listed Period for each star, or np.NaN.
+
+    """
+
+    return _periods_from_rows(Herbst2002.data.Per,
+                              np.asarray(mated_table.Herbst2002_index))
+
+
+def Parihar_period_get_all(mated_table):
+    """
+    Gets Parihar 2009 periods for every star in a mated table.
+
+    Parameters
+    ----------
+    mated_table : atpy.Table
+        Output of tablemate_script containing desired sources.
+        Must have a Parihar09 ID column.
+
+    Returns
+    -------
+    par_periods : np.ndarray
+        The Parihar09-listed Period for each star, or np.NaN.
+
+    """
+
+    par_IDs = np.asarray(mated_table.Parihar2009_ID)
+
+    rows = Parihar2009_id_index.lookup_many(par_IDs)
+    rows[par_IDs == -1] = -1
+
+    return _periods_from_rows(Parihar2009_periods.Per, rows)
+
+
+def RL_period_get_all(mated_table):
+    """
+    Gets Rodriguez-Ledesma 2009 periods for every star in a mated table.
+
+    Parameters
+    ----------
+    mated_table : atpy.Table
+        Output of tablemate_script containing desired sources.
+        Must have a Rodriguez-Ledesma09 ID column.
+
+    Returns
+    -------
+    RL_periods : np.ndarray
+        The Rodriguez-Ledesma 09-listed Period for each star, or np.NaN.
+
+    """
+
+    RL_IDs = np.asarray(mated_table.RL2009_ID)
+
+    rows = RL2009_id_index.lookup_many(RL_IDs)
+    rows[RL_IDs == -1] = -1
+
+    return _periods_from_rows(RL2009_periods.Per, rows)
+
+
+period_get_all_funcs = [GCVS_period_get_all, CHS01_period_get_all, 
+                        YSOVAR_period_get_all, Herbst_period_get_all, 
+                        Parihar_period_get_all, RL_period_get_all]
+
@@ -13,7 +13,161 @@ to a FAP of 0.0002 (0.02%).
 import numpy as np
 
 
-def periodic_selector( spread ):
+# The period-selection rules, in order of preference. Each one is
+# (reason code, band whose period must be in range and powerful, 
+#  band it must agree with -- or None for a single-band rule,
+#  band whose period we then adopt).
+# Two bands "agree" if their periods are within 5% and both powers 
+# beat 12; a band alone counts if its power beats 15.
+period_rules = [('JH', 'j', 'h', 'h'),
+                ('HK', 'h', 'k', 'h'),
+                ('JK', 'j', 'k', 'k'),
+                ('J',  'j', None, 'j'),
+                ('H',  'h', None, 'h'),
+                ('K',  'k', None, 'k')]
+
+agreement_tolerance = 0.05
+agreement_power = 12
+single_band_power = 15
+
+# The same thresholds as false-alarm probabilities, for use with the
+# bootstrap FAP columns (j_lsp_fap, ...) from periodogram.bootstrap_faps,
+# which hold for each star's own sampling rather than just one pattern.
+agreement_fap = 0.0041
+single_band_fap = 0.0002
+
+
+def period_rule_masks( spread, min_period=None, max_period=50, 
+                       period_override={}, use_fap=False ):
+    """
+    Evaluates every period-selection rule on the whole table at once.
+
+    Parameters
+    ----------
+    spread : atpy.Table
+        Table of spreadsheet info on variable stars.
+    min_period, max_period : float or None, optional
+        Periods must be strictly between these (None means no limit).
+        Defaults: no minimum, and less than 50 days.
+    period_override : dict, optional
+        Dictionary of SOURCEIDs -> forced periods; these stars pass 
+        an 'override' rule that comes before all the others.
+    use_fap : bool, optional
+        Judge peaks by their false-alarm probabilities (the *_lsp_fap
+        columns) against `agreement_fap` and `single_band_fap`, 
+        rather than by power. Default False.
+
+    Returns
+    -------
+    reasons : list of str
+        Reason code of each rule, in order.
+    masks : list of np.ndarray of bool
+        Which rows pass each rule.
+    periods : list of np.ndarray
+        The period each rule would pick, for every row.
+
+    """
+
+    s = spread
+
+    def per(band): return np.asarray(s[band+'_lsp_per'])
+
+    def significant(band, single_band):
+        if use_fap:
+            fap = np.asarray(s[band+'_lsp_fap'])
+            return fap < (single_band_fap if single_band else agreement_fap)
+        else:
+            power = np.asarray(s[band+'_lsp_pow'])
+            return power > (single_band_power if single_band 
+                            else agreement_power)
+
+    def in_range(period):
+        ok = np.ones(period.shape, dtype=bool)
+        if min_period is not None:
+            ok &= period > min_period
+        if max_period is not None:
+            ok &= period < max_period
+        return ok
+
+    reasons, masks, periods = [], [], []
+
+    if period_override:
+        override_SOURCEIDS = np.array(period_override.keys())
+        overridden = np.in1d(s.SOURCEID, override_SOURCEIDS)
+        override_period = -1.*np.ones_like(per('j'))
+        override_period[overridden] = [period_override[sid] for sid in 
+                                       np.asarray(s.SOURCEID)[overridden]]
+        reasons.append('override')
+        masks.append(overridden)
+        periods.append(override_period)
+
+    for reason, band, other_band, chosen_band in period_rules:
+        if other_band is None:
+            mask = significant(band, True) & in_range(per(band))
+        else:
+            mask = ((per(band) < per(other_band) * (1+agreement_tolerance)) &
+                    (per(band) > per(other_band) * (1-agreement_tolerance)) &
+                    in_range(per(band)) &
+                    significant(band, False) & 
+                    significant(other_band, False))
+        reasons.append(reason)
+        masks.append(mask)
+        periods.append(per(chosen_band))
+
+    return reasons, masks, periods
+
+
+def select_periods( spread, min_period=None, max_period=50, 
+                    period_override={}, use_fap=False ):
+    """
+    Picks each star's best period, and says which rule picked it.
+
+    The first rule (see `period_rules`) that a star passes decides its
+    period, just like an if/elif chain -- but done with np.select over
+    whole columns rather than star by star.
+
+    Parameters are as in `period_rule_masks`.
+
+    Returns
+    -------
+    best_period : np.ndarray
+        The chosen period, or -1 if no rule passed.
+    reason : np.ndarray of str
+        Reason code of the rule that fired ('override', 'JH', 'HK', 
+        'JK', 'J', 'H' or 'K'), or '' if none did.
+
+    """
+
+    reasons, masks, periods = period_rule_masks(
+        spread, min_period=min_period, max_period=max_period,
+        period_override=period_override, use_fap=use_fap)
+
+    period_dtype = (-1.*np.ones_like(spread.j_lsp_per)).dtype
+
+    best_period = np.select(masks, periods, default=-1.).astype(period_dtype)
+    reason = np.select(masks, [np.array(r) for r in reasons], default='')
+
+    return best_period, reason
+
+
+def _add_best_period( periodic_spread, reason_col=None, **kwargs ):
+    """ Adds "best_period" (and maybe reason) columns; see below. """
+
+    best_period, reason = select_periods( periodic_spread, **kwargs )
+
+    n_fishy = (reason == '').sum()
+    if n_fishy:
+        print "SOMETHING IS FISHY HERE: %d stars passed no rule" % n_fishy
+
+    r = periodic_spread
+    r.add_column("best_period", best_period)
+    if reason_col is not None:
+        r.add_column(reason_col, reason)
+
+    return r
+
+
+def periodic_selector( spread, use_fap=False ):
     """
     Selects real periodic variables using periodogram parameters.
 
@@ -23,6 +177,9 @@ def periodic_selector( spread ):
     ----------
     spread : atpy.Table
         Table of spreadsheet info on variable stars.
+    use_fap : bool, optional
+        Judge periodogram peaks by the *_lsp_fap columns rather than 
+        by power (see `period_rule_masks`). Default False.
 
     Returns
     -------
@@ -31,43 +188,15 @@ def periodic_selector( spread ):
     
     """
 
-    s = spread
+    best_period, reason = select_periods( spread, use_fap=use_fap )
 
-    r = s.where(
-        ( # J, H
-            (s.j_lsp_per < s.h_lsp_per * 1.05) &
-            (s.j_lsp_per > s.h_lsp_per * 0.95) &
-            (s.j_lsp_per < 50) &
-            (s.j_lsp_pow > 12) & (s.h_lsp_pow > 12) 
-            ) |
-        ( # H, K
-            (s.h_lsp_per < s.k_lsp_per * 1.05) &
-            (s.h_lsp_per > s.k_lsp_per * 0.95) &
-            (s.h_lsp_per < 50) &
-            (s.h_lsp_pow > 12) & (s.k_lsp_pow > 12) 
-            ) |
-        ( # J, K
-            (s.j_lsp_per < s.k_lsp_per * 1.05) &
-            (s.j_lsp_per > s.k_lsp_per * 0.95) &
-            (s.j_lsp_per < 50) &
-            (s.j_lsp_pow > 12) & (s.k_lsp_pow > 12) 
-            ) |
-        ( #J
-            (s.j_lsp_pow > 15) & (s.j_lsp_per < 50) 
-            ) |
-        ( #H
-            (s.h_lsp_pow > 15) & (s.h_lsp_per < 50) 
-            ) |
-        ( #K
-            (s.k_lsp_pow > 15) & (s.k_lsp_per < 50) 
-            ) 
-        )
+    r = spread.where( reason != '' )
     
     periodic_spread = r
     return periodic_spread
 
             
-def best_period( periodic_spread ):
+def best_period( periodic_spread, reason_col=None, use_fap=False ):
     """ 
     A function that chooses the best period of the six returned.
 
@@ -77,6 +206,12 @@ def best_period( periodic_spread ):
     ----------
     periodic_spread : atpy.Table
         Table containing periodic variables
+    reason_col : str, optional
+        If given, also add a column of this name saying which rule 
+        picked each period (see `select_periods`).
+    use_fap : bool, optional
+        Judge periodogram peaks by the *_lsp_fap columns rather than 
+        by power (see `period_rule_masks`). Default False.
 
     Returns
     -------
@@ -85,51 +220,15 @@ def best_period( periodic_spread ):
 
     """
 
-    best_period = -1.*np.ones_like( periodic_spread.j_lsp_per )
-
-    r = periodic_spread
-
-    for i in range(len(periodic_spread)):
-        # J, H
-        if ((r.j_lsp_per[i] < r.h_lsp_per[i] * 1.05) and
-            (r.j_lsp_per[i] > r.h_lsp_per[i] * 0.95) and
-            (r.j_lsp_per[i] < 50) and
-            (r.j_lsp_pow[i] > 12) and (r.h_lsp_pow[i] > 12)
-            ):
-            best_period[i] = r.h_lsp_per[i]
-        # H, K
-        elif ((r.h_lsp_per[i] < r.k_lsp_per[i] * 1.05) and
-              (r.h_lsp_per[i] > r.k_lsp_per[i] * 0.95) and
-              (r.h_lsp_per[i] < 50) and
-              (r.h_lsp_pow[i] > 12) and (r.k_lsp_pow[i] > 12)
-              ):
-            best_period[i] = r.h_lsp_per[i]
-        # J, K
-        elif ((r.j_lsp_per[i] < r.k_lsp_per[i] * 1.05) and
-              (r.j_lsp_per[i] > r.k_lsp_per[i] * 0.95) and
-              (r.j_lsp_per[i] < 50) and
-              (r.j_lsp_pow[i] > 12) and (r.k_lsp_pow[i] > 12)
-              ):
-            best_period[i] = r.k_lsp_per[i]
-        # J
-        elif (r.j_lsp_pow[i] > 15) and (r.j_lsp_per[i] < 50):
-            best_period[i] = r.j_lsp_per[i]
-        # H
-        elif (r.h_lsp_pow[i] > 15) and (r.h_lsp_per[i] < 50):
-            best_period[i] = r.h_lsp_per[i]
-        # K
-        elif (r.k_lsp_pow[i] > 15) and (r.k_lsp_per[i] < 50):
-            best_period[i] = r.k_lsp_per[i]
-        else:
-            print "SOMETHING IS FISHY HERE"
-
-    r.add_column("best_period", best_period)
+    r = _add_best_period( periodic_spread, reason_col=reason_col, 
+                          use_fap=use_fap )
 
     periodic_spread_updated = r
     return periodic_spread_updated
 
 
-def long_periodic_selector( spread, min_period=50, max_period=200, period_override={} ):
+def long_periodic_selector( spread, min_period=50, max_period=200, period_override={},
+                            use_fap=False ):
     """
     Selects real periodic variables using periodogram parameters.
 
@@ -142,6 +241,9 @@ def long_periodic_selector( spread, min_period=50, max_period=200, period_overri
     period_override : dict, optional
         Dictionary of SOURCEIDs -> forced periods to override the 
         usual periodic selection.
+    use_fap : bool, optional
+        Judge periodogram peaks by the *_lsp_fap columns rather than 
+        by power (see `period_rule_masks`). Default False.
 
     Returns
     -------
@@ -150,47 +252,19 @@ def long_periodic_selector( spread, min_period=50, max_period=200, period_overri
     
     """
 
-    s = spread
+    best_period, reason = select_periods( spread, min_period=min_period, 
+                                          max_period=max_period,
+                                          period_override=period_override,
+                                          use_fap=use_fap )
 
-    override_SOURCEIDS = np.array(period_override.keys())
-
-    r = s.where(
-        ( # J, H
-            (s.j_lsp_per < s.h_lsp_per * 1.05) &
-            (s.j_lsp_per > s.h_lsp_per * 0.95) &
-            (s.j_lsp_per > min_period) & (s.j_lsp_per < max_period) &
-            (s.j_lsp_pow > 12) & (s.h_lsp_pow > 12) 
-            ) |
-        ( # H, K
-            (s.h_lsp_per < s.k_lsp_per * 1.05) &
-            (s.h_lsp_per > s.k_lsp_per * 0.95) &
-            (s.h_lsp_per > min_period) & (s.h_lsp_per < max_period) &
-            (s.h_lsp_pow > 12) & (s.k_lsp_pow > 12) 
-            ) |
-        ( # J, K
-            (s.j_lsp_per < s.k_lsp_per * 1.05) &
-            (s.j_lsp_per > s.k_lsp_per * 0.95) &
-            (s.j_lsp_per > min_period) & (s.j_lsp_per < max_period) &
-            (s.j_lsp_pow > 12) & (s.k_lsp_pow > 12) 
-            ) |
-        ( #J
-            (s.j_lsp_pow > 15) & (s.j_lsp_per > min_period) & (s.j_lsp_per < max_period) 
-            ) |
-        ( #H
-            (s.h_lsp_pow > 15) & (s.h_lsp_per > min_period) & (s.h_lsp_per < max_period) 
-            ) |
-        ( #K
-            (s.k_lsp_pow > 15) & (s.k_lsp_per > min_period) & (s.k_lsp_per < max_period) 
-            ) |
-        ( # override
-            (np.in1d(s.SOURCEID, override_SOURCEIDS)))
-        )
+    r = spread.where( reason != '' )
     
     periodic_spread = r
     return periodic_spread
 
 
-def best_long_period( periodic_spread, min_period=50, max_period=200, period_override={} ):
+def best_long_period( periodic_spread, min_period=50, max_period=200, period_override={},
+                      reason_col=None, use_fap=False ):
     """ 
     A function that chooses the best period of the six returned.
 
@@ -203,6 +277,12 @@ def best_long_period( periodic_spread, min_period=50, max_period=200, period_ove
     period_override : dict, optional
         Dictionary of SOURCEIDs -> forced periods to override the 
         usual period selection.
+    reason_col : str, optional
+        If given, also add a column of this name saying which rule 
+        picked each period (see `select_periods`).
+    use_fap : bool, optional
+        Judge periodogram peaks by the *_lsp_fap columns rather than 
+        by power (see `period_rule_masks`). Default False.
 
     Returns
     -------
@@ -211,48 +291,9 @@ def best_long_period( periodic_spread, min_period=50, max_period=200, period_ove
 
     """
 
-    best_period = -1.*np.ones_like( periodic_spread.j_lsp_per )
-
-    r = periodic_spread
-
-    for i in range(len(periodic_spread)):
-        # override
-        if r.SOURCEID[i] in period_override:
-            best_period[i] = period_override[r.SOURCEID[i]]
-        # J, H
-        elif ((r.j_lsp_per[i] < r.h_lsp_per[i] * 1.05) and
-            (r.j_lsp_per[i] > r.h_lsp_per[i] * 0.95) and
-            (r.j_lsp_per[i] > min_period) and (r.j_lsp_per[i] < max_period) and
-            (r.j_lsp_pow[i] > 12) and (r.h_lsp_pow[i] > 12)
-            ):
-            best_period[i] = r.h_lsp_per[i]
-        # H, K
-        elif ((r.h_lsp_per[i] < r.k_lsp_per[i] * 1.05) and
-              (r.h_lsp_per[i] > r.k_lsp_per[i] * 0.95) and
-              (r.h_lsp_per[i] > min_period) and (r.h_lsp_per[i] < max_period) and
-              (r.h_lsp_pow[i] > 12) and (r.k_lsp_pow[i] > 12)
-              ):
-            best_period[i] = r.h_lsp_per[i]
-        # J, K
-        elif ((r.j_lsp_per[i] < r.k_lsp_per[i] * 1.05) and
-              (r.j_lsp_per[i] > r.k_lsp_per[i] * 0.95) and
-              (r.j_lsp_per[i] > min_period) and (r.j_lsp_per[i] < max_period) and
-              (r.j_lsp_pow[i] > 12) and (r.k_lsp_pow[i] > 12)
-              ):
-            best_period[i] = r.k_lsp_per[i]
-        # J
-        elif (r.j_lsp_pow[i] > 15) and (r.j_lsp_per[i] > min_period) and (r.j_lsp_per[i] < max_period):
-            best_period[i] = r.j_lsp_per[i]
-        # H
-        elif (r.h_lsp_pow[i] > 15) and (r.h_lsp_per[i] > min_period) and (r.h_lsp_per[i] < max_period):
-            best_period[i] = r.h_lsp_per[i]
-        # K
-        elif (r.k_lsp_pow[i] > 15) and (r.k_lsp_per[i] > min_period) and (r.k_lsp_per[i] < max_period):
-            best_period[i] = r.k_lsp_per[i]
-        else:
-            print "SOMETHING IS FISHY HERE"
-
-    r.add_column("best_period", best_period)
+    r = _add_best_period( periodic_spread, reason_col=reason_col,
+                          min_period=min_period, max_period=max_period,
+                          period_override=period_override, use_fap=use_fap )
 
     periodic_spread_updated = r
     return periodic_spread_updated
@@ -0,0 +1,1014 @@
+"""
+Lomb-Scargle periodograms for many stars at once.
+
+The spreadsheets' periods (`j_lsp_per`, `h_lsp_pow`, ...) come from
+spread3, which runs a periodogram for one star and one band at a time.
+Here a whole batch of stars is done together, in all three bands: each
+(star, band) is one row of a padded (rows x epochs) array, every row
+shares one evenly-spaced frequency grid, and the sines and cosines are
+stepped from one frequency to the next with the angle-addition
+recurrence instead of being recomputed. Batches are farmed out to a
+process pool, a few at a time, so memory stays bounded however many
+stars there are.
+
+Stars in the same WFCAM tile were observed at the same moments, so
+their sines and cosines are the same too. By default, stars are grouped
+by cadence (their set of timestamps), and each group's trigonometric
+basis is computed once and kept in a size-limited LRU cache
+(`TrigBasisCache`); every star and band in the group then gets its 
+periodogram from a few matrix products against that basis.
+
+`lsp_periods(..., multiband=True)` also fits all three bands at once,
+with one shared frequency but each band's own mean and amplitude (see
+`multiband_power`), for one period and power per star.
+
+`bootstrap_faps` puts false-alarm probabilities on the peaks, from 
+time-shuffled copies of the lightcurves; stars observed with the same
+timestamp pattern share one null distribution. Its default of 5000
+shuffles is the fewest that can reach periodic_selector's 
+`single_band_fap` of 0.0002 (see `false_alarm_probability`).
+
+By default periods from 2 days up are searched (`frequency_grid()`'s
+`max_frequency`); pass a higher `max_frequency` for shorter ones.
+
+The power is the usual normalized Lomb-Scargle power (Scargle 1982,
+Horne & Baliunas 1986: divided by twice the variance), the same as
+spread3's, so the 12 and 15 thresholds in periodic_selector still mean
+what they did.
+
+"""
+
+from __future__ import division
+
+import hashlib
+from collections import OrderedDict
+from multiprocessing import Pool
+
+import numpy as np
+
+from photometry_index import PhotometryIndex
+from periodic_selector import single_band_fap
+
+bands = ['j', 'h', 'k']
+
+
+def frequency_grid(baseline, max_frequency=0.5, oversampling=6):
+    """
+    An evenly-spaced frequency grid for a given time baseline.
+
+    Parameters
+    ----------
+    baseline : float
+        Time spanned by the observations, in days.
+    max_frequency : float, optional
+        Highest frequency, in 1/days. Default 0.5 (a 2-day period).
+    oversampling : int, optional
+        How many grid steps per natural frequency resolution
+        (1/baseline). Default 6.
+
+    Returns
+    -------
+    frequencies : np.ndarray
+        Frequencies in 1/days, from 1/(oversampling*baseline) upwards.
+
+    """
+
+    step = 1 / (oversampling * baseline)
+
+    return step * np.arange(1, int(max_frequency / step) + 1)
+
+
+def _grid_step(frequencies):
+    """ The spacing of an evenly-spaced grid (or an error if it isn't). """
+
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    if len(frequencies) == 1:
+        return 0.
+    step = (frequencies[-1] - frequencies[0]) / (len(frequencies) - 1)
+    if not np.allclose(np.diff(frequencies), step, rtol=1e-6, atol=0):
+        raise ValueError("Frequencies must be evenly spaced.")
+
+    return step
+
+
+def lomb_scargle(times, values, good, frequencies, reseed_every=64):
+    """
+    Normalized Lomb-Scargle power for many lightcurves at once.
+
+    Parameters
+    ----------
+    times, values : array_like, shape (R, N)
+        One lightcurve per row, padded out to a common length N.
+    good : array_like of bool, shape (R, N)
+        Which entries are real data (padding and bad points: False).
+    frequencies : array_like, shape (F,)
+        Evenly-spaced frequencies to evaluate, in 1/(units of `times`).
+    reseed_every : int, optional
+        The sines and cosines are stepped along the frequency grid by
+        recurrence, and recomputed exactly every this many steps so
+        rounding errors can't pile up. Default 64.
+
+    Returns
+    -------
+    power : np.ndarray, shape (R, F)
+        NaN for rows with fewer than 3 good points.
+
+    """
+
+    good = np.atleast_2d(np.asarray(good, dtype=bool))
+    times = np.atleast_2d(np.asarray(times, dtype=np.float64))
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+
+    weight = good.astype(np.float64)
+    n_good = weight.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(good, values, 0).sum(axis=1) / n_good
+        y = np.where(good, values - mean[:, np.newaxis], 0)
+        variance = (y**2).sum(axis=1) / (n_good - 1)
+
+    # The power doesn't care where time starts, so start each row at
+    # zero to keep the phases small (padding sits at zero too).
+    t0 = np.where(good, times, np.inf).min(axis=1)
+    t0[~np.isfinite(t0)] = 0
+    t = np.where(good, times - t0[:, np.newaxis], 0)
+
+    step_angle = 2*np.pi * _grid_step(frequencies) * t
+    cos_step, sin_step = np.cos(step_angle), np.sin(step_angle)
+
+    power = np.empty((len(t), len(frequencies)))
+
+    for k, frequency in enumerate(frequencies):
+
+        if k % reseed_every == 0:
+            angle = 2*np.pi * frequency * t
+            c, s = np.cos(angle), np.sin(angle)
+        else:
+            c, s = c*cos_step - s*sin_step, s*cos_step + c*sin_step
+
+        power[:, k] = _power_from_sums(
+            (y*c).sum(axis=1), (y*s).sum(axis=1),
+            (weight*(c*c - s*s)).sum(axis=1), 2*(weight*c*s).sum(axis=1),
+            n_good, variance)
+
+    power[n_good < 3] = np.nan
+
+    return power
+
+
+def _power_from_sums(yc, ys, c2, s2, n_good, variance):
+    """
+    The Lomb-Scargle power, from the sums over each lightcurve of
+    y*cos(wt), y*sin(wt), cos(2wt) and sin(2wt).
+
+    (The time offset tau is folded in analytically: tan(2w*tau) = s2/c2.)
+
+    """
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        h = np.hypot(c2, s2)
+        cos_2tau = np.where(h > 0, c2 / h, 1.)
+        cos_tau = np.sqrt((1 + cos_2tau) / 2)
+        sin_tau = np.sign(s2) * np.sqrt(np.clip((1 - cos_2tau) / 2, 0, 1))
+
+        yc_tau = yc*cos_tau + ys*sin_tau
+        ys_tau = ys*cos_tau - yc*sin_tau
+        cc_tau = (n_good + h) / 2
+        ss_tau = (n_good - h) / 2
+
+        power = (np.where(cc_tau > 0, yc_tau**2 / cc_tau, 0) +
+                 np.where(ss_tau > 0, ys_tau**2 / ss_tau, 0)) / (2*variance)
+
+    return power
+
+
+def best_periods(power, frequencies):
+    """
+    Each row's highest peak: its period and power.
+
+    Returns
+    -------
+    period, peak_power : np.ndarray
+        NaN for rows with no valid power.
+
+    """
+
+    power = np.atleast_2d(power)
+    valid = np.isfinite(power).any(axis=1)
+
+    peak = np.argmax(np.where(np.isfinite(power), power, -np.inf), axis=1)
+    period = np.where(valid, 1 / np.asarray(frequencies)[peak], np.nan)
+    peak_power = np.where(valid, power[np.arange(len(power)), peak], np.nan)
+
+    return period, peak_power
+
+
+def multiband_power(power, n_good):
+    """
+    Joint periodogram of several bands sharing one frequency.
+
+    Each band gets its own mean (taken out first, as in the single-band
+    periodograms) and its own sinusoid (amplitude and phase) at the
+    common frequency, and is weighted by the inverse of its variance,
+    so a band with big swings doesn't drown out the others. The
+    chi-squared reduction of that joint fit, as a fraction of the
+    chi-squared of constant-only fits, is then (VanderPlas & Ivezic
+    2015)
+
+        P = 2 * sum_b P_b / sum_b (n_b - 1)
+
+    where P_b is band b's normalized Lomb-Scargle power -- so it comes
+    straight out of the single-band sums, for nothing.
+
+    Parameters
+    ----------
+    power : array_like, shape (B, ..., F)
+        Normalized Lomb-Scargle power of each band; NaN where a band
+        has too few points (or no variance), in which case it just sits
+        the fit out, and doesn't count towards the sum of n_b - 1.
+    n_good : array_like, shape (B, ...)
+        How many good points each band has.
+
+    Returns
+    -------
+    power : np.ndarray, shape (..., F)
+        Between 0 (no better than constants) and 1 (perfect fit).
+        NaN where no band has 3 good points.
+
+    """
+
+    power = np.asarray(power, dtype=np.float64)
+    n_good = np.asarray(n_good, dtype=np.float64)
+
+    usable = np.isfinite(power)
+    counts = usable.any(axis=-1) & (n_good >= 3)
+    dof = np.where(counts, n_good - 1, 0).sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        joint = (2 * np.where(usable, power, 0).sum(axis=0) / 
+                 dof[..., np.newaxis])
+
+    joint[dof == 0] = np.nan
+
+    return joint
+
+
+def star_arrays(data, photometry_index, sourceids):
+    """
+    Pulls a batch of stars' lightcurves out as padded arrays.
+
+    Parameters
+    ----------
+    data : atpy.Table
+        Photometry table (one row per detection), with MEANMJDOBS
+        and JAPERMAG3, HAPERMAG3, KAPERMAG3 columns.
+    photometry_index : PhotometryIndex
+        Index over `data`.
+    sourceids : array_like
+        The stars in this batch.
+
+    Returns
+    -------
+    times : np.ndarray, shape (S, N)
+        Each star's epochs in time order, then padding.
+    magnitudes : dict
+        {band: np.ndarray of shape (S, N)}
+    good : dict
+        {band: np.ndarray of bool, shape (S, N)}; False for padding,
+        nulls (-9.99999e+08, as used by WSA) and NaNs.
+    present : np.ndarray of bool, shape (S, N)
+        False for padding only.
+
+    """
+
+    rows, owner = photometry_index.rows_many(sourceids)
+
+    counts = np.bincount(owner, minlength=len(sourceids))
+    block_starts = np.cumsum(counts) - counts
+    within = np.arange(len(rows)) - block_starts[owner]
+    shape = (len(sourceids), max(counts.max() if len(counts) else 0, 1))
+
+    present = np.zeros(shape, dtype=bool)
+    present[owner, within] = True
+
+    times = np.zeros(shape)
+    times[owner, within] = np.asarray(data.MEANMJDOBS)[rows]
+
+    # Put each star's epochs in time order (padding last), so that 
+    # stars with the same cadence line up column for column.
+    time_order = np.argsort(np.where(present, times, np.inf), axis=1,
+                            kind='mergesort')
+    times = np.take_along_axis(times, time_order, axis=1)
+
+    magnitudes = {}
+    good = {}
+    for band in bands:
+        magnitude = np.zeros(shape)
+        magnitude[owner, within] = np.asarray(
+            data[band.upper()+"APERMAG3"])[rows]
+        magnitude = np.take_along_axis(magnitude, time_order, axis=1)
+        with np.errstate(invalid='ignore'):
+            good[band] = (np.take_along_axis(present, time_order, axis=1) &
+                          np.isfinite(magnitude) & (magnitude > 0))
+        magnitudes[band] = magnitude
+
+    present = np.take_along_axis(present, time_order, axis=1)
+
+    return times, magnitudes, good, present
+
+
+def cadence_key(times):
+    """ A name for a cadence: a digest of its epochs. """
+
+    return hashlib.sha1(
+        np.ascontiguousarray(times, dtype=np.float64).tobytes()).hexdigest()
+
+
+class CadenceGrouper(object):
+    """
+    Sorts stars, one at a time, into groups with (nearly) the same epochs.
+
+    Two stars share a cadence if they have the same number of epochs
+    and each pair of epochs agrees to within `tolerance` days. Each 
+    group is named (see `cadence_key()`) after the first star put in it.
+
+    """
+
+    def __init__(self, tolerance=1e-4):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        tolerance : float, optional
+            In days. Default 1e-4 (under ten seconds: at 0.5/day, 
+            that's a phase error of 3e-4 radians at most).
+
+        """
+
+        self.tolerance = tolerance
+
+        # {number of epochs: (the groups' first stars' epochs, their keys)}
+        self._representatives = {}
+
+    def key(self, times):
+        """ The cadence key of the group that `times` (in order) joins. """
+
+        times = np.asarray(times, dtype=np.float64)
+        stacked, group_keys = self._representatives.get(len(times), 
+                                                        (None, []))
+
+        if stacked is not None:
+            mismatch = np.abs(stacked - times).max(axis=1)
+            closest = np.argmin(mismatch)
+            if mismatch[closest] <= self.tolerance:
+                return group_keys[closest]
+
+        key = cadence_key(times)
+        if stacked is None:
+            stacked = times[np.newaxis]
+        else:
+            stacked = np.vstack([stacked, times])
+        self._representatives[len(times)] = (stacked, group_keys + [key])
+
+        return key
+
+
+def cadence_groups(star_times, tolerance=1e-4):
+    """
+    Sorts stars into groups with (nearly) the same epochs.
+
+    Parameters
+    ----------
+    star_times : list of array_like
+        Each star's epochs, in time order.
+    tolerance : float, optional
+        In days; see `CadenceGrouper`. Default 1e-4.
+
+    Returns
+    -------
+    keys : list of str
+        The cadence key of each star's group.
+
+    """
+
+    grouper = CadenceGrouper(tolerance)
+
+    return [grouper.key(times) for times in star_times]
+
+
+class TrigBasisCache(object):
+    """
+    A size-limited cache of trigonometric bases, one per cadence.
+
+    A basis is cos(wt), sin(wt), cos(2wt) and sin(2wt) for every 
+    epoch t of one cadence and every frequency w of one grid: four
+    (epochs x frequencies) arrays. When the cache holds more than 
+    `max_bytes` of them, the least recently used go first.
+
+    """
+
+    def __init__(self, max_bytes=256*2**20):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        max_bytes : int, optional
+            Memory to spend on bases. Default 256 MB. (The most recent 
+            basis is always kept, even if it alone is bigger.)
+
+        """
+
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._bases = OrderedDict()
+
+    def __len__(self):
+        return len(self._bases)
+
+    def clear(self):
+        self._bases.clear()
+        self.nbytes = 0
+
+    def basis(self, times, frequencies, key=None):
+        """
+        The basis for these epochs and frequencies, made if need be.
+
+        Parameters
+        ----------
+        times : array_like, shape (N,)
+            The epochs.
+        frequencies : array_like, shape (F,)
+            The frequency grid.
+        key : str, optional
+            The cadence key of `times` (see `cadence_groups()`), if 
+            it's known. Stars with near-identical epochs share a key, 
+            and so share whichever of their bases was made first.
+
+        Returns
+        -------
+        cos_wt, sin_wt, cos_2wt, sin_2wt : np.ndarray, shape (N, F)
+
+        """
+
+        times = np.asarray(times, dtype=np.float64)
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+
+        if key is None:
+            key = cadence_key(times)
+        key = hashlib.sha1(key.encode('ascii') + 
+                           frequencies.tobytes()).hexdigest()
+
+        if key in self._bases:
+            self.hits += 1
+            basis = self._bases.pop(key)
+            self._bases[key] = basis
+            return basis
+
+        self.misses += 1
+
+        angle = 2*np.pi * np.outer(times - times.min(), frequencies)
+        cos_wt, sin_wt = np.cos(angle), np.sin(angle)
+        basis = (cos_wt, sin_wt, cos_wt**2 - sin_wt**2, 2*cos_wt*sin_wt)
+
+        self._bases[key] = basis
+        self.nbytes += sum(array.nbytes for array in basis)
+        while self.nbytes > self.max_bytes and len(self._bases) > 1:
+            _, old_basis = self._bases.popitem(last=False)
+            self.nbytes -= sum(array.nbytes for array in old_basis)
+
+        return basis
+
+
+# Each process keeps its own.
+trig_basis_cache = TrigBasisCache()
+
+
+def lomb_scargle_shared(times, values, good, frequencies, cache=None, 
+                        key=None):
+    """
+    Like `lomb_scargle()`, for many lightcurves sharing one cadence.
+
+    Every row is sampled at the same `times` (bad points are just 
+    marked in `good`), so the sums that make up the periodogram are 
+    matrix products against one trigonometric basis, which comes from
+    (and goes into) `cache`.
+
+    Parameters
+    ----------
+    times : array_like, shape (N,)
+        The shared epochs.
+    values, good : array_like, shape (R, N)
+        As in `lomb_scargle()`.
+    frequencies : array_like, shape (F,)
+        Frequencies to evaluate; needn't be evenly spaced here.
+    cache : TrigBasisCache, optional
+        Default: this module's `trig_basis_cache`.
+    key : str, optional
+        Cadence key of `times`, if known.
+
+    Returns
+    -------
+    power : np.ndarray, shape (R, F)
+
+    """
+
+    if cache is None:
+        cache = trig_basis_cache
+
+    good = np.atleast_2d(np.asarray(good, dtype=bool))
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+
+    weight = good.astype(np.float64)
+    n_good = weight.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(good, values, 0).sum(axis=1) / n_good
+        y = np.where(good, values - mean[:, np.newaxis], 0)
+        variance = (y**2).sum(axis=1) / (n_good - 1)
+
+    cos_wt, sin_wt, cos_2wt, sin_2wt = cache.basis(times, frequencies, key)
+
+    power = _power_from_sums(np.dot(y, cos_wt), np.dot(y, sin_wt),
+                             np.dot(weight, cos_2wt), np.dot(weight, sin_2wt),
+                             n_good[:, np.newaxis], variance[:, np.newaxis])
+
+    power[n_good < 3] = np.nan
+
+    return power
+
+
+def _periodogram_job(job):
+    """
+    Best period and power in each band for one batch of stars (and,
+    if asked, in all bands together).
+
+    Lives at module level (and takes plain arrays) so that it can be
+    shipped off to a process pool.
+
+    """
+
+    (times, magnitudes, good, present, frequencies, cadence_keys,
+     multiband) = job
+
+    n_stars = len(times)
+
+    if cadence_keys is None:
+        power = lomb_scargle(np.vstack([times] * len(bands)),
+                             np.vstack([magnitudes[band] for band in bands]),
+                             np.vstack([good[band] for band in bands]),
+                             frequencies)
+    else:
+        # rows are band-major: all the J rows, then H, then K
+        power = np.empty((len(bands) * n_stars, len(frequencies)))
+        groups = OrderedDict()
+        for star, key in enumerate(cadence_keys):
+            groups.setdefault(key, []).append(star)
+        for key, stars in groups.items():
+            stars = np.array(stars)
+            n_epochs = present[stars[0]].sum()
+            rows = np.concatenate([stars + i*n_stars 
+                                   for i in range(len(bands))])
+            if n_epochs < 3:
+                # (e.g. SOURCEIDs with no rows in the table at all)
+                power[rows] = np.nan
+                continue
+            power[rows] = lomb_scargle_shared(
+                times[stars[0], :n_epochs],
+                np.vstack([magnitudes[band][stars, :n_epochs] 
+                           for band in bands]),
+                np.vstack([good[band][stars, :n_epochs] for band in bands]),
+                frequencies, key=key)
+
+    period, peak_power = best_periods(power, frequencies)
+    result = (period.reshape(len(bands), n_stars),
+              peak_power.reshape(len(bands), n_stars))
+
+    if multiband:
+        n_good = np.array([good[band].sum(axis=1) for band in bands])
+        joint = multiband_power(
+            power.reshape(len(bands), n_stars, len(frequencies)), n_good)
+        result += best_periods(joint, frequencies)
+
+    return result
+
+
+def _cadence_order(data, photometry_index, sourceids, tolerance=1e-4):
+    """
+    An ordering of `sourceids` that puts equal cadences together,
+    and the cadence key of each star in that order.
+
+    """
+
+    if len(sourceids) == 0:
+        return np.arange(0), []
+
+    rows, owner = photometry_index.rows_many(sourceids)
+    times = np.asarray(data.MEANMJDOBS)[rows]
+
+    # each star's epochs in time order, star after star
+    time_order = np.lexsort((times, owner))
+    counts = np.bincount(owner, minlength=len(sourceids))
+    star_times = np.split(times[time_order], np.cumsum(counts)[:-1])
+
+    keys = cadence_groups(star_times, tolerance)
+
+    key_ids = {}
+    star_key_ids = [key_ids.setdefault(key, len(key_ids)) for key in keys]
+    order = np.argsort(star_key_ids, kind='mergesort')
+
+    return order, [keys[i] for i in order]
+
+
+def _windows(iterable, size):
+    """ Groups an iterable into lists of (at most) `size` items. """
+
+    window = []
+    for item in iterable:
+        window.append(item)
+        if len(window) == size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+
+def lsp_periods(data, sourceids=None, frequencies=None, batch_size=250,
+                n_workers=1, photometry_index=None, share_basis=True,
+                cadence_tolerance=1e-4, multiband=False, 
+                max_frequency=0.5):
+    """
+    Lomb-Scargle periods and powers for many stars, in all three bands.
+
+    Parameters
+    ----------
+    data : atpy.Table
+        Photometry table (one row per detection).
+    sourceids : array_like, optional
+        Which stars to do. Default: every star in `data`.
+    frequencies : array_like, optional
+        An evenly-spaced frequency grid (1/days), shared by all stars.
+        Default: `frequency_grid()` over the whole table's baseline,
+        up to `max_frequency`.
+    batch_size : int, optional
+        How many stars to do at once. Each batch holds arrays of
+        3*batch_size x (number of frequencies), so this bounds memory.
+        Default 250.
+    n_workers : int, optional
+        How many processes to run batches on. Default 1 (no pool).
+    photometry_index : PhotometryIndex, optional
+        An index over `data`, if you already have one.
+    share_basis : bool, optional
+        Group stars by cadence and compute each group's sines and 
+        cosines once (see `TrigBasisCache`)? Stars are then done in 
+        order of cadence, so that each group lands in as few batches 
+        as possible. Default True. If False, every (star, band) row 
+        gets its own trig recurrence.
+    cadence_tolerance : float, optional
+        Stars whose epochs agree to within this many days count as 
+        having the same cadence. Default 1e-4.
+    multiband : bool, optional
+        Also do the joint J/H/K periodogram (`multiband_power`), 
+        from the same sums as the single-band ones? Default False.
+    max_frequency : float, optional
+        Highest frequency of the default grid, in 1/days. Default 0.5:
+        periods shorter than 2 days aren't searched, so a star whose 
+        spread3 period is under 2 days gets an alias (or noise) here. 
+        Raise it to look for shorter periods, at the cost of a 
+        proportionally bigger grid. Ignored if `frequencies` is given.
+
+    Returns
+    -------
+    periods : np.recarray
+        One row per star, with columns SOURCEID, j_lsp_per, j_lsp_pow,
+        h_lsp_per, h_lsp_pow, k_lsp_per, k_lsp_pow (named as in the
+        spreadsheets, so periodic_selector.select_periods() and 
+        period_rule_masks() take it as it is; periodic_selector() and 
+        the other functions that call `.where` want it in an 
+        atpy.Table first).
+        Periods are in days; NaN where a band has under 3 good points.
+        With `multiband`, also multiband_lsp_per and multiband_lsp_pow
+        (the latter between 0 and 1, so not on the single-band scale).
+
+    """
+
+    if photometry_index is None:
+        photometry_index = PhotometryIndex(data)
+    if sourceids is None:
+        sourceids = photometry_index.sourceids
+    sourceids = np.asarray(sourceids)
+
+    if frequencies is None:
+        mjd = np.asarray(data.MEANMJDOBS)
+        frequencies = frequency_grid(mjd.max() - mjd.min(), 
+                                     max_frequency=max_frequency)
+
+    if share_basis:
+        star_order, star_keys = _cadence_order(
+            data, photometry_index, sourceids, cadence_tolerance)
+    else:
+        star_order = np.arange(len(sourceids))
+    ordered_sourceids = sourceids[star_order]
+
+    def job_maker():
+        for start in range(0, len(sourceids), batch_size):
+            batch = ordered_sourceids[start:start+batch_size]
+            times, magnitudes, good, present = star_arrays(
+                data, photometry_index, batch)
+            if share_basis:
+                keys = star_keys[start:start+batch_size]
+            else:
+                keys = None
+            yield (times, magnitudes, good, present, frequencies, keys,
+                   multiband)
+
+    results = []
+    if n_workers > 1:
+        pool = Pool(n_workers)
+        try:
+            # Only build a few batches ahead of the workers, so that
+            # the whole table's arrays never sit in memory at once.
+            for window in _windows(job_maker(), 2*n_workers):
+                results.extend(pool.map(_periodogram_job, window))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_periodogram_job(job) for job in job_maker()]
+
+    if not results:
+        empty = np.zeros((len(bands), 0))
+        results = [(empty, empty, np.zeros(0), np.zeros(0))]
+
+    columns = [('SOURCEID', sourceids)]
+    for i, band in enumerate(bands):
+        for suffix, j in [('_lsp_per', 0), ('_lsp_pow', 1)]:
+            column = np.empty(len(sourceids))
+            column[star_order] = np.concatenate(
+                [result[j][i] for result in results])
+            columns.append((band+suffix, column))
+
+    if multiband:
+        for suffix, j in [('_lsp_per', 2), ('_lsp_pow', 3)]:
+            column = np.empty(len(sourceids))
+            column[star_order] = np.concatenate(
+                [result[j] for result in results])
+            columns.append(('multiband'+suffix, column))
+
+    return np.rec.fromarrays([column for _, column in columns],
+                             names=[name for name, _ in columns])
+
+
+# Peak powers of time-shuffled lightcurves, by (timestamp pattern, 
+# frequency grid, number of shuffles, seed), so that stars observed 
+# the same way -- in this call or a later one -- share one null 
+# distribution.
+null_peak_cache = {}
+
+
+def _pattern_seed(key, seed):
+    """ A reproducible random seed for one timestamp pattern. """
+
+    return int(hashlib.sha1(("%s %d" % (key, seed)).encode('ascii')
+                            ).hexdigest()[:8], 16)
+
+
+def bootstrap_peak_powers(times, values, frequencies, n_bootstrap=5000,
+                          seed=0, key=None, block_size=200, cache=None):
+    """
+    The highest periodogram peak of each of many time-shuffled copies
+    of a lightcurve.
+
+    Shuffling the magnitudes among the epochs keeps their distribution
+    and the sampling, but destroys any periodicity -- so these peaks 
+    are what noise alone, observed this way, gives.
+
+    Parameters
+    ----------
+    times, values : array_like, shape (N,)
+        The lightcurve (good points only).
+    frequencies : array_like
+        The frequency grid.
+    n_bootstrap : int, optional
+        How many shuffles. Default 5000.
+    seed : int, optional
+        Random seed. Together with the timestamp pattern it fixes the
+        shuffles, so results don't depend on which process did them.
+        Default 0.
+    key : str, optional
+        Cadence key of `times`, if known.
+    block_size : int, optional
+        How many shuffles to do at once (bounds memory). Default 200.
+    cache : TrigBasisCache, optional
+        Default: this module's `trig_basis_cache`.
+
+    Returns
+    -------
+    null_peaks : np.ndarray, shape (n_bootstrap,)
+        Sorted.
+
+    """
+
+    times = np.asarray(times, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    if key is None:
+        key = cadence_key(times)
+
+    random = np.random.RandomState(_pattern_seed(key, seed))
+
+    peaks = []
+    for start in range(0, n_bootstrap, block_size):
+        n = min(block_size, n_bootstrap - start)
+        shuffles = np.argsort(random.rand(n, len(values)), axis=1)
+        power = lomb_scargle_shared(times, values[shuffles],
+                                    np.ones(shuffles.shape, dtype=bool),
+                                    frequencies, cache=cache, key=key)
+        peaks.append(power.max(axis=1))
+
+    return np.sort(np.concatenate(peaks))
+
+
+def false_alarm_probability(peak_power, null_peaks):
+    """
+    Fraction of null peaks at least as high as `peak_power`.
+
+    Counted as (1 + k) / (1 + n_bootstrap), so it's never zero: with 
+    1000 shuffles, the smallest FAP we can claim is about 0.001, and
+    it takes 5000 to get under periodic_selector's `single_band_fap`.
+
+    Parameters
+    ----------
+    peak_power : float or array_like
+    null_peaks : array_like
+        Sorted, as from `bootstrap_peak_powers()`.
+
+    Returns
+    -------
+    fap : float or np.ndarray
+        NaN where `peak_power` is NaN.
+
+    """
+
+    peak_power = np.asarray(peak_power, dtype=np.float64)
+    null_peaks = np.asarray(null_peaks)
+
+    n_above = len(null_peaks) - np.searchsorted(null_peaks, peak_power, 
+                                                side='left')
+    fap = (1 + n_above) / (1 + len(null_peaks))
+
+    return np.where(np.isfinite(peak_power), fap, np.nan)
+
+
+def _null_job(job):
+    """
+    Null peak distributions for a few timestamp patterns.
+
+    Lives at module level so that it can be shipped off to a process 
+    pool.
+
+    """
+
+    patterns, frequencies, n_bootstrap, seed = job
+
+    return [(key, bootstrap_peak_powers(times, values, frequencies,
+                                        n_bootstrap=n_bootstrap, seed=seed,
+                                        key=key))
+            for key, times, values in patterns]
+
+
+def bootstrap_faps(data, periods, n_bootstrap=5000, seed=0,
+                   frequencies=None, batch_size=250, patterns_per_job=8,
+                   n_workers=1, photometry_index=None, 
+                   cadence_tolerance=1e-4, max_frequency=0.5):
+    """
+    Bootstrap false-alarm probabilities for each star's periodogram peak.
+
+    Each (star, band) is observed at some set of good epochs -- its 
+    timestamp pattern. We make one null distribution per pattern 
+    (from the first star seen with it, by `bootstrap_peak_powers()`),
+    and every star with that pattern gets its FAP from it. In a tile 
+    of cleanly-observed stars that's one set of shuffles for all of 
+    them. (Strictly, the null depends a little on the shape of each
+    star's magnitude distribution, too; we let that go.)
+
+    Parameters
+    ----------
+    data : atpy.Table
+        Photometry table (one row per detection).
+    periods : np.recarray or atpy.Table
+        Output of `lsp_periods()` (SOURCEID and *_lsp_pow columns), 
+        computed on the same `frequencies`.
+    n_bootstrap : int, optional
+        Shuffles per timestamp pattern. Default 5000; with fewer than
+        that, no FAP can come out under `single_band_fap`, so the 
+        single-band rules in periodic_selector (use_fap=True) never
+        pass -- you're warned if so.
+    seed : int, optional
+        Random seed; the results are the same for the same seed, 
+        however the work is split up. Default 0.
+    frequencies, max_frequency : optional
+        The frequency grid; defaults as in `lsp_periods()`. Use the 
+        same grid the periods were found on.
+    batch_size : int, optional
+        How many stars to read in at a time. Default 250.
+    patterns_per_job : int, optional
+        How many null distributions each pool job makes. Default 8.
+    n_workers : int, optional
+        How many processes to use. Default 1 (no pool).
+    photometry_index : PhotometryIndex, optional
+        An index over `data`, if you already have one.
+    cadence_tolerance : float, optional
+        Epochs agreeing to within this many days count as the same 
+        (see `CadenceGrouper`). Default 1e-4.
+
+    Returns
+    -------
+    faps : np.recarray
+        SOURCEID, j_lsp_fap, h_lsp_fap, k_lsp_fap; NaN where a band 
+        had under 3 good points.
+
+    """
+
+    if 1 / (1 + n_bootstrap) >= single_band_fap:
+        print ("Warning: with %d shuffles no FAP can be under %g; "
+               "the single-band period rules won't pass." % 
+               (n_bootstrap, single_band_fap))
+
+    if photometry_index is None:
+        photometry_index = PhotometryIndex(data)
+
+    if frequencies is None:
+        mjd = np.asarray(data.MEANMJDOBS)
+        frequencies = frequency_grid(mjd.max() - mjd.min(), 
+                                     max_frequency=max_frequency)
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+
+    grid_digest = hashlib.sha1(frequencies.tobytes()).hexdigest()
+
+    def cache_key(key):
+        return (key, grid_digest, n_bootstrap, seed)
+
+    sourceids = np.asarray(periods['SOURCEID'])
+
+    # First, every (star, band)'s timestamp pattern, keeping one 
+    # lightcurve for each pattern we don't have a null for yet.
+    grouper = CadenceGrouper(cadence_tolerance)
+    pattern_keys = dict((band, []) for band in bands)
+    new_patterns = OrderedDict()
+
+    for start in range(0, len(sourceids), batch_size):
+        times, magnitudes, good, present = star_arrays(
+            data, photometry_index, sourceids[start:start+batch_size])
+        for band in bands:
+            for star_times, star_magnitudes, star_good in zip(
+                    times, magnitudes[band], good[band]):
+                if star_good.sum() < 3:
+                    pattern_keys[band].append(None)
+                    continue
+                key = grouper.key(star_times[star_good])
+                pattern_keys[band].append(key)
+                if (cache_key(key) not in null_peak_cache and 
+                    key not in new_patterns):
+                    new_patterns[key] = (star_times[star_good], 
+                                         star_magnitudes[star_good])
+
+    # Then the null distributions we're missing, across the pool.
+    def job_maker():
+        patterns = [(key, times, values) for key, (times, values) 
+                    in new_patterns.items()]
+        for start in range(0, len(patterns), patterns_per_job):
+            yield (patterns[start:start+patterns_per_job], frequencies,
+                   n_bootstrap, seed)
+
+    if n_workers > 1:
+        pool = Pool(n_workers)
+        try:
+            for window in _windows(job_maker(), 2*n_workers):
+                for nulls in pool.map(_null_job, window):
+                    for key, null_peaks in nulls:
+                        null_peak_cache[cache_key(key)] = null_peaks
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for job in job_maker():
+            for key, null_peaks in _null_job(job):
+                null_peak_cache[cache_key(key)] = null_peaks
+
+    # Finally, each star's FAP, from its pattern's null.
+    columns = [('SOURCEID', sourceids)]
+    for band in bands:
+        peak_powers = np.asarray(periods[band+'_lsp_pow'], dtype=np.float64)
+        fap = np.nan * np.ones(len(sourceids))
+        for i, key in enumerate(pattern_keys[band]):
+            if key is not None:
+                fap[i] = false_alarm_probability(
+                    peak_powers[i], null_peak_cache[cache_key(key)])
+        columns.append((band+'_lsp_fap', fap))
+
+    return np.rec.fromarrays([column for _, column in columns],
+                             names=[name for name, _ in columns])
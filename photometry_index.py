@@ -0,0 +1,149 @@
+"""
+A per-source index into a WFCAM photometry table.
+
+The photometry tables (e.g. "fdece_graded_clipped0.8_scrubbed0.1_dusted0.5")
+hold one row per detection, with many rows per SOURCEID. Grabbing one
+star's data with `data.where(data.SOURCEID == s)` scans the whole table,
+which is fine for one lightcurve but hopeless for thousands of them.
+
+`PhotometryIndex` sorts the rows by SOURCEID once and remembers where
+each star's block of rows starts and stops, so that one star's rows --
+or the rows of a whole batch of stars -- can be pulled out by slicing.
+
+"""
+
+from __future__ import division
+
+import numpy as np
+
+
+class PhotometryIndex(object):
+    """
+    Maps each SOURCEID in a photometry table to its rows.
+
+    """
+
+    def __init__(self, data):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        data : atpy.Table
+            Table of photometry data. Must have a SOURCEID column.
+
+        """
+
+        self.data = data
+
+        sourceid_column = np.asarray(data.SOURCEID)
+
+        # mergesort is stable, so each star's rows stay in table order
+        # (which is usually time order).
+        self.order = np.argsort(sourceid_column, kind='mergesort')
+        sorted_sourceids = sourceid_column[self.order]
+
+        self.sourceids, self.starts = np.unique(sorted_sourceids,
+                                                return_index=True)
+        self.stops = np.append(self.starts[1:], len(sorted_sourceids))
+        self.counts = self.stops - self.starts
+
+    def __len__(self):
+        return len(self.sourceids)
+
+    def __contains__(self, sourceid):
+        return sourceid in self.sourceids
+
+    def locate(self, sourceids):
+        """
+        Finds where each input SOURCEID lives in the index.
+
+        Parameters
+        ----------
+        sourceids : array_like
+            SOURCEIDs to look up.
+
+        Returns
+        -------
+        position : np.ndarray of int
+            Position of each SOURCEID in `self.sourceids`, or -1 if
+            that star has no photometry.
+
+        """
+
+        sourceids = np.atleast_1d(sourceids)
+
+        position = np.searchsorted(self.sourceids, sourceids)
+        position[position == len(self.sourceids)] = 0
+
+        found = self.sourceids[position] == sourceids
+        position[~found] = -1
+
+        return position
+
+    def rows(self, sourceid):
+        """
+        Returns the table rows belonging to a single star.
+
+        Parameters
+        ----------
+        sourceid : int
+            SOURCEID of the desired star.
+
+        Returns
+        -------
+        rows : np.ndarray of int
+            Indices into `self.data`; empty if the star isn't present.
+            Suitable for `self.data.where(rows)`.
+
+        """
+
+        position = self.locate(sourceid)[0]
+
+        if position == -1:
+            return np.array([], dtype=self.order.dtype)
+
+        return self.order[self.starts[position]:self.stops[position]]
+
+    def rows_many(self, sourceids):
+        """
+        Returns the table rows belonging to a batch of stars, all at once.
+
+        Stars may be repeated in `sourceids`; their rows are then
+        repeated too.
+
+        Parameters
+        ----------
+        sourceids : array_like
+            SOURCEIDs of the desired stars.
+
+        Returns
+        -------
+        rows : np.ndarray of int
+            Indices into `self.data`, grouped star by star in the order
+            of `sourceids`.
+        owner : np.ndarray of int
+            For each entry of `rows`, the position in `sourceids` of
+            the star it belongs to.
+
+        """
+
+        position = self.locate(sourceids)
+
+        counts = np.where(position == -1, 0, self.counts[position])
+        starts = np.where(position == -1, 0, self.starts[position])
+
+        owner = np.repeat(np.arange(len(position)), counts)
+
+        # Offset of each output entry within its own star's block
+        block_starts = np.cumsum(counts) - counts
+        within = np.arange(counts.sum()) - np.repeat(block_starts, counts)
+
+        rows = self.order[np.repeat(starts, counts) + within]
+
+        return rows, owner
+
+    def star(self, sourceid):
+        """ Returns a table containing a single star's photometry. """
+
+        return self.data.where(self.rows(sourceid))
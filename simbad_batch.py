@@ -0,0 +1,507 @@
+"""
+Looks up SIMBAD names for many positions at once.
+
+Asking SIMBAD about one star at a time, synchronously, takes hours for
+a thousand stars, and one network hiccup near the end throws it all
+away. Instead, this module:
+
+1. packs many positions into each SIMBAD "sim-script" query, and sends
+   several such queries at once (with a cap on how many, and on how
+   often we start one, so SIMBAD doesn't throttle us);
+2. keeps every answer in a small on-disk cache (position, match radius
+   and the name found), written as each batch comes back;
+3. so that an interrupted run picks up where it left off: anything
+   already in the cache is never asked for again.
+
+`simbad_mock.MockSimbadServer` answers the same queries from a local
+table, for testing and benchmarking without the network.
+
+"""
+
+from __future__ import division
+
+import os
+import socket
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+from urllib import urlencode
+from urllib2 import urlopen, URLError
+
+import numpy as np
+
+from sky_index import SkyIndex, nearest_match
+
+simbad_script_url = "http://simbad.u-strasbg.fr/simbad/sim-script"
+
+# Each returned object comes back as one line: "ra|dec|main id".
+simbad_object_format = '"%COO(d;A)|%COO(d;D)|%MAIN_ID"'
+
+
+def build_sim_script(ra, dec, max_match):
+    """
+    Writes a sim-script that asks SIMBAD about every object near
+    every one of the given positions.
+
+    Parameters
+    ----------
+    ra, dec : array_like
+        Positions, in decimal degrees.
+    max_match : float
+        Search radius, in arcseconds.
+
+    Returns
+    -------
+    script : str
+
+    """
+
+    lines = ["output console=off script=off",
+             "format object %s" % simbad_object_format]
+
+    for r, d in zip(ra, dec):
+        lines.append("query coo %.7f %+.7f radius=%gs" % (r, d, max_match))
+
+    return "\n".join(lines) + "\n"
+
+
+def parse_sim_script_output(text):
+    """
+    Reads the objects out of a sim-script answer.
+
+    Parameters
+    ----------
+    text : str
+        What SIMBAD sent back.
+
+    Returns
+    -------
+    ra, dec : np.ndarray
+        Positions of the objects found, in decimal degrees.
+    names : list of str
+        Their main identifiers.
+
+    """
+
+    lines = text.splitlines()
+
+    # With sections ("::error::", "::data::"...), only the data counts;
+    # queries that found nothing just show up among the errors.
+    if any(line.startswith('::') for line in lines):
+        data_lines = []
+        in_data = False
+        for line in lines:
+            if line.startswith('::'):
+                in_data = line.strip(':').strip() == 'data'
+            elif in_data:
+                data_lines.append(line)
+        lines = data_lines
+
+    ra, dec, names = [], [], []
+
+    for line in lines:
+        pieces = line.split('|')
+        if len(pieces) != 3:
+            continue
+        try:
+            r, d = float(pieces[0]), float(pieces[1])
+        except ValueError:
+            continue
+        ra.append(r)
+        dec.append(d)
+        names.append(pieces[2].strip())
+
+    return np.array(ra), np.array(dec), names
+
+
+class RateLimiter(object):
+    """
+    Spaces out the starts of events to at most `max_per_second`.
+
+    Safe to share between threads: each caller of `wait()` is given
+    its own time slot, and sleeps until it arrives.
+
+    """
+
+    def __init__(self, max_per_second):
+
+        self.interval = 1 / max_per_second if max_per_second else 0
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class SimbadClient(object):
+    """
+    Sends sim-script queries to SIMBAD (or to something that acts
+    like it), retrying failures.
+
+    """
+
+    def __init__(self, url=simbad_script_url, max_per_second=5,
+                 timeout=60, max_retries=4, retry_wait=1.):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        url : str, optional
+            Where to send the scripts. Default: the real SIMBAD.
+        max_per_second : float, optional
+            Most queries to start per second, across all threads.
+            Default 5.
+        timeout : float, optional
+            Seconds to wait for an answer. Default 60.
+        max_retries : int, optional
+            How many times to retry a failed query. Default 4.
+        retry_wait : float, optional
+            Seconds to wait before the first retry; each later retry
+            waits twice as long. Default 1.
+
+        """
+
+        self.url = url
+        self.rate_limiter = RateLimiter(max_per_second)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_wait = retry_wait
+
+    def query(self, ra, dec, max_match):
+        """
+        Finds every SIMBAD object near each of a batch of positions.
+
+        Parameters
+        ----------
+        ra, dec : array_like
+            Positions, in decimal degrees.
+        max_match : float
+            Search radius, in arcseconds.
+
+        Returns
+        -------
+        ra, dec, names
+            As in `parse_sim_script_output()`.
+
+        """
+
+        data = urlencode({'script': build_sim_script(ra, dec, max_match)})
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait()
+            try:
+                response = urlopen(self.url, data, self.timeout)
+                try:
+                    text = response.read()
+                finally:
+                    response.close()
+                return parse_sim_script_output(text)
+            except (URLError, IOError, socket.timeout), e:
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.retry_wait * 2**attempt)
+
+
+class SimbadNameCache(object):
+    """
+    Remembers the names we've looked up, on disk.
+
+    Each entry is a position we asked about, the match radius we
+    used, and what we found there: the nearest object's name and
+    position, or nothing. An entry also answers any later question
+    about the same position with a radius no bigger than its own: if
+    the nearest object is further away than the new radius, then
+    there's nothing within it.
+
+    The file is a plain tab-separated text file, appended to as
+    answers arrive, so that nothing is lost if we're interrupted.
+
+    """
+
+    def __init__(self, filename=None, position_tolerance=0.01):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        filename : str, optional
+            Where to keep the cache. Default None (in memory only).
+        position_tolerance : float, optional
+            How close (in arcseconds) a new position must be to a
+            cached one to count as the same. Default 0.01.
+
+        """
+
+        self.filename = filename
+        self.position_tolerance = position_tolerance
+
+        self._lock = threading.Lock()
+        self._columns = [[] for i in range(6)]
+        self._index = None
+
+        if filename is not None and os.path.exists(filename):
+            with open(filename) as f:
+                for line in f:
+                    if line.startswith('#') or not line.strip():
+                        continue
+                    pieces = line.rstrip('\n').split('\t')
+                    if len(pieces) != 6:
+                        # e.g. a half-written last line
+                        continue
+                    self._append(pieces)
+
+    def _append(self, pieces):
+        ra, dec, radius, name, object_ra, object_dec = pieces
+        for column, value in zip(self._columns,
+                                 (float(ra), float(dec), float(radius),
+                                  name, float(object_ra), float(object_dec))):
+            column.append(value)
+        self._index = None
+
+    def __len__(self):
+        return len(self._columns[0])
+
+    def lookup(self, ra, dec, max_match):
+        """
+        Answers whatever we can from the cache.
+
+        Parameters
+        ----------
+        ra, dec : array_like
+            Positions, in decimal degrees.
+        max_match : float
+            Match radius, in arcseconds.
+
+        Returns
+        -------
+        known : np.ndarray of bool
+            Which positions the cache could answer for.
+        names : np.ndarray of object
+            The name at each known position ('' if there's nothing
+            there); None for the rest.
+
+        """
+
+        ra = np.atleast_1d(np.asarray(ra, dtype=np.float64))
+        dec = np.atleast_1d(np.asarray(dec, dtype=np.float64))
+
+        known = np.zeros(len(ra), dtype=bool)
+        names = np.array([None] * len(ra), dtype=object)
+
+        with self._lock:
+            if len(self) == 0:
+                return known, names
+
+            if self._index is None:
+                self._index = SkyIndex(self._columns[0], self._columns[1],
+                                       units='degrees')
+            index = self._index
+            cached_radius = np.array(self._columns[2])
+            cached_names = np.array(self._columns[3], dtype=object)
+            object_ra = np.array(self._columns[4])
+            object_dec = np.array(self._columns[5])
+
+        # Several entries might sit at one position; any one with a
+        # big enough radius will do, so look at all of them.
+        rows_list = index.cone(ra, dec, self.position_tolerance / 3600)
+
+        for i, rows in enumerate(rows_list):
+            rows = rows[cached_radius[rows] >= max_match]
+            if len(rows) == 0:
+                continue
+            row = rows[0]
+
+            known[i] = True
+            if cached_names[row] == '':
+                names[i] = ''
+            else:
+                separation = _separation_arcsec(ra[i], dec[i],
+                                                object_ra[row],
+                                                object_dec[row])
+                names[i] = cached_names[row] if separation < max_match else ''
+
+        return known, names
+
+    def add(self, ra, dec, max_match, names, object_ra, object_dec):
+        """
+        Adds a batch of answers to the cache (and to its file).
+
+        Parameters
+        ----------
+        ra, dec : array_like
+            Positions we asked about, in decimal degrees.
+        max_match : float
+            Match radius we asked with, in arcseconds.
+        names : list of str
+            Name of the nearest object to each position, or ''.
+        object_ra, object_dec : array_like
+            Position of that object (np.nan if none).
+
+        """
+
+        rows = [("%.9f" % r, "%.9f" % d, "%r" % float(max_match),
+                 name.replace('\t', ' ').replace('\n', ' '),
+                 "%.9f" % o_r, "%.9f" % o_d)
+                for r, d, name, o_r, o_d
+                in zip(ra, dec, names, object_ra, object_dec)]
+
+        with self._lock:
+            if self.filename is not None:
+                new_file = not os.path.exists(self.filename)
+                with open(self.filename, 'a') as f:
+                    if new_file:
+                        f.write("# ra\tdec\tradius\tname\t"
+                                "object_ra\tobject_dec\n")
+                    for row in rows:
+                        f.write("\t".join(row) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            for row in rows:
+                self._append(row)
+
+
+def _separation_arcsec(ra1, dec1, ra2, dec2):
+    """ Angular separation between two positions (degrees in, arcsec out). """
+
+    ra1, dec1, ra2, dec2 = [np.radians(x) for x in (ra1, dec1, ra2, dec2)]
+
+    # haversine: well-behaved at the tiny separations we care about
+    a = (np.sin((dec2 - dec1)/2)**2 +
+         np.cos(dec1) * np.cos(dec2) * np.sin((ra2 - ra1)/2)**2)
+
+    return np.degrees(2 * np.arcsin(np.sqrt(a))) * 3600
+
+
+def nearest_objects(ra, dec, object_ra, object_dec, object_names, max_match):
+    """
+    Picks the nearest returned object (if any) for each position.
+
+    Returns
+    -------
+    names : list of str
+        Name of the nearest object within `max_match`, or ''.
+    nearest_ra, nearest_dec : np.ndarray
+        Its position (np.nan if none).
+
+    """
+
+    names = [''] * len(ra)
+    nearest_ra = np.nan * np.ones(len(ra))
+    nearest_dec = np.nan * np.ones(len(ra))
+
+    if len(object_ra) == 0:
+        return names, nearest_ra, nearest_dec
+
+    index = SkyIndex(object_ra, object_dec, units='degrees')
+    match_index, separation = nearest_match(ra, dec, index, max_match)
+
+    for i, j in enumerate(match_index):
+        if j >= 0:
+            names[i] = object_names[j]
+            nearest_ra[i] = object_ra[j]
+            nearest_dec[i] = object_dec[j]
+
+    return names, nearest_ra, nearest_dec
+
+
+def simbad_names(ra, dec, max_match=1., batch_size=100, n_workers=4,
+                 cache=None, client=None, verbose=False):
+    """
+    Finds the SIMBAD name of the nearest object to each position.
+
+    Parameters
+    ----------
+    ra, dec : array_like
+        Positions, in decimal degrees.
+    max_match : float, optional
+        Largest separation to accept, in arcseconds. Default 1.
+    batch_size : int, optional
+        How many positions to send in each query. Default 100.
+    n_workers : int, optional
+        How many queries to have running at once. Default 4.
+    cache : SimbadNameCache or str, optional
+        A cache, or the filename of one. Default None (a throwaway
+        in-memory cache).
+    client : SimbadClient, optional
+        What to send queries with. Default: the real SIMBAD.
+    verbose : bool, optional
+        Print progress? Default False.
+
+    Returns
+    -------
+    names : np.ndarray of str
+        The name of each position's nearest SIMBAD object, or ''.
+
+    Raises
+    ------
+    IOError
+        If some batches still failed after retrying. Everything that
+        did succeed is in the cache, so just run it again.
+
+    """
+
+    ra = np.atleast_1d(np.asarray(ra, dtype=np.float64))
+    dec = np.atleast_1d(np.asarray(dec, dtype=np.float64))
+
+    if cache is None or isinstance(cache, str):
+        cache = SimbadNameCache(cache)
+    if client is None:
+        client = SimbadClient()
+
+    known, names = cache.lookup(ra, dec, max_match)
+
+    todo = np.where(~known)[0]
+    batches = [todo[i:i+batch_size] for i in range(0, len(todo), batch_size)]
+
+    if verbose:
+        print "%d of %d positions cached; %d batches to query." % (
+            known.sum(), len(ra), len(batches))
+
+    def run_batch(batch):
+        try:
+            object_ra, object_dec, object_names = client.query(
+                ra[batch], dec[batch], max_match)
+        except (URLError, IOError, socket.timeout), e:
+            return batch, e
+
+        found = nearest_objects(ra[batch], dec[batch], object_ra,
+                                object_dec, object_names, max_match)
+
+        # saved as soon as it's in, so an interruption loses at most
+        # the batches still in flight
+        cache.add(ra[batch], dec[batch], max_match, *found)
+
+        return batch, found[0]
+
+    failures = []
+
+    if batches:
+        pool = ThreadPool(max(1, min(n_workers, len(batches))))
+        try:
+            for n_done, (batch, result) in enumerate(
+                    pool.imap_unordered(run_batch, batches)):
+                if isinstance(result, Exception):
+                    failures.append(result)
+                else:
+                    names[batch] = result
+                if verbose:
+                    print "Batch %d of %d done." % (n_done+1, len(batches))
+        finally:
+            pool.close()
+            pool.join()
+
+    if failures:
+        raise IOError("%d of %d SIMBAD batches failed (e.g. %s); "
+                      "rerun to retry them." % (len(failures), len(batches),
+                                                failures[0]))
+
+    return np.array(names.tolist())
@@ -0,0 +1,206 @@
+"""
+A local stand-in for SIMBAD's sim-script service.
+
+Answers the queries that `simbad_batch` sends, from a plain text table
+of objects rather than from the real database, so that the whole
+naming path can be tested (and timed) without the network.
+
+The fixture table has one object per line: RA and Dec in decimal
+degrees and a name, separated by tabs (lines starting with '#' are
+comments). See test/simbad_fixture.txt.
+
+Usage:
+
+    with MockSimbadServer(fixture_filename) as server:
+        client = simbad_batch.SimbadClient(url=server.url)
+        ...
+
+"""
+
+from __future__ import division
+
+import threading
+import time
+
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from urlparse import parse_qs
+
+import numpy as np
+
+from sky_index import SkyIndex
+
+
+def read_fixture(filename):
+    """ Reads a fixture table into (ra, dec, names). """
+
+    ra, dec, names = [], [], []
+
+    with open(filename) as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            r, d, name = line.rstrip('\n').split('\t')
+            ra.append(float(r))
+            dec.append(float(d))
+            names.append(name)
+
+    return np.array(ra), np.array(dec), names
+
+
+def answer_sim_script(script, index, names):
+    """
+    Answers a sim-script the way SIMBAD would (for `query coo` lines).
+
+    Parameters
+    ----------
+    script : str
+        The script sent to us.
+    index : SkyIndex
+        Index over the fixture objects (in degrees).
+    names : list of str
+        The fixture objects' names.
+
+    Returns
+    -------
+    text : str
+
+    """
+
+    errors = []
+    data = []
+
+    for line_number, line in enumerate(script.splitlines()):
+        pieces = line.split()
+        if len(pieces) < 4 or pieces[:2] != ['query', 'coo']:
+            continue
+
+        ra, dec = float(pieces[2]), float(pieces[3])
+        radius = float(pieces[4].split('=')[1].rstrip('s')) / 3600
+
+        rows = index.cone(ra, dec, radius)
+        if len(rows) == 0:
+            errors.append("[%d] No astronomical object found : "
+                          % (line_number+1))
+        for row in rows:
+            data.append("%.8f|%+.8f|%s" % (np.degrees(index.ra[row]),
+                                           np.degrees(index.dec[row]),
+                                           names[row]))
+
+    text = ""
+    if errors:
+        text += "::error::" + "\n\n" + "\n".join(errors) + "\n\n"
+    text += "::data::" + "\n\n" + "\n".join(data) + "\n"
+
+    return text
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MockSimbadServer(object):
+    """
+    Serves sim-script answers from a fixture table, on localhost.
+
+    Attributes
+    ----------
+    url : str
+        Where to send queries (once started).
+    n_requests : int
+        How many queries have come in so far (failed ones included).
+
+    """
+
+    def __init__(self, fixture_filename, fail_first=0, delay=0.):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        fixture_filename : str
+            The table of objects to serve.
+        fail_first : int, optional
+            Answer this many requests with "503 Service Unavailable"
+            before behaving, to exercise retries. Default 0.
+        delay : float, optional
+            Seconds to sleep before each answer, to act like a server
+            that's far away. Default 0.
+
+        """
+
+        ra, dec, self.names = read_fixture(fixture_filename)
+        self.index = SkyIndex(ra, dec, units='degrees')
+
+        self.fail_first = fail_first
+        self.delay = delay
+        self.n_requests = 0
+        self._lock = threading.Lock()
+
+        self._server = None
+        self._thread = None
+        self.url = None
+
+    def _handler(self):
+
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_POST(self):
+
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+
+                with mock._lock:
+                    mock.n_requests += 1
+                    fail = mock.n_requests <= mock.fail_first
+
+                if mock.delay:
+                    time.sleep(mock.delay)
+
+                if fail:
+                    self.send_error(503, "Service Unavailable")
+                    return
+
+                script = parse_qs(body).get('script', [''])[0]
+                text = answer_sim_script(script, mock.index, mock.names)
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain')
+                self.send_header('Content-Length', str(len(text)))
+                self.end_headers()
+                self.wfile.write(text)
+
+            def log_message(self, *args):
+                # keep quiet
+                pass
+
+        return Handler
+
+    def start(self):
+        """ Starts serving (on a free port) in a background thread. """
+
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = "http://127.0.0.1:%d/simbad/sim-script" % (
+            self._server.server_address[1])
+
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        """ Stops serving. """
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -1,14 +1,18 @@
 """
 A module for retrieving SIMBAD names for stars.
 
-Uses astroquery.simbad; is fairly straighforward.
+Used to send one astroquery.simbad.QueryCoord per star; now hands the
+whole table to `simbad_batch`, which asks about many stars per query,
+several queries at a time, and caches what it finds.
 
 """
 
 import numpy as np
-import astroquery.simbad
 
-def simbad_namer(table, max_match=1., radec_fmt = 'rad'):
+from simbad_batch import simbad_names
+
+def simbad_namer(table, max_match=1., radec_fmt = 'rad', cache=None,
+                 **kwargs):
     """
     Matches all sources to SIMBAD names.
 
@@ -20,10 +24,16 @@ def simbad_namer(table, max_match=1., radec_fmt = 'rad'):
         Maximum match in arcseconds.
     radec_fmt : {'rad'|'dec'}, optional
         What format are the RA and DEC columns of `table` in?
+    cache : str, optional
+        Filename of a name cache to use (and to resume from, if an
+        earlier run was interrupted). Default None (no cache).
+    Any other keyword arguments (`batch_size`, `n_workers`, `client`,
+    `verbose`) are passed along to `simbad_batch.simbad_names()`.
 
     Returns
     -------
     simbad_names : np.ndarray of str
+        The name of each source, or "" if SIMBAD has nothing there.
 
     """
 
@@ -34,18 +44,5 @@ def simbad_namer(table, max_match=1., radec_fmt = 'rad'):
         ra_col = table.RA
         dec_col = table.DEC
 
-    name_list = []
-
-    for ra, dec in zip(ra_col, dec_col):
-        al = astroquery.simbad.QueryCoord(ra=ra, dec=dec, 
-                                          radius=str(max_match)+"s").execute()
-        try: 
-            name_list.append( al.table['MAIN_ID'][0] )
-        except Exception, e: 
-            print e
-            name_list.append( "" )
-
-    # Now let's cast to an array so that we can append it to an atpy.Table
-    simbad_names = np.array(name_list)
-
-    return simbad_names
+    return simbad_names(ra_col, dec_col, max_match=max_match, cache=cache,
+                        **kwargs)
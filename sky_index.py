@@ -0,0 +1,741 @@
+"""
+Spherical-geometry helpers for spatially indexing WFCAM tables.
+
+Positions on the sky are turned into unit vectors on the sphere, so that
+a plain Euclidean KD-tree (scipy.spatial.cKDTree) can answer "who is
+within X arcseconds of whom" questions without any RA wraparound or
+cos(Dec) bookkeeping. An angular separation `theta` corresponds to a
+straight-line (chord) distance of 2*sin(theta/2) between unit vectors.
+
+"""
+
+from __future__ import division
+
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+def radec_to_xyz(ra, dec):
+    """
+    Converts RA, Dec (in radians) into unit vectors.
+
+    Parameters
+    ----------
+    ra, dec : array_like
+        Right ascension and declination, in radians.
+
+    Returns
+    -------
+    xyz : np.ndarray
+        Array of shape (N, 3) containing a unit vector for each position.
+
+    """
+
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+
+    cos_dec = np.cos(dec)
+
+    xyz = np.empty(ra.shape + (3,))
+    xyz[..., 0] = cos_dec * np.cos(ra)
+    xyz[..., 1] = cos_dec * np.sin(ra)
+    xyz[..., 2] = np.sin(dec)
+
+    return xyz
+
+
+def xyz_to_radec(xyz):
+    """
+    Converts vectors (any length) back into RA, Dec in radians.
+
+    RA comes back in [0, 2*pi).
+
+    """
+
+    xyz = np.asarray(xyz, dtype=np.float64)
+
+    ra = np.arctan2(xyz[..., 1], xyz[..., 0]) % (2*np.pi)
+    dec = np.arctan2(xyz[..., 2], np.hypot(xyz[..., 0], xyz[..., 1]))
+
+    return ra, dec
+
+
+def propagate_radec(ra, dec, pmra, pmdec, years):
+    """
+    Moves positions along their proper motions.
+
+    Each star is stepped along the plane tangent to the sky at its 
+    position and put back onto the sphere, all rows at once. That's 
+    plenty accurate for the arcsecond-scale motions we'd ever see 
+    between catalog epochs (and it behaves fine near the poles, 
+    unlike adding pmra/cos(Dec) to RA).
+
+    Parameters
+    ----------
+    ra, dec : array_like
+        Positions at their catalog epoch, in radians.
+    pmra, pmdec : array_like
+        Proper motions in mas/yr; `pmra` includes the cos(Dec) factor,
+        as Gaia, UCAC and 2MASS-era catalogs all give it. NaN proper 
+        motions are taken as zero.
+    years : float or array_like
+        How far to move each position: target epoch minus catalog 
+        epoch, in Julian years (may differ from row to row).
+
+    Returns
+    -------
+    ra, dec : np.ndarray
+        Propagated positions, in radians (RA in [0, 2*pi)).
+
+    """
+
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+
+    mas = np.radians(1 / 3.6e6)
+    east_step = np.nan_to_num(np.asarray(pmra, dtype=np.float64)) * mas * years
+    north_step = np.nan_to_num(np.asarray(pmdec, dtype=np.float64)) * mas * years
+
+    sin_ra, cos_ra = np.sin(ra), np.cos(ra)
+    sin_dec, cos_dec = np.sin(dec), np.cos(dec)
+
+    moved = np.empty(ra.shape + (3,))
+    moved[..., 0] = (cos_dec * cos_ra - east_step * sin_ra - 
+                     north_step * sin_dec * cos_ra)
+    moved[..., 1] = (cos_dec * sin_ra + east_step * cos_ra - 
+                     north_step * sin_dec * sin_ra)
+    moved[..., 2] = sin_dec + north_step * cos_dec
+
+    return xyz_to_radec(moved)
+
+
+def angle_to_chord(angle):
+    """ Converts an angular separation (radians) to a unit-vector chord. """
+
+    return 2 * np.sin(np.asarray(angle) / 2)
+
+
+def chord_to_angle(chord):
+    """ Converts a unit-vector chord to an angular separation (radians). """
+
+    return 2 * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+def pairs_within(ra, dec, max_separation):
+    """
+    Finds every pair of positions closer together than `max_separation`.
+
+    Parameters
+    ----------
+    ra, dec : array_like
+        Right ascension and declination, in radians.
+    max_separation : float
+        Largest separation, in radians, for a pair to be returned.
+
+    Returns
+    -------
+    pairs : np.ndarray
+        Integer array of shape (M, 2); each row (i, j) with i < j is a
+        pair of indices into `ra`, `dec`.
+
+    """
+
+    tree = cKDTree(radec_to_xyz(ra, dec))
+
+    pair_set = tree.query_pairs(angle_to_chord(max_separation))
+
+    pairs = np.array(sorted(pair_set), dtype=np.intp).reshape(-1, 2)
+
+    return pairs
+
+
+def _to_radians(angle, units):
+    """ Converts `angle` from `units` ('radians' or 'degrees') to radians. """
+
+    if 'rad' in units.lower():
+        return np.asarray(angle, dtype=np.float64)
+    elif 'deg' in units.lower():
+        return np.radians(angle)
+    else:
+        raise ValueError("Units must be radians or degrees, not '%s'" % units)
+
+
+class SkyIndex(object):
+    """
+    A reusable spatial index over a set of sky positions.
+
+    Build it once over a table (a spreadsheet, a photometry table, 
+    an auxiliary catalog...) and ask it for the rows that fall in a
+    cone, a box or a polygon on the sky. Each query only looks at the
+    part of the tree near the region in question, rather than scanning
+    the whole table with a boolean mask.
+
+    Every query returns sorted row indices into the indexed table,
+    which can be handed straight to `table.where()` or to
+    `photometry_index.PhotometryIndex.rows_many()` (via SOURCEIDs).
+
+    All angles passed to or returned from a SkyIndex are in the units
+    it was built with (`units`, 'radians' or 'degrees').
+
+    """
+
+    def __init__(self, ra, dec, units='radians'):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        ra, dec : array_like
+            Coordinates of the positions to index.
+        units : {'radians'|'degrees'}, optional
+            Units of `ra` and `dec` and of every later query.
+            Default 'radians', like the WFCAM spreadsheets.
+
+        """
+
+        self.units = units
+
+        self.ra = _to_radians(ra, units)
+        self.dec = _to_radians(dec, units)
+
+        self.xyz = radec_to_xyz(self.ra, self.dec)
+        self.tree = cKDTree(self.xyz)
+
+        # Optional extras, kept by save() and load(): an ID per row, and
+        # named subsets of rows (as sorted row indices).
+        self.ids = None
+        self.subsets = {}
+
+    @classmethod
+    def from_table(cls, table, units='radians', ra_col='RA', dec_col='DEC'):
+        """
+        Builds a SkyIndex over the rows of a table.
+
+        Parameters
+        ----------
+        table : atpy.Table
+            Table to index.
+        units : {'radians'|'degrees'}, optional
+            Units of the RA/Dec columns. Default 'radians'.
+        ra_col, dec_col : str, optional
+            Names of the RA/Dec columns. Default 'RA', 'DEC'.
+
+        Returns
+        -------
+        index : SkyIndex
+
+        """
+
+        return cls(table[ra_col], table[dec_col], units=units)
+
+    def __len__(self):
+        return len(self.ra)
+
+    @classmethod
+    def _from_xyz(cls, ra, dec, xyz, units):
+        """ Builds an index from positions already in radians and xyz. """
+
+        index = cls.__new__(cls)
+        index.units = units
+        index.ra, index.dec, index.xyz = ra, dec, xyz
+        index.tree = cKDTree(xyz)
+        index.ids = None
+        index.subsets = {}
+
+        return index
+
+    def save(self, filename, ids=None, subsets=None):
+        """
+        Writes this index to disk, to be read back with `load()`.
+
+        Only the positions are stored (the tree is rebuilt on loading,
+        which takes a small fraction of a second even for the whole
+        spreadsheet), so the file doesn't depend on the scipy version.
+
+        Parameters
+        ----------
+        filename : str
+            Where to write it (an .npz file).
+        ids : array_like, optional
+            An ID for each row (e.g. SOURCEIDs), stored alongside. 
+            Default: this index's own `ids`, if it has any.
+        subsets : dict, optional
+            {name: boolean mask or row indices}, for named selections 
+            of rows that we'll want to match against on their own 
+            (see `subset()`). Default: this index's own `subsets`.
+
+        """
+
+        if ids is None:
+            ids = self.ids
+        if subsets is None:
+            subsets = self.subsets
+
+        arrays = {'ra': self.ra, 'dec': self.dec, 'xyz': self.xyz,
+                  'units': np.array(self.units)}
+        if ids is not None:
+            if len(ids) != len(self):
+                raise ValueError("Got %d IDs for %d rows." % 
+                                 (len(ids), len(self)))
+            arrays['ids'] = np.asarray(ids)
+        for name, rows in subsets.items():
+            rows = np.asarray(rows)
+            if rows.dtype == bool:
+                rows = np.flatnonzero(rows)
+            arrays['subset_'+name] = rows
+
+        # Write to a temporary file first, so that an interrupted session
+        # never leaves a half-written index behind.
+        temporary_filename = filename + ".%d.tmp" % os.getpid()
+        with open(temporary_filename, 'wb') as f:
+            np.savez(f, **arrays)
+        os.rename(temporary_filename, filename)
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Reads an index written by `save()`.
+
+        Returns
+        -------
+        index : SkyIndex
+            With its `ids` and `subsets` as they were saved.
+
+        """
+
+        with np.load(filename) as saved:
+            index = cls._from_xyz(saved['ra'], saved['dec'], saved['xyz'],
+                                  str(saved['units']))
+            if 'ids' in saved.files:
+                index.ids = saved['ids']
+            for key in saved.files:
+                if key.startswith('subset_'):
+                    index.subsets[key[len('subset_'):]] = saved[key]
+
+        return index
+
+    def subset(self, rows):
+        """
+        A new SkyIndex over some of this one's rows.
+
+        Row i of the new index is row `rows[i]` of this one, so row 
+        indices it hands back count rows of the selected table (e.g. 
+        of `spread.where(mask)`), not of the full one.
+
+        Parameters
+        ----------
+        rows : str, boolean mask, or array of int
+            The name of one of this index's `subsets`, or the rows.
+
+        Returns
+        -------
+        index : SkyIndex
+
+        """
+
+        if isinstance(rows, basestring):
+            rows = self.subsets[rows]
+        rows = np.asarray(rows)
+        if rows.dtype == bool:
+            rows = np.flatnonzero(rows)
+
+        index = self._from_xyz(self.ra[rows], self.dec[rows], 
+                               self.xyz[rows], self.units)
+        if self.ids is not None:
+            index.ids = self.ids[rows]
+
+        return index
+
+    def _from_units(self, angle):
+        return _to_radians(angle, self.units)
+
+    def cone(self, ra, dec, radius):
+        """
+        Finds all rows within `radius` of a position (or of many).
+
+        Parameters
+        ----------
+        ra, dec : float or array_like
+            Center(s) of the cone(s).
+        radius : float or array_like
+            Radius of the cone(s).
+
+        Returns
+        -------
+        rows : np.ndarray of int, or list of np.ndarray of int
+            Sorted row indices inside the cone. If `ra` and `dec` are
+            arrays, a list with one such array per center.
+
+        """
+
+        scalar_input = np.ndim(ra) == 0 and np.ndim(dec) == 0
+
+        centers = radec_to_xyz(np.atleast_1d(self._from_units(ra)),
+                               np.atleast_1d(self._from_units(dec)))
+        chords = angle_to_chord(self._from_units(radius))
+
+        if np.ndim(chords) == 0:
+            # one tree traversal for all the centers at once
+            row_lists = self.tree.query_ball_point(centers, chords)
+        else:
+            row_lists = [self.tree.query_ball_point(center, chord)
+                         for center, chord in zip(centers, chords)]
+
+        rows = [np.array(sorted(row_list), dtype=np.intp)
+                for row_list in row_lists]
+
+        if scalar_input:
+            return rows[0]
+        else:
+            return rows
+
+    def box(self, ra_min, ra_max, dec_min, dec_max):
+        """
+        Finds all rows inside an RA/Dec box.
+
+        If `ra_min` > `ra_max`, the box is taken to wrap through RA=0.
+        If `ra_max` - `ra_min` is a full circle or more (0 to 360, or 
+        -180 to 180), the box is the whole band of Dec.
+
+        Parameters
+        ----------
+        ra_min, ra_max, dec_min, dec_max : float
+            Edges of the box.
+
+        Returns
+        -------
+        rows : np.ndarray of int
+            Sorted row indices inside the box.
+
+        """
+
+        ra_min, ra_max, dec_min, dec_max = [
+            float(self._from_units(x)) for x in (ra_min, ra_max, 
+                                                 dec_min, dec_max)]
+
+        if ra_max - ra_min >= 2*np.pi:
+            rows = np.arange(len(self.dec))
+            return rows[(self.dec >= dec_min) & (self.dec <= dec_max)]
+
+        ra_span = (ra_max - ra_min) % (2*np.pi)
+        ra_center = ra_min + ra_span/2
+
+        if ra_span > np.pi:
+            # Too wide for a cap around its middle to be any use (or 
+            # for the corners to bound it); just check every row.
+            candidates = np.arange(len(self.dec))
+        else:
+            # Any cap containing the box's corners and edge midpoints
+            # contains the whole box; take the cap around its middle.
+            corner_ra = ra_min + ra_span * np.array([0, 0.5, 1, 
+                                                     0, 0.5, 1, 0, 1])
+            corner_dec = np.array([dec_min]*3 + [dec_max]*3 + [0, 0])
+            corner_dec[6:] = np.clip(0, dec_min, dec_max)
+
+            center_xyz = radec_to_xyz(ra_center, (dec_min + dec_max)/2)
+            corner_xyz = radec_to_xyz(corner_ra, corner_dec)
+            chord = np.sqrt(((corner_xyz - center_xyz)**2).sum(axis=1)).max()
+
+            candidates = np.array(
+                sorted(self.tree.query_ball_point(center_xyz, 
+                                                  chord*1.0001)),
+                dtype=np.intp)
+
+        ra = self.ra[candidates]
+        dec = self.dec[candidates]
+        inside = ((dec >= dec_min) & (dec <= dec_max) &
+                  ((ra - ra_min) % (2*np.pi) <= ra_span))
+
+        return candidates[inside]
+
+    def polygon(self, ra_vertices, dec_vertices):
+        """
+        Finds all rows inside a polygon whose edges are great circles.
+
+        The polygon must fit within a hemisphere, which any region of
+        interest for us will do with room to spare.
+
+        Parameters
+        ----------
+        ra_vertices, dec_vertices : array_like
+            Vertices of the polygon, in order (either direction).
+
+        Returns
+        -------
+        rows : np.ndarray of int
+            Sorted row indices inside the polygon.
+
+        """
+
+        vertices = radec_to_xyz(self._from_units(ra_vertices),
+                                self._from_units(dec_vertices))
+
+        center = vertices.mean(axis=0)
+        center /= np.sqrt((center**2).sum())
+
+        chord = np.sqrt(((vertices - center)**2).sum(axis=1)).max()
+
+        candidates = np.array(
+            sorted(self.tree.query_ball_point(center, chord*1.0001)),
+            dtype=np.intp)
+
+        # Gnomonic projection about the center turns great circles into
+        # straight lines, so an ordinary point-in-polygon test is exact.
+        east = np.cross([0, 0, 1.], center)
+        if np.sqrt((east**2).sum()) < 1e-12:
+            east = np.array([1., 0, 0])
+        east /= np.sqrt((east**2).sum())
+        north = np.cross(center, east)
+
+        def project(xyz):
+            along = xyz.dot(center)
+            return xyz.dot(east) / along, xyz.dot(north) / along
+
+        vx, vy = project(vertices)
+        px, py = project(self.xyz[candidates])
+
+        # Even-odd rule, one edge at a time (a polygon has few edges).
+        inside = np.zeros(len(candidates), dtype=bool)
+        for x1, y1, x2, y2 in zip(vx, vy, np.roll(vx, -1), np.roll(vy, -1)):
+            crosses = (y1 > py) != (y2 > py)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cross = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= crosses & (px < x_cross)
+
+        # points on the far side of the sphere also project into the plane
+        inside &= self.xyz[candidates].dot(center) > 0
+
+        return candidates[inside]
+
+
+def nearest_match(ra1, dec1, index, max_match, mode='nearest'):
+    """
+    Matches each position in a primary list to its nearest indexed row.
+
+    A vectorized, KD-tree replacement for `match.core_match()`: every
+    primary position is queried against the tree in one call.
+
+    Parameters
+    ----------
+    ra1, dec1 : array_like
+        Coordinates of the primary positions, in the units of `index`.
+    index : SkyIndex
+        Index over the secondary catalog.
+    max_match : float
+        Largest allowed separation, in arcseconds.
+    mode : {'nearest'|'mutual'|'one-to-one'}, optional
+        'nearest' (the default) lets several primary positions claim 
+        the same secondary row. 'mutual' only keeps a match if each is
+        the other's nearest neighbor. 'one-to-one' hands out secondary 
+        rows closest pair first, each to at most one primary position.
+
+    Returns
+    -------
+    match_index : np.ndarray of int
+        Index into the secondary catalog of each primary position's
+        match, or -1 if none is within `max_match`.
+    separation : np.ndarray
+        Separation of that match, in arcseconds (NaN if none).
+
+    """
+
+    xyz = radec_to_xyz(index._from_units(ra1), index._from_units(dec1))
+
+    return nearest_match_xyz(xyz, index, max_match, mode=mode)
+
+
+match_modes = ('nearest', 'mutual', 'one-to-one')
+
+
+def nearest_match_xyz(xyz, index, max_match, return_diagnostics=False,
+                      mode='nearest'):
+    """
+    Like `nearest_match()`, for primary positions already as unit vectors.
+
+    Useful when one primary is matched against many catalogs: its unit
+    vectors (e.g. `SkyIndex.xyz`) only need computing once. The `mode`
+    works just the same.
+
+    With `return_diagnostics`, also reports how ambiguous each match 
+    is, from the same tree query: how many candidates fell inside 
+    `max_match`, and how far away the runner-up was.
+
+    Returns
+    -------
+    match_index, separation : np.ndarray
+        As in `nearest_match()`.
+    n_candidates : np.ndarray of int
+        Only if `return_diagnostics`: number of indexed rows within
+        `max_match` of each primary position.
+    second_separation : np.ndarray
+        Only if `return_diagnostics`: separation of the second-nearest
+        row within `max_match`, in arcseconds (NaN if none).
+
+    """
+
+    if mode not in match_modes:
+        raise ValueError("Match mode must be one of %s, not '%s'" % 
+                         (", ".join(match_modes), mode))
+
+    xyz = np.asarray(xyz)
+    max_chord = angle_to_chord(np.radians(max_match / 3600))
+
+    # Resolving conflicts needs every candidate pair, not just the nearest.
+    if return_diagnostics or mode != 'nearest':
+        distance, neighbor = _neighbors_within(xyz, index.tree, max_chord, k=2)
+    else:
+        distance, neighbor = _neighbors_within(xyz, index.tree, max_chord, 
+                                               k=1, exhaustive=False)
+
+    if mode == 'nearest':
+        matched = np.isfinite(distance[:, 0])
+        match_index = np.where(matched, neighbor[:, 0], -1)
+        match_distance = distance[:, 0]
+    else:
+        match_index, match_distance = _assign_pairs(
+            distance, neighbor, one_to_one=(mode == 'one-to-one'))
+
+    def chord_to_arcsec(chords):
+        arcsec = np.nan * np.ones(len(chords))
+        finite = np.isfinite(chords)
+        arcsec[finite] = np.degrees(chord_to_angle(chords[finite])) * 3600
+        return arcsec
+
+    separation = chord_to_arcsec(match_distance)
+
+    if not return_diagnostics:
+        return match_index, separation
+
+    n_candidates = np.isfinite(distance).sum(axis=1)
+    second_separation = chord_to_arcsec(distance[:, 1])
+
+    return match_index, separation, n_candidates, second_separation
+
+
+def _assign_pairs(distance, neighbor, one_to_one=False):
+    """
+    Resolves candidate pairs into mutual-best or one-to-one matches.
+
+    The candidate pairs are laid out in one list, sorted by distance 
+    (ties broken by primary row, then secondary row). A pair is a 
+    mutual best match if it comes first among the pairs of its primary
+    row and first among those of its secondary row. For one-to-one
+    matching, we accept every mutual best pair, drop all the other 
+    pairs that involve either of their rows, and go again: that ends 
+    up the same as walking down the sorted list and taking each pair 
+    whose rows are both still free, without the Python loop.
+
+    Parameters
+    ----------
+    distance, neighbor : np.ndarray
+        Output of `_neighbors_within()`, with `exhaustive` on.
+    one_to_one : bool, optional
+        Keep going until no pair is left? Default False (mutual only).
+
+    Returns
+    -------
+    match_index : np.ndarray of int
+        Matched secondary row of each primary row, or -1.
+    match_distance : np.ndarray
+        Chord distance of each match (inf if none).
+
+    """
+
+    n_primary = len(distance)
+
+    candidate = np.isfinite(distance)
+    primary = np.nonzero(candidate)[0]
+    secondary = neighbor[candidate]
+    chord = distance[candidate]
+
+    order = np.lexsort((secondary, primary, chord))
+    primary, secondary, chord = primary[order], secondary[order], chord[order]
+
+    match_index = -1 * np.ones(n_primary, dtype=np.intp)
+    match_distance = np.inf * np.ones(n_primary)
+
+    primary_taken = np.zeros(n_primary, dtype=bool)
+    secondary_taken = np.zeros(neighbor.max() + 1 if neighbor.size else 0, 
+                               dtype=bool)
+
+    alive = np.arange(len(chord))
+
+    while len(alive) > 0:
+
+        # np.unique's return_index gives each row's first (best) pair
+        best = np.zeros(len(alive), dtype=bool)
+        best[np.unique(primary[alive], return_index=True)[1]] = True
+        best_too = np.zeros(len(alive), dtype=bool)
+        best_too[np.unique(secondary[alive], return_index=True)[1]] = True
+
+        accepted = alive[best & best_too]
+
+        match_index[primary[accepted]] = secondary[accepted]
+        match_distance[primary[accepted]] = chord[accepted]
+
+        if not one_to_one:
+            break
+
+        primary_taken[primary[accepted]] = True
+        secondary_taken[secondary[accepted]] = True
+
+        alive = alive[~primary_taken[primary[alive]] & 
+                      ~secondary_taken[secondary[alive]]]
+
+    return match_index, match_distance
+
+
+def _neighbors_within(xyz, tree, max_chord, k=1, exhaustive=True):
+    """
+    Every row of a cKDTree within `max_chord` of each position, nearest first.
+
+    Asks the tree for the `k` nearest neighbors; if `exhaustive`, any
+    position whose `k` neighbors were all in range is asked again with
+    twice the `k`, until everyone's list ends in a miss (or in the 
+    whole index). Match radii are small, so that hardly ever takes a 
+    second round.
+
+    Returns
+    -------
+    distance : np.ndarray
+        Array of shape (N, K), K >= `k`: chord distance to each 
+        neighbor in range, padded with inf.
+    neighbor : np.ndarray of int
+        Array of shape (N, K): the matching row indices, padded with 
+        the number of rows in the tree.
+
+    """
+
+    n_index = tree.n
+
+    distance = np.inf * np.ones((len(xyz), k))
+    neighbor = n_index * np.ones((len(xyz), k), dtype=np.intp)
+
+    if n_index == 0 or len(xyz) == 0:
+        return distance, neighbor
+
+    todo = np.arange(len(xyz))
+
+    while True:
+        k_query = min(k, n_index)
+        d, n = tree.query(xyz[todo], k=k_query, 
+                          distance_upper_bound=max_chord)
+        d = d.reshape(len(todo), k_query)
+        n = n.reshape(len(todo), k_query)
+
+        distance[todo, :k_query] = d
+        neighbor[todo, :k_query] = n
+
+        full = np.isfinite(d[:, -1])
+        if not exhaustive or k_query == n_index or not np.any(full):
+            break
+
+        todo = todo[full]
+        k = 2*k
+        distance = np.hstack((distance, np.inf * np.ones(distance.shape)))
+        neighbor = np.hstack((neighbor, n_index * np.ones(neighbor.shape,
+                                                          dtype=np.intp)))
+
+    return distance, neighbor
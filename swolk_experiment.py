@@ -12,6 +12,9 @@ and
 
 """
 
+import os
+from collections import OrderedDict
+
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -20,28 +23,42 @@ import robust as rb
 from tablemate_comparisons import ukvar_spread as ukvar_s
 from tablemate_comparisons import ukvar_periods
 from plot2 import plot_trajectory_vanilla
-from tablemate_script import (XMM_north, XMM_north_c1, 
-                              XMM_north_c2, XMM_north_c3,
-                              Megeath2012, Megeath_P, Megeath_D, Megeath_ND)
-from tablemate_core import tablemater, TableParameters
-from official_star_counter import autocan_strict, autocan_true
+from tablemate_script import (XMM_north, Megeath2012, Megeath_ND,
+                              tablemate_cache_dir)
+from tablemate_core import (tablemater, tablemater_partitioned, 
+                            IndexedSurvey, write_survey_index,
+                            survey_index_filename)
+from official_star_counter import (spread, autocan_strict, autocan_true,
+                                   cand_case1, cand_case2, case3)
+
+# The UKIRT spreadsheet is the big table that doesn't change, so it gets
+# indexed once and saved; each catalog we compare to it is then just a
+# quick query. (The filename is keyed on the spreadsheet's contents, so
+# a remade spreadsheet gets a fresh index.)
+ukirt_subsets = {'autocan_strict': cand_case1 & case3,
+                 'autocan_true': (cand_case1 | cand_case2) & case3}
+ukirt_index_filename = survey_index_filename(spread, tablemate_cache_dir,
+                                             "ukirt_spread_index",
+                                             subsets=ukirt_subsets)
+if not os.path.exists(ukirt_index_filename):
+    if not os.path.isdir(tablemate_cache_dir):
+        os.makedirs(tablemate_cache_dir)
+    write_survey_index(spread, ukirt_index_filename, subsets=ukirt_subsets)
 
 # We'll be "mating" these tables to the XMM data.
-Ukirt_autocan_strict = TableParameters(
-    data = autocan_strict,
+# (The subsets are the same selections as autocan_strict and autocan_true,
+#  so "_index" columns count rows of those tables.)
+Ukirt_autocan_strict = IndexedSurvey(
+    ukirt_index_filename,
     alias = "UKIRT_autocan_strict_allstars",
     full_name = "Master spreadsheet for 2436 stars in the UKIRT data that have 'pristine' data quality in all 3 bands.",
-    ra_cols = ['RA'], dec_cols=['DEC'],
-    radec_fmt = 'decimal-radians',
-    name_col = 'SOURCEID')
+    subset = 'autocan_strict')
     
-Ukirt_autocan_true = TableParameters(
-    data = autocan_true,
+Ukirt_autocan_true = IndexedSurvey(
+    ukirt_index_filename,
     alias = "UKIRT_autocan_true_allstars",
     full_name = "Master spreadsheet for 3705 stars in the UKIRT data that have 'pristine' data quality in at least 1 band.",
-    ra_cols = ['RA'], dec_cols=['DEC'],
-    radec_fmt = 'decimal-radians',
-    name_col = 'SOURCEID')
+    subset = 'autocan_true')
 
 ukirt_list = [Ukirt_autocan_strict, Ukirt_autocan_true]
 
@@ -56,11 +73,22 @@ def match_xmm_to_ukirt():
     """
 
     # Produces a table of cross-match IDs and indices.
-    mated_xmm = tablemater(XMM_north, ukirt_list)
-    
-    mated_c1 =  tablemater(XMM_north_c1, ukirt_list)
-    mated_c2 =  tablemater(XMM_north_c2, ukirt_list)
-    mated_c3 =  tablemater(XMM_north_c3, ukirt_list)
+    # The class subsets are slices of XMM_north, so we match it once
+    # and split the mated table (same selections, and same column names,
+    # as XMM_north_c1/c2/c3).
+    xmm_data = XMM_north.data
+    mated_xmm, mated_classes = tablemater_partitioned(
+        XMM_north, ukirt_list,
+        OrderedDict([('c1', xmm_data.proto == 1),
+                     ('c2', xmm_data.disks == 1),
+                     ('c3', xmm_data.c3cnd == "1")]),
+        aliases={'c1': "XMMnorth_c1", 'c2': "XMMnorth_c2", 
+                 'c3': "XMMnorth_c3"},
+        cache_dir=tablemate_cache_dir)
+
+    mated_c1 = mated_classes['c1']
+    mated_c2 = mated_classes['c2']
+    mated_c3 = mated_classes['c3']
 
     mated_list = [mated_xmm, mated_c1, mated_c2, mated_c3]
 
@@ -159,13 +187,19 @@ def match_spitzer_to_ukirt():
     """
 
     # Produces a table of cross-match IDs and indices.
-    mated_spitzer = tablemater(Megeath2012, ukirt_list)
-    
-    # Clearly, we need to update this to use slices of the Megeath table
-    # filtered on Class.
-    mated_P =  tablemater(Megeath_P, ukirt_list)
-    mated_D =  tablemater(Megeath_D, ukirt_list)
-    mated_ND = tablemater(Megeath_ND, ukirt_list)
+    # P and D are slices of Megeath2012 on Class, so match it once and
+    # split the mated table by that column (named as Megeath_P/D were).
+    mated_spitzer, mated_classes = tablemater_partitioned(
+        Megeath2012, ukirt_list, 'Class', values=['P', 'D'],
+        aliases={'P': "Megeath2012_P", 'D': "Megeath2012_D"},
+        cache_dir=tablemate_cache_dir)
+
+    mated_P = mated_classes['P']
+    mated_D = mated_classes['D']
+    # The non-disked sources come from the full Spitzer catalog, not 
+    # from Megeath2012, so they need their own match.
+    mated_ND = tablemater(Megeath_ND, ukirt_list,
+                          cache_dir=tablemate_cache_dir)
 
     mated_list = [mated_P, mated_D, mated_ND]
 
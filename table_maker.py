@@ -40,7 +40,7 @@ from tablemate_comparisons import (mated_ukvar, ukvar_spread,
                                    ukvar_periods, source_period_digger)
 from tablemate_script import (Megeath2012, Megeath_P, Megeath_D,
                               Megeath_Full, Megeath_Allgoodsources,
-                              XMM_north, Rice_UKvars)
+                              XMM_north, Rice_UKvars, tablemate_cache_dir)
 from tablemate_core import index_secondary_by_primary, tablemater
 
 # from montage_script import conf_subj_periodics, conf_subj_nonpers
@@ -49,17 +49,21 @@ dropbox_bo = os.path.expanduser("~/Dropbox/Bo_Tom/")
 output_directory = dropbox_bo+"paper/publication_tables/"
 
 
-# Let's grab IRAC colors from Megeath.
+# Let's grab IRAC colors from Megeath. We only ever read a handful of
+# columns from these, so they're lazy views (unmatched rows masked).
 megeath2012_by_ukvar = index_secondary_by_primary(mated_ukvar, 
-                                                  Megeath2012)
+                                                  Megeath2012, lazy=True)
 megeath2012_full_by_ukvar = index_secondary_by_primary(mated_ukvar, 
-                                                       Megeath_Full)
+                                                       Megeath_Full, 
+                                                       lazy=True)
 megeath2012_all_by_ukvar = index_secondary_by_primary(mated_ukvar,
-                                                      Megeath_Allgoodsources)
+                                                      Megeath_Allgoodsources,
+                                                      lazy=True)
 
 # XMM catalog gets matched too.
 XMM_north_by_ukvar = index_secondary_by_primary(
-    tablemater(Rice_UKvars, [XMM_north]), XMM_north)
+    tablemater(Rice_UKvars, [XMM_north], cache_dir=tablemate_cache_dir), 
+    XMM_north, lazy=True)
 
 # And let's make some color slope references that we like.
 jhk_slope_reference = filter_color_slopes(autovars_strict, 'jhk',
@@ -128,11 +132,12 @@ def make_megeath_class_column():
 
     """
 
-    megeath_class_column = np.copy(megeath2012_by_ukvar.Class)
+    megeath_class_column = np.copy(megeath2012_by_ukvar.Class.filled())
+    megeath_all_IDL_index = megeath2012_all_by_ukvar.IDL_index.filled()
 
     for i in range(len(megeath_class_column)):
         if (megeath_class_column[i] == 'na' and
-            megeath2012_all_by_ukvar.IDL_index[i] > 0) :
+            megeath_all_IDL_index[i] > 0) :
             megeath_class_column[i] = 'ND'
 
     return megeath_class_column
@@ -149,19 +154,23 @@ def make_xmm_class_column():
     
     """
 
-    xmm_class_column = np.zeros_like(XMM_north_by_ukvar.disks, dtype='|S2')
+    proto = XMM_north_by_ukvar.proto.filled()
+    disks = XMM_north_by_ukvar.disks.filled()
+    c3cnd = XMM_north_by_ukvar.c3cnd.filled()
+
+    xmm_class_column = np.zeros_like(disks, dtype='|S2')
 
     for i in range(len(xmm_class_column)):
         
-        if XMM_north_by_ukvar.proto[i] == 1: xmm_class_column[i] = 'P'
+        if proto[i] == 1: xmm_class_column[i] = 'P'
 
-        elif XMM_north_by_ukvar.disks[i] == 1: xmm_class_column[i] = 'D'
+        elif disks[i] == 1: xmm_class_column[i] = 'D'
 
-        elif XMM_north_by_ukvar.c3cnd[i] == '1': xmm_class_column[i] = 'C3'
+        elif c3cnd[i] == '1': xmm_class_column[i] = 'C3'
 
-        elif ((XMM_north_by_ukvar.proto[i] == 0) & 
-              (XMM_north_by_ukvar.disks[i] == 0) & 
-              (XMM_north_by_ukvar.c3cnd[i] == '0')): xmm_class_column[i] = 'na'
+        elif ((proto[i] == 0) & 
+              (disks[i] == 0) & 
+              (c3cnd[i] == '0')): xmm_class_column[i] = 'na'
         else:
             xmm_class_column[i] = 'na'
         
@@ -211,14 +220,14 @@ def t_table1_radec_xref_jhk_irac(write=False):
         ('Median H mag error', ukvar_spread.h_err_median, '%.3f'),
         ('Median K mag', ukvar_spread.k_median, '%.3f'),
         ('Median K mag error', ukvar_spread.k_err_median, '%.3f'),
-        ('Spitzer [3.6] mag', megeath2012_full_by_ukvar['3.6'], '%.3f'),
-        ('Spitzer [3.6] mag error', megeath2012_full_by_ukvar['e_3.6'], '%.3f'),
-        ('Spitzer [4.5] mag', megeath2012_full_by_ukvar['4.5'], '%.3f'),
-        ('Spitzer [4.5] mag error', megeath2012_full_by_ukvar['e_4.5'], '%.3f'),
-        ('Spitzer [5.8] mag', megeath2012_full_by_ukvar['5.8'], '%.3f'),
-        ('Spitzer [5.8] mag error', megeath2012_full_by_ukvar['e_5.8'], '%.3f'),
-        ('Spitzer [8.0] mag', megeath2012_full_by_ukvar['8'], '%.3f'),
-        ('Spitzer [8.0] mag error', megeath2012_full_by_ukvar['e_8'], '%.3f'),
+        ('Spitzer [3.6] mag', megeath2012_full_by_ukvar['3.6'].filled(), '%.3f'),
+        ('Spitzer [3.6] mag error', megeath2012_full_by_ukvar['e_3.6'].filled(), '%.3f'),
+        ('Spitzer [4.5] mag', megeath2012_full_by_ukvar['4.5'].filled(), '%.3f'),
+        ('Spitzer [4.5] mag error', megeath2012_full_by_ukvar['e_4.5'].filled(), '%.3f'),
+        ('Spitzer [5.8] mag', megeath2012_full_by_ukvar['5.8'].filled(), '%.3f'),
+        ('Spitzer [5.8] mag error', megeath2012_full_by_ukvar['e_5.8'].filled(), '%.3f'),
+        ('Spitzer [8.0] mag', megeath2012_full_by_ukvar['8'].filled(), '%.3f'),
+        ('Spitzer [8.0] mag error', megeath2012_full_by_ukvar['e_8'].filled(), '%.3f'),
         ('Class (from Megeath et al. 2012)', make_megeath_class_column(), '%s') ]
 
     column_to_format = {}
@@ -19,7 +19,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 from tablemate_script import *
-from period_digger import period_funcs
+from period_digger import period_funcs, period_get_all_funcs
 from official_star_counter import *
 from montage_script import conf_subj_periodics, conf_subj_nonpers
 
@@ -101,12 +101,13 @@ ukvar_periods = period_array_maker(ukvar_spread)
 
 
 
-def source_tablematch_counter(table, matches='All'):
+def match_matrix(table, matches='All'):
     """
-    Counts how many times each source has a match.
+    Flags which sources are matched in which columns, all at once.
 
-    Compares the sources in the primary table to the matched tables
-    that have already been cross-matched using tablemate_script.
+    Builds the matrix a column at a time: an _index non-match is -1,
+    and a _name non-match is '' (so string columns are compared to ''
+    and everything else to -1).
 
     Parameters
     ----------
@@ -114,14 +115,15 @@ def source_tablematch_counter(table, matches='All'):
         Output of tablemate_script containing desired sources.
     matches : {list of str | 'All'}, optional
         Which columns of the mated table do we want to scan?
-        Default is 'All', i.e. any column that ends in _name, _ID, or _index.
- 
+        Default is 'All', i.e. any column that ends in _name or _index.
+
     Returns
     -------
-    n_matches : np.array
-        Array of "how many matches" per source. Amenable to calling 
-        histograms upon, or for finding how many sources have 
-        'so many' matches, etc.
+    matched : np.ndarray of bool
+        Array of shape (len(table), len(columns_list)); True where a
+        source has a match in that column.
+    columns_list : list of str
+        The columns that were scanned, in the order of `matched`.
 
     """
 
@@ -133,54 +135,103 @@ def source_tablematch_counter(table, matches='All'):
     else:
         columns_list = matches
 
-    # construct a return array that corresponds to the index of the table
-    n_matches = np.zeros(len(table), dtype=int)
+    matched = np.empty((len(table), len(columns_list)), dtype=bool)
 
-    # now start scanning through the rows and columns:
-    for i in range(len(table)):
+    for j, column in enumerate(columns_list):
 
-        for column in columns_list:
+        values = np.asarray(table[column])
 
-            # an _index mismatch is -1, a _name mismatch is ''.
-            if table[column][i] != -1 and table[column][i] != '':
+        if values.dtype.kind in 'SU':
+            matched[:, j] = values != values.dtype.type('')
+        else:
+            matched[:, j] = values != -1
 
-                n_matches[i] += 1
+    return matched, columns_list
 
-    return n_matches
 
-def table_tablematch_counter(table):
+def tablematch_counts(table, matches='All'):
     """
-    Counts how many stars are matched to each input table.
+    Counts matches per source and per table, from one match matrix.
 
     Parameters
     ----------
     table : atpy.Table
-        Output of tablemate_script containing desired sources and columns.
+        Output of tablemate_script containing desired sources.
+    matches : {list of str | 'All'}, optional
+        Which columns of the mated table do we want to scan?
+        Default is 'All', i.e. any column that ends in _name or _index.
 
     Returns
     -------
+    n_matches : np.array
+        Array of "how many matches" per source, as from 
+        source_tablematch_counter().
     match_dict : dict
-        Mapping of table -> how many sources matched to that table.
+        Mapping of table -> how many sources matched to that table,
+        as from table_tablematch_counter().
+    matched : np.ndarray of bool
+        The match matrix itself, for other queries; see match_matrix().
+    columns_list : list of str
+        The columns of `matched`.
 
     """
 
+    matched, columns_list = match_matrix(table, matches)
+
+    n_matches = matched.sum(axis=1).astype(int)
+
     match_dict = {}
-    columns_list = [x for x in table.columns.keys if 
-                    '_index' in x or '_name' in x]
+    for column_name, n in zip(columns_list, matched.sum(axis=0)):
+        table_name = column_name.rstrip('_index').rstrip('_name')
+        match_dict[table_name] = int(n)
 
-    for column_name in columns_list:
+    return n_matches, match_dict, matched, columns_list
 
-        if '_name' in column_name:
-            n_matches = len(table[column_name][table[column_name] != ''])
 
-        else:
-            n_matches = len(table[column_name][table[column_name] != -1])
+def source_tablematch_counter(table, matches='All'):
+    """
+    Counts how many times each source has a match.
 
-        table_name = column_name.rstrip('_index').rstrip('_name')
+    Compares the sources in the primary table to the matched tables
+    that have already been cross-matched using tablemate_script.
 
-        match_dict[table_name] = n_matches
+    Parameters
+    ----------
+    table : atpy.Table
+        Output of tablemate_script containing desired sources.
+    matches : {list of str | 'All'}, optional
+        Which columns of the mated table do we want to scan?
+        Default is 'All', i.e. any column that ends in _name or _index.
+ 
+    Returns
+    -------
+    n_matches : np.array
+        Array of "how many matches" per source. Amenable to calling 
+        histograms upon, or for finding how many sources have 
+        'so many' matches, etc.
+
+    """
+
+    return tablematch_counts(table, matches)[0]
+
+
+def table_tablematch_counter(table):
+    """
+    Counts how many stars are matched to each input table.
+
+    Parameters
+    ----------
+    table : atpy.Table
+        Output of tablemate_script containing desired sources and columns.
+
+    Returns
+    -------
+    match_dict : dict
+        Mapping of table -> how many sources matched to that table.
+
+    """
 
-    return match_dict
+    return tablematch_counts(table)[1]
 
 
 def how_many_stars_are_new():
@@ -228,22 +279,11 @@ def source_period_digger(table):
 
     period_table = atpy.Table()
 
-    gcvs_pers = np.zeros(len(table))
-    chs01_pers = np.zeros(len(table))
-    ysovar_pers = np.zeros(len(table))
-    herbst_pers = np.zeros(len(table))
-    parihar_pers = np.zeros(len(table))
-    rl09_pers = np.zeros(len(table))
-    
-    period_columns = [gcvs_pers, chs01_pers, ysovar_pers, 
-                      herbst_pers, parihar_pers, rl09_pers]
-    
-    for i in range(len(table)):
-        for period_get, period_col in zip(period_funcs, period_columns):
-            per = period_get(table, i)
-            period_col[i] = per
+    # one vectorized lookup per literature catalog
+    (gcvs_pers, chs01_pers, ysovar_pers, 
+     herbst_pers, parihar_pers, rl09_pers) = [
+        period_get_all(table) for period_get_all in period_get_all_funcs]
 
-    
     # build and return the table
     for j in range(3):
         period_table.add_column(table.columns.keys[j], 
@@ -9,24 +9,39 @@ I hope to be able to implement this in two pieces:
 The two-pieced-ness could be either two files or a single one 
 (with some "only execute this part if this is __main__" magic, or something).
 
-Heavy (or at least central) dependency on the functions I wrote a long time
-ago in `match.py` is expected.
+The matching itself used to be done by `match.core_match()`, from the 
+functions I wrote a long time ago in `match.py`; it is now done with a
+KD-tree (see `sky_index.py`), built once per catalog.
 
 """
 
 import copy
+import hashlib
+import os
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 
 import numpy as np
 import astropy.table
 
 import atpy
-try:
-    import coords
-except ImportError:
-    import astrolib.coords as coords
 
-import match
 import official_star_counter as osc
+import sexagesimal
+from sky_index import SkyIndex, nearest_match_xyz, propagate_radec
+from ipac_stream import StreamingCatalog
+
+def _positions_hash(ra, dec):
+    """ A hex digest of a table's decimal-degree RA and Dec arrays. """
+
+    sha = hashlib.sha1()
+    for coordinate in (ra, dec):
+        coordinate = np.ascontiguousarray(coordinate, dtype=np.float64)
+        sha.update(str(coordinate.shape).encode('ascii'))
+        sha.update(coordinate.tobytes())
+
+    return sha.hexdigest()
+
 
 # I think I'm gonna have to make a Table_Parameters class
 class TableParameters(object):
@@ -37,7 +52,7 @@ class TableParameters(object):
     
     def __init__(self, data, alias, full_name, 
                  ra_cols, dec_cols, radec_fmt,
-                 name_col, max_match = 1.0):
+                 name_col, max_match = 1.0, pm_cols = None, epoch = 2000.0):
         """
         Initializing method.
 
@@ -60,6 +75,14 @@ class TableParameters(object):
         max_match : float, optional
             Largest possible match radius for this table, in arcseconds. 
             Default value: 1.0
+        pm_cols : list of str, optional
+            Columns holding proper motions in RA and Dec, in mas/yr 
+            (with the cos(Dec) factor in the RA one, as catalogs give it).
+            Default None: the stars don't move.
+        epoch : float or str, optional
+            The Julian-year epoch of the positions, or the name of a 
+            column giving each row's epoch. Only matters with `pm_cols`.
+            Default 2000.0.
         data : atpy.Table
         
         """
@@ -90,6 +113,8 @@ class TableParameters(object):
         self.radec_fmt = radec_fmt
         self.name_col = name_col
         self.max_match = max_match
+        self.pm_cols = pm_cols
+        self.epoch = epoch
 
         # Now, the logic that makes the RA and Dec columns uniform.
         
@@ -110,6 +135,8 @@ class TableParameters(object):
         # 1. Simple: single-column, decimal format (degrees, hours, or radians)
         # 2. Complex SC: single-column of STRINGS in sex format 
         # 3. Complex TC: triple-column of numbers or strings in sex format
+        # (Cases 2 and 3 are converted a whole column at a time; see 
+        #  sexagesimal.py.)
         # 4. "other"
 
         # Determine or construct decimal-degree RA and Dec columns.
@@ -134,82 +161,428 @@ class TableParameters(object):
                 self.RA = np.degrees(ra_raw)
                 self.DEC = np.degrees(dec_raw)
 
+        # Single-column of sexagesimal strings.
+        elif 'sex' in radec_fmt.lower() and len(ra_cols) == len(dec_cols) == 1:
+
+            print "Case 2"
+
+            self.RA, self.DEC = sexagesimal.strings_to_degrees(
+                self.data[ra_cols[0]], self.data[dec_cols[0]])
+
         # More complicated: triple-column, sexagesimal format.
         elif 'sex' in radec_fmt.lower():
             if len(ra_cols) == len(dec_cols) == 3:
 
                 print "Case 3"
 
-                rhcol, rmcol, rscol = (self.data[ra_cols[0]],
-                                       self.data[ra_cols[1]],
-                                       self.data[ra_cols[2]])
-                ddcol, dmcol, dscol = (self.data[dec_cols[0]],
-                                       self.data[dec_cols[1]],
-                                       self.data[dec_cols[2]])
-                
-                ra_decimal = []
-                dec_decimal = []
-                
-                for (rh, rm, rs, 
-                     dd, dm, ds) in zip( rhcol, rmcol, rscol,
-                                         ddcol, dmcol, dscol ):
-                     coord_string = ("%02d:%02d:%05.2f %03d:%02d:%05.2f" %
-                                     (rh, rm, rs, dd, dm, ds) )
-                     coord = coords.Position( coord_string )
-                     radec_dd = coord.dd()
-                     
-                     ra_decimal.append( radec_dd[0] )
-                     dec_decimal.append( radec_dd[1] )
-                
-                self.RA = np.array(ra_decimal)
-                self.DEC = np.array(dec_decimal)
+                self.RA, self.DEC = sexagesimal.columns_to_degrees(
+                    [self.data[col] for col in ra_cols],
+                    [self.data[col] for col in dec_cols])
 
 # This is if the SIGN (+/-) of the Declination is stored as its own column.
             elif len(dec_cols) == 4:
 
                 print "Case 3.5"
 
-                rhcol, rmcol, rscol = (self.data[ra_cols[0]],
-                                       self.data[ra_cols[1]],
-                                       self.data[ra_cols[2]])
-                sign_col, ddcol, dmcol, dscol = (self.data[dec_cols[0]],
-                                                 self.data[dec_cols[1]],
-                                                 self.data[dec_cols[2]],
-                                                 self.data[dec_cols[3]])
-                
-                ra_decimal = []
-                dec_decimal = []
-                
-                for (rh, rm, rs, sign,
-                     dd, dm, ds) in zip( rhcol, rmcol, rscol, sign_col,
-                                         ddcol, dmcol, dscol ):
-                     coord_string = ("%02d:%02d:%05.2f %s%02d:%02d:%05.2f" %
-                                     (rh, rm, rs, sign, dd, dm, ds) )
-                     coord = coords.Position( coord_string )
-                     radec_dd = coord.dd()
-                     
-                     ra_decimal.append( radec_dd[0] )
-                     dec_decimal.append( radec_dd[1] )
-                
-                self.RA = np.array(ra_decimal)
-                self.DEC = np.array(dec_decimal)
+                self.RA, self.DEC = sexagesimal.columns_to_degrees(
+                    [self.data[col] for col in ra_cols],
+                    [self.data[col] for col in dec_cols])
 
             else:
                 print "I don't yet know how to deal with this."
-                    
-                
-            # For each row 
-            pass # until I implement the above
-#        elif None
-#            if 'deg' in 
+
+    @property
+    def sky_index(self):
+        """
+        A SkyIndex over this table's (decimal-degree) positions.
+
+        Built the first time it's asked for, then kept, so that a table
+        matched against many others only has its tree built once.
+
+        """
+
+        if getattr(self, '_sky_index', None) is None:
+            self._sky_index = SkyIndex(self.RA, self.DEC, units='degrees')
+
+        return self._sky_index
+
+    @property
+    def content_hash(self):
+        """
+        A hex digest of this table's (decimal-degree) positions.
+
+        Two tables with the same positions in the same order get the 
+        same hash, however they were loaded -- so it's safe to key 
+        cached match results on it. Computed once, then kept.
+
+        """
+
+        if getattr(self, '_content_hash', None) is None:
+            self._content_hash = _positions_hash(self.RA, self.DEC)
+
+        return self._content_hash
+
+    def positions_at(self, epoch):
+        """
+        This table's (decimal-degree) RA, DEC, moved to `epoch`.
+
+        Tables without proper motions (or `epoch` None) just give back
+        RA and DEC. Otherwise every row is propagated at once (see 
+        `sky_index.propagate_radec()`), and the result is kept per 
+        epoch, so matching against it again costs nothing.
+
+        Rows whose own epoch is missing (NaN, in an epoch column) stay
+        where they are, just like rows with NaN proper motions; we say
+        how many there were.
+
+        Parameters
+        ----------
+        epoch : float or None
+            Target epoch, in Julian years.
+
+        Returns
+        -------
+        RA, DEC : np.ndarray
+
+        Raises
+        ------
+        ValueError
+            If `epoch`, or the table's single catalog epoch, is NaN.
+        
+        """
+
+        if epoch is None or self.pm_cols is None:
+            return self.RA, self.DEC
+
+        propagated = self.__dict__.setdefault('_propagated', {})
+        epoch = float(epoch)
+        if np.isnan(epoch):
+            raise ValueError("Can't move %s to a NaN epoch." % self.alias)
+
+        if epoch not in propagated:
+            if isinstance(self.epoch, basestring):
+                catalog_epoch = np.asarray(self.data[self.epoch], 
+                                           dtype=np.float64)
+            elif np.isnan(self.epoch):
+                raise ValueError("%s has a NaN epoch." % self.alias)
+            else:
+                catalog_epoch = self.epoch
+
+            years = epoch - catalog_epoch
+            missing = np.isnan(years)
+            if np.any(missing):
+                print ("%s: %d rows have no epoch; leaving them unmoved." % 
+                       (self.alias, missing.sum()))
+                years = np.where(missing, 0., years)
+
+            ra, dec = propagate_radec(np.radians(self.RA), 
+                                      np.radians(self.DEC),
+                                      self.data[self.pm_cols[0]],
+                                      self.data[self.pm_cols[1]],
+                                      years)
+            propagated[epoch] = (np.degrees(ra), np.degrees(dec))
+
+        return propagated[epoch]
+
+    def sky_index_at(self, epoch):
+        """ Like `sky_index`, for positions moved to `epoch`. """
+
+        if epoch is None or self.pm_cols is None:
+            return self.sky_index
+
+        indexes = self.__dict__.setdefault('_sky_indexes_at', {})
+        epoch = float(epoch)
+
+        if epoch not in indexes:
+            indexes[epoch] = SkyIndex(*self.positions_at(epoch), 
+                                      units='degrees')
+
+        return indexes[epoch]
+
+    def content_hash_at(self, epoch):
+        """ Like `content_hash`, for positions moved to `epoch`. """
+
+        if epoch is None or self.pm_cols is None:
+            return self.content_hash
+
+        hashes = self.__dict__.setdefault('_content_hashes_at', {})
+        epoch = float(epoch)
+
+        if epoch not in hashes:
+            hashes[epoch] = _positions_hash(*self.positions_at(epoch))
+
+        return hashes[epoch]
+
+
+# Survey indexes already read in, by filename, so that several 
+# IndexedSurvey objects over one file share a single load.
+_loaded_survey_indexes = {}
+
+
+def write_survey_index(table, filename, ra_col='RA', dec_col='DEC', 
+                       units='radians', name_col='SOURCEID', subsets=None):
+    """
+    Saves a spatial index over a big survey table, for IndexedSurvey.
+
+    Parameters
+    ----------
+    table : atpy.Table
+        The survey table, e.g. the full UKIRT spreadsheet.
+    filename : str
+        Where to write the index (an .npz file).
+    ra_col, dec_col : str, optional
+        Names of the RA/Dec columns. Default 'RA', 'DEC'.
+    units : {'radians'|'degrees'}, optional
+        Units of the RA/Dec columns. Default 'radians', like the 
+        WFCAM spreadsheets.
+    name_col : str, optional
+        Column holding each source's name. Default 'SOURCEID'.
+    subsets : dict, optional
+        {name: boolean mask over `table`'s rows} for selections that 
+        get matched against on their own (e.g. 'autocan_strict').
+
+    Returns
+    -------
+    index : SkyIndex
+        The index that was saved.
+
+    """
+
+    index = SkyIndex.from_table(table, units=units, 
+                                ra_col=ra_col, dec_col=dec_col)
+    index.save(filename, ids=table[name_col], subsets=subsets)
+
+    _loaded_survey_indexes.pop(filename, None)
+
+    return index
+
+
+def survey_index_filename(table, directory, name, ra_col='RA', 
+                          dec_col='DEC', name_col='SOURCEID', subsets=None):
+    """
+    Where the index of a survey table, as it is now, belongs.
+
+    The filename carries a hash of the table's positions, names and
+    `subsets` masks, like tablemater()'s match caches do: remake the 
+    spreadsheet (or change a subset's cuts) and the old index simply
+    stops being found, rather than pointing at the wrong stars.
+
+    Parameters
+    ----------
+    table : atpy.Table
+        The survey table.
+    directory : str
+        Where the index lives.
+    name : str
+        The start of its filename, e.g. "ukirt_spread_index".
+    ra_col, dec_col, name_col, subsets : optional
+        As in `write_survey_index()`.
+
+    Returns
+    -------
+    filename : str
+        directory/name_<hash>.npz. Check whether it exists; if not,
+        `write_survey_index()` to it.
+
+    """
+
+    sha = hashlib.sha1()
+    sha.update(_positions_hash(table[ra_col], table[dec_col]).encode('ascii'))
+    sha.update(np.ascontiguousarray(table[name_col]).tobytes())
+    for subset_name in sorted(subsets or {}):
+        sha.update(subset_name.encode('ascii'))
+        sha.update(np.ascontiguousarray(subsets[subset_name], 
+                                        dtype=bool).tobytes())
+
+    return os.path.join(directory, "%s_%s.npz" % (name, 
+                                                  sha.hexdigest()[:16]))
+
+
+class IndexedSurvey(object):
+    """
+    A big, stable catalog to match small catalogs against, from disk.
+
+    Our own survey is the big table in most comparisons: X-ray and IR 
+    catalogs come and go, but the UKIRT spreadsheet stays put. So 
+    rather than re-reading and re-indexing it for every comparison,
+    we index it once (`write_survey_index()`) and load that index 
+    here; after that, matching a new catalog against it is just a 
+    tree query. 
+
+    Use it as the secondary table in tablemater(), with any 
+    TableParameters catalog as the primary. The "_index" column then
+    counts rows of the survey table (or of the chosen `subset` of it,
+    in its original order -- i.e. rows of `table.where(mask)`).
+
+    """
+
+    def __init__(self, index_filename, alias, full_name, subset=None,
+                 max_match=1.0):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        index_filename : str
+            An index written by `write_survey_index()`.
+        alias : str
+            A consise string describing the table's name.
+        full_name : str
+            The full name of the table.
+        subset : str, optional
+            Name of one of the saved subsets, to match against only
+            those rows. Default None (the whole survey).
+        max_match : float, optional
+            Largest possible match radius for this table, in arcseconds. 
+            Default value: 1.0
+
+        """
+
+        self.index_filename = index_filename
+        self.alias = alias
+        self.full_name = full_name
+        self.subset = subset
+        self.max_match = max_match
+
+        if index_filename not in _loaded_survey_indexes:
+            _loaded_survey_indexes[index_filename] = SkyIndex.load(
+                index_filename)
+        full_index = _loaded_survey_indexes[index_filename]
+
+        if subset is None:
+            self.sky_index = full_index
+        else:
+            self.sky_index = full_index.subset(subset)
+
+        self.RA = np.degrees(self.sky_index.ra)
+        self.DEC = np.degrees(self.sky_index.dec)
+
+    def __len__(self):
+        return len(self.sky_index)
+
+    def names_at(self, rows):
+        """ The names of the given rows (IDs saved with the index). """
+
+        return self.sky_index.ids[rows]
+
+    @property
+    def content_hash(self):
+        """ A hex digest of the positions, as for TableParameters. """
+
+        if getattr(self, '_content_hash', None) is None:
+            self._content_hash = _positions_hash(self.RA, self.DEC)
+
+        return self._content_hash
+
+
+def _match_job(job):
+    """
+    Matches one secondary table to the primary. Used by tablemater().
+
+    Lives at module level (and takes plain arrays and SkyIndexes) so 
+    that it can be shipped off to a process pool, too.
+
+    """
+
+    primary_xyz, secondary, max_match, mode = job
+
+    if isinstance(secondary, StreamingCatalog):
+        return secondary.match_xyz(primary_xyz, max_match, mode=mode)
+
+    return nearest_match_xyz(primary_xyz, secondary, max_match,
+                             return_diagnostics=True, mode=mode)
+
+
+def _secondary_matcher(secondary_table, epoch=None):
+    """ What _match_job() needs from a secondary table: its index. """
+
+    if isinstance(secondary_table, StreamingCatalog):
+        # never loaded whole; it reads itself in chunks as it matches
+        return secondary_table
+    elif isinstance(secondary_table, TableParameters):
+        return secondary_table.sky_index_at(epoch)
+    else:
+        return secondary_table.sky_index
+
+
+def _content_hash_at(table, epoch):
+    """ A table's positions hash, at `epoch` if it can move. """
+
+    if isinstance(table, TableParameters):
+        return table.content_hash_at(epoch)
+    else:
+        return table.content_hash
+
+
+def _match_cache_filename(cache_dir, primary_table, secondary_table, 
+                          mode='nearest', epoch=None):
+    """
+    Where the match of one secondary table to a primary gets cached.
+
+    The filename is a hash of both tables' positions (as matched, i.e.
+    propagated to `epoch`), the match radius and the match mode, so a 
+    changed catalog (or radius) simply misses the cache.
+    Each entry holds the `_match_fields` arrays.
+
+    """
+
+    key = hashlib.sha1(("%s %s %r %s" % (_content_hash_at(primary_table, 
+                                                          epoch),
+                                         _content_hash_at(secondary_table,
+                                                          epoch),
+                                         float(secondary_table.max_match),
+                                         mode)
+                        ).encode('ascii')).hexdigest()
+
+    return os.path.join(cache_dir, "match_%s.npz" % key)
+
+
+# What _match_job() returns, in order; also the arrays in a cache entry.
+_match_fields = ['match_index', 'separation', 
+                 'n_candidates', 'second_separation']
 
 
+def _load_cached_match(filename):
+    """ Reads a cached match (see `_match_fields`), or None. """
 
+    try:
+        cached = np.load(filename)
+    except (IOError, ValueError):
+        return None
 
-def tablemater(primary_table, secondary_table_list):
+    try:
+        return tuple(cached[field] for field in _match_fields)
+    except KeyError:
+        # written before we kept all of these; just match again
+        return None
+    finally:
+        cached.close()
+
+
+def _save_cached_match(filename, match_result):
+    """ Writes a match (see `_match_fields`) to the cache. """
+
+    # Write to a temporary file first, so that an interrupted session
+    # never leaves a half-written cache entry behind.
+    temporary_filename = filename + ".%d.tmp" % os.getpid()
+    with open(temporary_filename, 'wb') as f:
+        np.savez(f, **dict(zip(_match_fields, match_result)))
+    os.rename(temporary_filename, filename)
+
+
+def tablemater(primary_table, secondary_table_list, n_workers=1, 
+               executor=None, cache_dir=None, diagnostics=False,
+               mode='nearest', epoch=None):
     """ 
     Creates the mated table.
 
+    Each secondary table is matched independently, so they can be 
+    matched in parallel: pass `n_workers` > 1 to use a pool of threads
+    (the KD-tree queries release the GIL, so threads are enough), or
+    pass your own `executor` (e.g. a multiprocessing.Pool) to take 
+    full control. The columns always come out in the order of 
+    `secondary_table_list`.
+
     Parameters
     ----------
     primary_table : TableParameters instance
@@ -218,6 +591,44 @@ def tablemater(primary_table, secondary_table_list):
     secondary_table_list : array of TableParameters instance
         A list containing the other tables we're matching
         to our primary table, with their parameters.
+        Big IPAC tables can be given as `ipac_stream.StreamingCatalog`
+        instances instead, and are read a chunk at a time; our own 
+        survey, as an `IndexedSurvey` loaded from a saved index.
+    n_workers : int, optional
+        How many threads to match with, if no `executor` is given.
+        Default 1 (match one table after another).
+    executor : object with a `map` method, optional
+        A thread or process pool (multiprocessing or concurrent.futures)
+        to run the matches on. It is not shut down afterwards.
+    cache_dir : str, optional
+        A directory to keep match results in between sessions. Each 
+        secondary table's match is cached on its own, keyed on the 
+        positions in both tables and on its `max_match`, so adding a
+        new catalog to the list only costs one new match.
+        Default None (no caching).
+    diagnostics : bool, optional
+        Also add three columns per secondary table, to judge the 
+        matches by: alias+"_separation" (arcsec, NaN if unmatched), 
+        alias+"_n_candidates" (how many sources were within 
+        `max_match`) and alias+"_separation2" (the runner-up's 
+        separation, NaN if none). They come out of the same tree
+        query as the match itself. Default False.
+    mode : {'nearest'|'mutual'|'one-to-one'}, optional
+        How to settle several primary stars claiming the same 
+        secondary source. 'nearest' (the default) doesn't: each 
+        primary star just gets its nearest neighbor. 'mutual' only 
+        keeps matches where the two are each other's nearest 
+        neighbors. 'one-to-one' gives each secondary source to at most 
+        one primary star, closest pairs first. See 
+        `sky_index.nearest_match()`.
+    epoch : float, optional
+        Match positions as of this Julian-year epoch: every table 
+        given `pm_cols` is first moved along its proper motions from 
+        its own epoch (see `TableParameters.positions_at()`, which 
+        keeps the moved positions for next time). Tables without 
+        proper motions are matched where they are. Default None 
+        (match the positions as catalogued). NaN is refused with a 
+        ValueError.
     
     Returns
     -------
@@ -235,6 +646,9 @@ def tablemater(primary_table, secondary_table_list):
         
     """
 
+    if epoch is not None and np.isnan(epoch):
+        raise ValueError("Can't match at a NaN epoch.")
+
     # First, construct a table with columns belonging to Primary Table
     # : we'll be adding more columns later!
 
@@ -250,39 +664,441 @@ def tablemater(primary_table, secondary_table_list):
     if type(secondary_table_list) is not list:
         secondary_table_list = [secondary_table_list]
 
-    for st in secondary_table_list:
+    # Look up whatever we've matched before.
+    match_results = [None] * len(secondary_table_list)
+    if cache_dir is not None:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        cache_filenames = [_match_cache_filename(cache_dir, pt, st, mode,
+                                                 epoch)
+                           for st in secondary_table_list]
+        match_results = [_load_cached_match(filename) 
+                         for filename in cache_filenames]
+
+    to_match = [i for i, result in enumerate(match_results) if result is None]
+
+    # The primary's unit vectors are computed once and shared by every
+    # match; each secondary's tree is built once and cached on it.
+    if to_match:
+        primary_xyz = pt.sky_index_at(epoch).xyz
+
+    def job_maker():
+        for i in to_match:
+            st = secondary_table_list[i]
+            yield (primary_xyz, _secondary_matcher(st, epoch), 
+                   st.max_match, mode)
+
+    if not to_match:
+        new_results = []
+    elif executor is not None:
+        new_results = list(executor.map(_match_job, job_maker()))
+    elif n_workers > 1:
+        pool = ThreadPool(n_workers)
+        try:
+            # let the pool build the secondaries' trees in parallel, too
+            new_results = pool.map(
+                lambda i: _match_job(
+                    (primary_xyz, 
+                     _secondary_matcher(secondary_table_list[i], epoch), 
+                     secondary_table_list[i].max_match, mode)),
+                to_match)
+        finally:
+            pool.close()
+    else:
+        new_results = [_match_job(job) for job in job_maker()]
+
+    for i, result in zip(to_match, new_results):
+        match_results[i] = result
+        if cache_dir is not None:
+            _save_cached_match(cache_filenames[i], result)
+
+    for st, match_result in zip(secondary_table_list, match_results):
+
+        (mated_indices, separations, 
+         n_candidates, second_separations) = match_result
         
         # We are appending two columns to mated_table:
         #  secondary_table.alias+"_ID", (THING 1)
         #  secondary_table.alias+"_index", (THING 2)
-        # where things 1 and 2 are created using match.core_match
-
-        matches = match.core_match( pt.RA, pt.DEC, st.RA, st.DEC, 
-                                    max_match=st.max_match, verbose=False)
-        
-        # I like this solution!
-        mated_indices = matches[0]
+        # where things 1 and 2 come from a nearest-neighbor query of 
+        # the whole primary table against the secondary's KD-tree.
         
-        mated_names = st.data[st.name_col][mated_indices]
+        if isinstance(st, (StreamingCatalog, IndexedSurvey)):
+            mated_names = st.names_at(mated_indices)
+        else:
+            mated_names = st.data[st.name_col][mated_indices]
         # Enforce that -1 means failed match:
         mated_names[mated_indices == -1] = -1
 
         mated_table.add_column(st.alias+"_ID", mated_names)
         mated_table.add_column(st.alias+"_index", mated_indices)
 
+        # (careful: other code looks for "_index" or "_name" in column 
+        #  names to find the matches, so these names must avoid those)
+        if diagnostics:
+            mated_table.add_column(st.alias+"_separation", separations)
+            mated_table.add_column(st.alias+"_n_candidates", n_candidates)
+            mated_table.add_column(st.alias+"_separation2", 
+                                   second_separations)
+
     return mated_table
 
 
-def index_secondary_by_primary(mated_table, secondary_table):
+def partition_masks(data, partition_by, values=None):
+    """
+    Turns a partitioning recipe into one row mask per partition.
+
+    Parameters
+    ----------
+    data : atpy.Table
+        The table whose rows are being split up.
+    partition_by : str or dict
+        Either the name of a column of `data`, in which case each 
+        partition is the rows holding one value of that column, or 
+        a dict (preferably an OrderedDict) of {label: boolean mask}, 
+        for partitions that don't come from a single column (the 
+        masks needn't be disjoint).
+    values : list, optional
+        If partitioning by a column, which of its values to make 
+        partitions for. Default: every value that appears.
+
+    Returns
+    -------
+    masks : OrderedDict
+        {label: boolean mask over the rows of `data`}
+
+    """
+
+    if isinstance(partition_by, dict):
+        masks = OrderedDict()
+        for label, mask in partition_by.items():
+            mask = np.asarray(mask, dtype=bool)
+            if len(mask) != len(data):
+                raise ValueError("Partition %r has %d rows, but the table "
+                                 "has %d." % (label, len(mask), len(data)))
+            masks[label] = mask
+        return masks
+
+    column = np.asarray(data[partition_by])
+    if values is None:
+        values = np.unique(column)
+
+    return OrderedDict((value, column == value) for value in values)
+
+
+def partition_mated_table(mated_table, masks, aliases=None):
+    """
+    Splits a mated table into row subsets, one per mask.
+
+    Rows keep everything from the full match. Unless the slice is given
+    an alias, that includes the primary ID and "_index" columns: they 
+    keep the parent catalog's names, and "_index" still counts rows of 
+    the full primary table.
+
+    Parameters
+    ----------
+    mated_table : atpy.Table
+        Output of tablemater().
+    masks : dict
+        {label: boolean mask over the rows of `mated_table`}, 
+        e.g. from `partition_masks()`.
+    aliases : dict, optional
+        {label: alias} for slices that should look as if they had been
+        matched on their own, as a TableParameters with that alias: 
+        their primary columns become alias+"_ID" and alias+"_index", 
+        and "_index" counts rows of the slice.
+
+    Returns
+    -------
+    partitions : OrderedDict
+        {label: atpy.Table}, in the order of `masks`.
+
+    """
+
+    if aliases is None:
+        aliases = {}
+
+    id_name, index_name = mated_table.columns.keys[:2]
+
+    partitions = OrderedDict()
+    for label, mask in masks.items():
+        partition = mated_table.where(mask)
+        if label in aliases:
+            # row i of the parent is row slice_index[i] of the slice
+            slice_index = np.cumsum(mask) - 1
+            partition.data[index_name] = slice_index[
+                partition.data[index_name]]
+            partition.rename_column(id_name, aliases[label]+"_ID")
+            partition.rename_column(index_name, aliases[label]+"_index")
+        partitions[label] = partition
+
+    return partitions
+
+
+def tablemater_partitioned(primary_table, secondary_table_list, 
+                           partition_by, values=None, aliases=None, 
+                           **kwargs):
+    """
+    Matches a primary table once, then splits the result by class.
+
+    If what you want is the mated tables for several slices of one 
+    catalog (say, protostars and disked stars out of Megeath2012), 
+    there's no need to match each slice on its own: every primary star
+    gets the same nearest neighbor whichever slice it sits in, so we 
+    can match the whole catalog and filter the mated table afterwards.
+
+    (Careful: that's only exactly true for mode='nearest'. With 
+    'mutual' or 'one-to-one', primary stars compete with each other 
+    for secondary sources, and here they compete with the whole 
+    catalog, not just their own slice.)
+
+    Parameters
+    ----------
+    primary_table : TableParameters instance
+        The parent catalog, which all the slices come from.
+    secondary_table_list : array of TableParameters instance
+        As in tablemater().
+    partition_by : str or dict
+        A column of `primary_table.data` to split on, or a dict of 
+        {label: boolean mask}; see `partition_masks()`.
+    values : list, optional
+        Which values of the `partition_by` column to keep.
+        Default: all of them.
+    aliases : dict, optional
+        {label: alias}: name the slices' primary columns (and count 
+        their "_index" rows) as if each had been matched on its own; 
+        see `partition_mated_table()`. Default: slices keep 
+        `primary_table`'s column names and row numbers.
+    **kwargs
+        Passed on to tablemater() (n_workers, cache_dir, mode, ...).
+
+    Returns
+    -------
+    mated_table : atpy.Table
+        The full match of `primary_table`.
+    partitions : OrderedDict
+        {label: atpy.Table}, the rows of `mated_table` in each slice.
+
+    """
+
+    mated_table = tablemater(primary_table, secondary_table_list, **kwargs)
+
+    masks = partition_masks(primary_table.data, partition_by, values)
+
+    return mated_table, partition_mated_table(mated_table, masks, aliases)
+
+
+def _unmatched_fill_value(dtype):
+    """
+    What unmatched rows hold underneath the mask, for a column's dtype.
+
+    These are exactly the values index_secondary_by_primary() has always
+    written into unmatched rows (-9999 for integers, np.nan for anything
+    else, as numpy casts them: True for booleans, 'nan' truncated to fit
+    for strings), so code that ignores the mask still sees them.
+
+    """
+
+    probe = np.zeros(1, dtype=dtype)
+    try:
+        if issubclass(dtype.type, np.integer):
+            probe[0] = -9999
+        else:
+            probe[0] = np.nan
+    except (TypeError, ValueError):
+        return None
+
+    return probe[0]
+
+
+class SecondaryByPrimaryView(object):
+    """
+    A secondary table, seen row-by-row through a primary table's matches.
+
+    Nothing is copied up front: the view only keeps, for each primary
+    row, the index of its match in the secondary table. A column is 
+    built the first time it's asked for (as `view['name']` or 
+    `view.name`), as a masked array whose unmatched rows are masked;
+    every column keeps its own dtype. Columns are kept once built.
+
+    The first two columns are the primary table's ID and index, 
+    exactly as in the mated table.
+
+    """
+
+    def __init__(self, primary_columns, secondary_indices, secondary_data):
+        """
+        Initializing method. See `index_secondary_by_primary()`.
+
+        Parameters
+        ----------
+        primary_columns : list of (str, np.ndarray)
+            Name and values of the primary ID and index columns.
+        secondary_indices : np.ndarray of int
+            Row in `secondary_data` matched to each primary row, or -1.
+        secondary_data : atpy.Table
+            The secondary table's data.
+
+        """
+
+        self.primary_columns = primary_columns
+        self.secondary_indices = np.asarray(secondary_indices)
+        self.secondary_data = secondary_data
+
+        self.unmatched = self.secondary_indices == -1
+
+        self.names = ([name for name, values in primary_columns] + 
+                      list(secondary_data.columns.keys))
+
+        self._columns = {}
+
+    def __len__(self):
+        return len(self.secondary_indices)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def keys(self):
+        return list(self.names)
+
+    def _indexed_values(self, name):
+        """
+        Indexes one secondary column by primary rows, with no mask.
+
+        Returns the values (unmatched rows holding the old fill value)
+        and that fill value, or None if the dtype has none.
+
+        """
+
+        target_column = np.asarray(self.secondary_data[name])
+
+        if len(target_column) > 0:
+            # unmatched rows borrow row 0 for a moment; they're filled below
+            values = target_column[np.where(self.unmatched, 0,
+                                            self.secondary_indices)]
+        else:
+            values = np.zeros((len(self),) + target_column.shape[1:],
+                              dtype=target_column.dtype)
+
+        fill_value = _unmatched_fill_value(values.dtype)
+        if fill_value is not None:
+            values[self.unmatched] = fill_value
+
+        return values, fill_value
+
+    def _build_column(self, name):
+        """ Indexes one secondary column by primary rows, with a mask. """
+
+        for primary_name, values in self.primary_columns:
+            if name == primary_name:
+                return values
+
+        if name not in self.names:
+            raise KeyError("No column named '%s'" % name)
+
+        values, fill_value = self._indexed_values(name)
+
+        mask = np.zeros(values.shape, dtype=bool)
+        mask[self.unmatched] = True
+
+        if fill_value is not None:
+            return np.ma.masked_array(values, mask=mask, 
+                                      fill_value=fill_value)
+        else:
+            return np.ma.masked_array(values, mask=mask)
+
+    def __getitem__(self, name):
+
+        if name not in self._columns:
+            self._columns[name] = self._build_column(name)
+
+        return self._columns[name]
+
+    def __getattr__(self, name):
+
+        # only called for names that aren't regular attributes
+        if name.startswith('_') or name not in self.__dict__.get('names', []):
+            raise AttributeError(name)
+
+        return self[name]
+
+    def where(self, mask):
+        """
+        Returns a view of only some primary rows (like atpy's `where`).
+
+        Parameters
+        ----------
+        mask : array_like of bool or int
+            Which primary rows to keep.
+
+        Returns
+        -------
+        view : SecondaryByPrimaryView
+
+        """
+
+        return SecondaryByPrimaryView(
+            [(name, values[mask]) for name, values in self.primary_columns],
+            self.secondary_indices[mask], self.secondary_data)
+
+    def materialize(self, masked=True):
+        """
+        Builds every column at once, into an ordinary table.
+
+        Parameters
+        ----------
+        masked : bool, optional
+            Mask the unmatched rows? Default True. If False, the table
+            is plain, with the fill values showing -- just what
+            index_secondary_by_primary() used to return.
+
+        Returns
+        -------
+        secondary_indexed_by_primary : atpy.Table
+            One column per column of the view.
+
+        """
+
+        secondary_indexed_by_primary = atpy.Table()
+
+        if not masked:
+            # straight to the plain columns, without building masks
+            primary_columns = dict(self.primary_columns)
+            for name in self.names:
+                if name in primary_columns:
+                    values = primary_columns[name]
+                elif name in self._columns:
+                    values = np.ma.getdata(self._columns[name])
+                else:
+                    values, fill_value = self._indexed_values(name)
+                secondary_indexed_by_primary.add_column(name, values)
+            return secondary_indexed_by_primary
+
+        for name in self.names:
+            column = self[name]
+            if isinstance(column, np.ma.MaskedArray):
+                secondary_indexed_by_primary.add_column(
+                    name, column.data, mask=np.ma.getmaskarray(column),
+                    fill=column.fill_value)
+            else:
+                secondary_indexed_by_primary.add_column(name, column)
+
+        return secondary_indexed_by_primary
+
+
+def index_secondary_by_primary(mated_table, secondary_table, lazy=False):
     """
     Indexes a secondary table by primary table IDs.
 
     Returns it as a new table; rows of the primary table that 
     did not match to the secondary table are present, filled 
-    with np.nan, so that the columns from the returned table
-    could be (in principle) appended directly to the primary
-    table or used in some derivative product, such as a 
-    publication table.
+    with np.nan (or -9999 for integers), so that the columns from 
+    the returned table could be (in principle) appended directly 
+    to the primary table or used in some derivative product, such 
+    as a publication table.
+
+    With `lazy=True`, no columns are copied until they're used, and 
+    the unmatched rows come back masked: see `SecondaryByPrimaryView`.
 
     Parameters
     ----------
@@ -292,28 +1108,23 @@ def index_secondary_by_primary(mated_table, secondary_table):
     secondary_table : TableParameters instance
         Must be one of the secondary tables used to create
         mated_table.
+    lazy : bool, optional (default False)
+        Return a lazy, masked view, rather than a fully-built table?
 
     Returns
     -------
-    secondary_indexed_by_primary : atpy.Table
+    secondary_indexed_by_primary : SecondaryByPrimaryView or atpy.Table
         
     """
 
-    # make an empty table
-    secondary_indexed_by_primary = atpy.Table()
-
     # seed it
     first_column_name = mated_table.columns.keys[0]
     second_column_name = mated_table.columns.keys[1]
 
-    # primary ID
-    secondary_indexed_by_primary.add_column(
-        first_column_name,
-        mated_table[first_column_name] )
-    # index in primary table
-    secondary_indexed_by_primary.add_column(
-        second_column_name,
-        mated_table[second_column_name] )
+    # primary ID, and index in primary table
+    primary_columns = [
+        (first_column_name, np.asarray(mated_table[first_column_name])),
+        (second_column_name, np.asarray(mated_table[second_column_name]))]
 
     # name of secondary table in mated table
     secondary_alias = secondary_table.alias
@@ -322,27 +1133,14 @@ def index_secondary_by_primary(mated_table, secondary_table):
     secondary_indices_of_primary_rows = mated_table.data[secondary_alias+"_index"]
     # note that there are gonna be a lot of -1s in there.
 
-    # do I want to do this column-by-column, or row-by-row? 
-    # I think I prefer column-by-column, where I loop through
-    # column names in the secondary
-
-    for column_name in secondary_table.data.columns.keys:
-
-        target_column = secondary_table.data[column_name]
-        # so, two-step process for each column.
-        # first, do a naive indexing
-        column_indexed_by_primary = target_column[secondary_indices_of_primary_rows]
-        # second, set all the [-1]s to nan or -9999 
-        if issubclass(target_column.dtype.type, np.integer):
-            column_indexed_by_primary[secondary_indices_of_primary_rows == -1] = -9999
-        else:
-            column_indexed_by_primary[secondary_indices_of_primary_rows == -1] = np.nan
-        # then add the column by name to our new table
-        secondary_indexed_by_primary.add_column(column_name,
-                                                column_indexed_by_primary)
+    view = SecondaryByPrimaryView(primary_columns,
+                                  secondary_indices_of_primary_rows,
+                                  secondary_table.data)
 
-    # let's see if this works!
-    return secondary_indexed_by_primary
+    if lazy:
+        return view
+    else:
+        return view.materialize(masked=False)
         
 
 def test():
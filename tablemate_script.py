@@ -20,6 +20,7 @@ import astropy
 
 import tablemate_core
 from tablemate_core import TableParameters, atpy
+from ipac_stream import StreamingCatalog
 import megeath_fulltable_parser_oneoff
 
 # Top half of the script: defining various tables
@@ -27,6 +28,10 @@ import megeath_fulltable_parser_oneoff
 dpath = os.path.expanduser("~/Dropbox/Bo_Tom/aux_catalogs/")
 tables = []
 
+# Matches against these catalogs are cached here between sessions;
+# see tablemate_core.tablemater().
+tablemate_cache_dir = dpath+"tablemate_cache/"
+
 
 Rice_2013_vars = TableParameters(
     data = dpath+"gluedvars_1240_variables.fits",
@@ -53,7 +58,9 @@ Rice_2013_all = TableParameters(
     radec_fmt = 'decimal-radians',
     name_col = 'SOURCEID')
 
-Twomass = TableParameters(
+# These two are big IPAC box searches, so they're read in chunks while
+# they're matched, rather than loaded whole.
+Twomass = StreamingCatalog(
     data = dpath+"fp_2mass.fp_psc27078_M42_boxdegree_search.tbl",
     alias = "2MASS_PSC",
     full_name = "Two Micron All-Sky Survey: All-Sky Data Release Point Source Catalog. Released 2003 Mar 25. Box search: center (83.83743,-5.41019), sidelength 3600 arcsec.",
@@ -62,7 +69,7 @@ Twomass = TableParameters(
     name_col = 'designation')
 tables.append(Twomass)
 
-Wise = TableParameters(
+Wise = StreamingCatalog(
     data = dpath+"wise_allsky.wise_allsky_4band_M42_boxdegree_search.tbl",
     alias = "WISE",
     full_name = "Wide-field Infrared Survey Explorer (WISE) All-Sky Source Catalog. Box search: center (83.83743,-5.41019), sidelength 3800.02 arcsec.",
@@ -356,7 +363,8 @@ def test():
 
     return tablemate_core.tablemater(wov_avs, [
             Herbst2002, YSOVAR_NoExcess, YSOVAR_YSOs, DaRio_2010,
-            DaRio_2009, Carpenter_2001, COUP_Getman2005, eso_ha])
+            DaRio_2009, Carpenter_2001, COUP_Getman2005, eso_ha],
+                                     cache_dir=tablemate_cache_dir)
             
 
 
@@ -367,8 +375,10 @@ def vars_match():
     Takes about 15 seconds (2/13/13).
     """
 
-    return tablemate_core.tablemater( Rice_2013_vars, tables)
+    return tablemate_core.tablemater( Rice_2013_vars, tables,
+                                      cache_dir=tablemate_cache_dir)
 
 def UKvars_match():
     
-    return tablemate_core.tablemater( Rice_UKvars, tables)
+    return tablemate_core.tablemater( Rice_UKvars, tables,
+                                      cache_dir=tablemate_cache_dir)
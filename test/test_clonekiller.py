@@ -0,0 +1,58 @@
+from __future__ import division
+
+import numpy as np
+
+from clonekiller import clone_groups, lightcurve_similarity
+
+def test_clone_groups():
+
+    arcsec = np.radians(1/3600)
+
+    # Three sources on top of each other (but NOT adjacent in RA order,
+    # and offset only in RA), one loner, and a pair split by the loner.
+    ra = np.radians(83.8) + arcsec * np.array([0, 10, 0.05, 0.08, 20, 20.02])
+    dec = np.radians(-5.4) + arcsec * np.array([0, 0, 0, 0, 5, 5])
+
+    group_leader = clone_groups(ra, dec, 0.1*arcsec)
+
+    assert (group_leader == np.array([0, 1, 0, 0, 4, 4])).all()
+
+def test_clone_groups_no_clones():
+
+    ra = np.radians(np.linspace(83, 84, 50))
+    dec = np.radians(np.linspace(-6, -5, 50))
+
+    group_leader = clone_groups(ra, dec, np.radians(0.1/3600))
+
+    assert (group_leader == np.arange(50)).all()
+
+def test_lightcurve_similarity():
+
+    from photometry_index import PhotometryIndex
+
+    # Star 1 and its clone 2 share every timestamp and magnitude;
+    # star 3 is observed at the same times but varies on its own.
+    times = np.arange(20) + 54000.
+    jmag = 14 + 0.1*np.sin(times)
+    other = 14 + 0.1*np.cos(3*times)
+
+    sourceid = np.repeat([1, 2, 3], 20)
+    mjd = np.tile(times, 3)
+    j = np.concatenate((jmag, jmag, other))
+
+    # shuffle the rows so the index has to do some work
+    shuffle = np.random.RandomState(0).permutation(len(j))
+
+    photometry = np.rec.fromarrays(
+        [sourceid[shuffle], mjd[shuffle], j[shuffle]],
+        names=['SOURCEID', 'MEANMJDOBS', 'JAPERMAG3'])
+
+    index = PhotometryIndex(photometry)
+
+    correlation, identical_fraction, n_shared = lightcurve_similarity(
+        index, [1, 1, 1], [2, 3, 4], bands='j')
+
+    assert (n_shared == np.array([20, 20, 0])).all()
+    assert identical_fraction[0] == 1 and identical_fraction[1] < 0.5
+    assert np.isclose(correlation[0], 1) and correlation[1] < 0.9
+    assert np.isnan(correlation[2])
@@ -0,0 +1,79 @@
+from __future__ import division
+
+import numpy as np
+
+from sky_index import SkyIndex, nearest_match_xyz, radec_to_xyz
+from ipac_stream import iter_ipac_chunks, StreamingCatalog
+
+random = np.random.RandomState(7)
+
+def write_ipac_table(filename, ra, dec, names):
+
+    with open(filename, 'w') as f:
+        f.write("\\fixlen = T\n")
+        f.write("\\RowsRetrieved = %d\n" % len(ra))
+        f.write("|     designation|          ra|         dec|\n")
+        f.write("|            char|      double|      double|\n")
+        f.write("|                |         deg|         deg|\n")
+        f.write("|            null|        null|        null|\n")
+        for name, r, d in zip(names, ra, dec):
+            if np.isnan(r):
+                f.write(" %16s %12s %12s \n" % (name, 'null', 'null'))
+            else:
+                f.write(" %16s %12.7f %12.7f \n" % (name, r, d))
+
+def test_iter_ipac_chunks(tmpdir):
+
+    filename = str(tmpdir.join('small.tbl'))
+    ra = np.array([83.1, 83.2, np.nan, 83.4, 83.5])
+    dec = np.array([-5.1, -5.2, np.nan, -5.4, -5.5])
+    names = ['J%d' % i for i in range(5)]
+    write_ipac_table(filename, ra, dec, names)
+
+    chunks = list(iter_ipac_chunks(filename, ['ra', 'designation'], 2))
+
+    assert [start for start, chunk in chunks] == [0, 2, 4]
+    ra_read = np.concatenate([chunk['ra'] for start, chunk in chunks])
+    assert np.allclose(ra_read[~np.isnan(ra)], ra[~np.isnan(ra)])
+    assert np.isnan(ra_read[2])
+    assert chunks[2][1]['designation'][0] == 'J4'
+
+def test_streaming_match(tmpdir):
+
+    # a catalog that's much bigger than the primary's footprint
+    ra = 83.8 + random.uniform(-1, 1, 20000)
+    dec = -5.4 + random.uniform(-1, 1, 20000)
+    names = np.array(['J%05d' % i for i in range(len(ra))])
+
+    filename = str(tmpdir.join('big.tbl'))
+    write_ipac_table(filename, ra, dec, names)
+
+    primary_ra = 83.8 + random.uniform(-0.2, 0.2, 500)
+    primary_dec = -5.4 + random.uniform(-0.2, 0.2, 500)
+    primary_xyz = radec_to_xyz(np.radians(primary_ra), np.radians(primary_dec))
+
+    catalog = StreamingCatalog(filename, "fake", "A fake IPAC catalog", 
+                               ['ra'], ['dec'], 'decimal-degrees', 
+                               'designation', max_match=30, chunk_size=1500)
+
+    streamed = catalog.match_xyz(primary_xyz)
+
+    # the file only holds 7 decimals, so match against what it holds
+    ra_held = np.concatenate([chunk['ra'] for start, chunk
+                              in iter_ipac_chunks(filename, ['ra'])])
+    dec_held = np.concatenate([chunk['dec'] for start, chunk
+                               in iter_ipac_chunks(filename, ['dec'])])
+    in_memory = nearest_match_xyz(
+        primary_xyz, SkyIndex(ra_held, dec_held, units='degrees'), 30, 
+        return_diagnostics=True)
+
+    assert (streamed[0] >= 0).sum() > 100
+    assert (streamed[2] > 1).sum() > 10
+    assert (streamed[0] == in_memory[0]).all()
+    assert (streamed[2] == in_memory[2]).all()
+    for s, m in zip(streamed[1::2], in_memory[1::2]):
+        assert np.allclose(s, m, equal_nan=True)
+
+    matched_names = catalog.names_at(streamed[0])
+    assert (matched_names[streamed[0] >= 0] == 
+            names[streamed[0][streamed[0] >= 0]]).all()
@@ -0,0 +1,49 @@
+from __future__ import division
+
+import os
+
+import numpy as np
+
+import megeath_fulltable_parser_oneoff as megeath
+
+
+def write_fake_cache(cache_directory):
+    """ A four-source cache, as convert_megeath_savefile would write. """
+
+    os.makedirs(cache_directory)
+
+    ctotal = np.zeros((4, len(megeath.column_names)))
+    ctotal[:, 0] = [83.5, 84.0, 84.2, 85.0]
+    ctotal[:, 1] = [-5.5, -5.0, -5.8, -5.5]
+    ctotal[:, 2] = [11., 12., 13., 14.]
+
+    for i in range(len(megeath.column_names)):
+        np.save(megeath._column_filename(cache_directory, i), ctotal[:, i])
+    np.save(os.path.join(cache_directory, "all.npy"), np.array([0, 2, 3]))
+    np.save(os.path.join(cache_directory, "IR.npy"), np.array([2]))
+
+
+def test_megeath_rows_follow_the_bounds(tmpdir, monkeypatch):
+
+    cache_directory = str(tmpdir.join('cache'))
+    write_fake_cache(cache_directory)
+
+    cache = megeath.load_megeath_cache(
+        savefile=str(tmpdir.join('missing.sav')),
+        cache_directory=cache_directory)
+    assert megeath.load_megeath_cache(
+        cache_directory=cache_directory) is cache
+    assert (cache['columns'][2] == [11., 12., 13., 14.]).all()
+
+    assert (megeath.megeath_rows(cache) == [0, 1, 2]).all()
+    assert (megeath.megeath_rows(cache, truncated=False) == 
+            [0, 1, 2, 3]).all()
+    assert (megeath.megeath_rows(cache, all=True) == [0, 2]).all()
+    assert (megeath.megeath_rows(cache, truncated=False, nondisks=True) ==
+            [0, 3]).all()
+
+    # new bounds take effect without rebuilding the cache
+    monkeypatch.setattr(megeath, 'max_RA', 85.5)
+    monkeypatch.setattr(megeath, 'min_Dec', -5.7)
+    assert (megeath.megeath_rows(cache) == [0, 1, 3]).all()
+    assert (megeath.megeath_rows(cache, all=True) == [0, 3]).all()
@@ -0,0 +1,123 @@
+from __future__ import division
+
+import numpy as np
+import atpy
+
+import period_digger
+from period_digger import IDIndex
+
+
+def make_table(**columns):
+
+    table = atpy.Table()
+    for name in sorted(columns):
+        table.add_column(name, np.asarray(columns[name]))
+    return table
+
+
+class Catalog(object):
+    """ Stands in for a TableParameters: just holds `data`. """
+
+    def __init__(self, data):
+        self.data = data
+
+
+def old_row(ids, id):
+    """ The row lookup the per-star functions used to do. """
+
+    try:
+        return np.where(ids == id)[0][0]
+    except IndexError:
+        return -1
+
+
+class OldIndex(object):
+    """ Does per-star lookups the old way, by scanning the ID column. """
+
+    def __init__(self, ids):
+        self.ids = np.asarray(ids)
+
+    def lookup(self, id):
+        return old_row(self.ids, id)
+
+
+def test_id_index_matches_where():
+
+    ids = np.array([5, 3, 9, 3, 12, 5, 7])
+    index = IDIndex(ids)
+
+    wanted = np.array([3, 5, 7, 9, 12, 4, -1, 100, 0])
+    expected = [old_row(ids, id) for id in wanted]
+
+    assert [index.lookup(id) for id in wanted] == expected
+    assert (index.lookup_many(wanted) == expected).all()
+
+    names = np.array(['a', 'bb', 'a', 'ccc'])
+    index = IDIndex(names)
+    assert (index.lookup_many(['a', 'ccc', 'zz', '-1']) == 
+            [0, 3, -1, -1]).all()
+    assert index.lookup('bb') == 1 and index.lookup('-1') == -1
+
+    assert (IDIndex([]).lookup_many([1, 2]) == [-1, -1]).all()
+
+
+def test_get_all_matches_per_star_lookups(monkeypatch):
+
+    # small literature tables: duplicate IDs, missing and bad periods
+    carpenter = make_table(ID=[11, 12, 13, 12, 14],
+                           PerJ=[3., 4., -1., 9., np.nan],
+                           PerH=[3.1, 4.2, -1., 9., 2.],
+                           PerK=[2.9, 4.1, -1., 9., 2.])
+    ysovar = make_table(**{'Source^a': ['Y1', 'Y2', 'Y3', 'Y2'],
+                           'Period (days)': [1.5, 2.5, np.nan, 7.]})
+    parihar = make_table(Seq=[101, 102, 103], Per=[5., np.nan, 6.])
+    rl = make_table(Per=[8., 9.])
+    rl_ids = np.array([201, 202])
+
+    monkeypatch.setattr(period_digger, 'GCVS', 
+                        Catalog(make_table(Period=[1., np.nan, 3.])))
+    monkeypatch.setattr(period_digger, 'Herbst2002', 
+                        Catalog(make_table(Per=[np.nan, 4.])))
+    monkeypatch.setattr(period_digger, 'Carpenter2001_periods', carpenter)
+    monkeypatch.setattr(period_digger, 'YSOVAR_periods', ysovar)
+    monkeypatch.setattr(period_digger, 'Parihar2009_periods', parihar)
+    monkeypatch.setattr(period_digger, 'RL2009_periods', rl)
+
+    id_columns = {'Carpenter2001_id_index': carpenter.ID,
+                  'YSOVAR_id_index': ysovar['Source^a'],
+                  'Parihar2009_id_index': parihar.Seq,
+                  'RL2009_id_index': rl_ids}
+
+    mated_table = make_table(
+        GCVS_index=[0, -1, 1, 2, -1, 0],
+        CHS2001_ID=[11, -1, 12, 13, 14, 99],
+        YSOVAR_OrionYSOs_ID=['Y1', '-1', '-1', 'Y3', 'Y9', '-1'],
+        YSOVAR_OrionNoExcess_ID=['Y2', 'Y2', '-1', '-1', '-1', 'Y9'],
+        Herbst2002_index=[-1, 1, 0, -1, 1, 1],
+        Parihar2009_ID=[101, 102, -1, 104, 103, -1],
+        RL2009_ID=[-1, 201, 202, 203, -1, 201])
+
+    for get, get_all in zip(period_digger.period_funcs, 
+                            period_digger.period_get_all_funcs):
+        for name, ids in id_columns.items():
+            monkeypatch.setattr(period_digger, name, OldIndex(ids))
+        per_star = [get(mated_table, i) for i in range(6)]
+        per_star = np.array([np.nan if p is None else p for p in per_star],
+                            dtype=np.float64)
+
+        for name, ids in id_columns.items():
+            monkeypatch.setattr(period_digger, name, IDIndex(ids))
+        periods = get_all(mated_table)
+
+        assert periods.shape == (6,)
+        assert ((periods == per_star) |
+                (np.isnan(periods) & np.isnan(per_star))).all(), get_all
+
+    # and what those should be, spelled out for two of them
+    chs = period_digger.CHS01_period_get_all(mated_table)
+    assert np.allclose(chs[[0, 2]], [3., 4.1])
+    assert np.isnan(chs[[1, 3, 4, 5]]).all()
+
+    ysovar_periods = period_digger.YSOVAR_period_get_all(mated_table)
+    assert np.allclose(ysovar_periods[[0, 1]], [1.5, 2.5])
+    assert np.isnan(ysovar_periods[2:]).all()
@@ -0,0 +1,194 @@
+from __future__ import division
+
+import numpy as np
+
+from periodic_selector import (periodic_selector, best_period,
+                               long_periodic_selector, best_long_period,
+                               select_periods)
+
+random = np.random.RandomState(17)
+
+
+class FakeTable(object):
+    """ Just enough of an atpy.Table for periodic_selector. """
+
+    def __init__(self, columns):
+        self.__dict__['columns'] = dict(columns)
+
+    def __getattr__(self, name):
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.columns['SOURCEID'])
+
+    def where(self, mask):
+        return FakeTable((name, values[mask]) 
+                         for name, values in self.columns.items())
+
+    def add_column(self, name, values):
+        self.columns[name] = values
+
+
+def old_best_period(r, min_period=None, max_period=50, period_override={}):
+    """
+    The star-by-star if/elif chain that best_period() and 
+    best_long_period() used to run, to compare against.
+
+    """
+
+    def in_range(period):
+        return ((min_period is None or period > min_period) and 
+                period < max_period)
+
+    best_period = -1.*np.ones_like(r.j_lsp_per)
+
+    for i in range(len(r)):
+        if r.SOURCEID[i] in period_override:
+            best_period[i] = period_override[r.SOURCEID[i]]
+        elif ((r.j_lsp_per[i] < r.h_lsp_per[i] * 1.05) and
+              (r.j_lsp_per[i] > r.h_lsp_per[i] * 0.95) and
+              in_range(r.j_lsp_per[i]) and
+              (r.j_lsp_pow[i] > 12) and (r.h_lsp_pow[i] > 12)):
+            best_period[i] = r.h_lsp_per[i]
+        elif ((r.h_lsp_per[i] < r.k_lsp_per[i] * 1.05) and
+              (r.h_lsp_per[i] > r.k_lsp_per[i] * 0.95) and
+              in_range(r.h_lsp_per[i]) and
+              (r.h_lsp_pow[i] > 12) and (r.k_lsp_pow[i] > 12)):
+            best_period[i] = r.h_lsp_per[i]
+        elif ((r.j_lsp_per[i] < r.k_lsp_per[i] * 1.05) and
+              (r.j_lsp_per[i] > r.k_lsp_per[i] * 0.95) and
+              in_range(r.j_lsp_per[i]) and
+              (r.j_lsp_pow[i] > 12) and (r.k_lsp_pow[i] > 12)):
+            best_period[i] = r.k_lsp_per[i]
+        elif (r.j_lsp_pow[i] > 15) and in_range(r.j_lsp_per[i]):
+            best_period[i] = r.j_lsp_per[i]
+        elif (r.h_lsp_pow[i] > 15) and in_range(r.h_lsp_per[i]):
+            best_period[i] = r.h_lsp_per[i]
+        elif (r.k_lsp_pow[i] > 15) and in_range(r.k_lsp_per[i]):
+            best_period[i] = r.k_lsp_per[i]
+
+    return best_period
+
+
+def fake_spread(n=3000):
+    """ Periods that often agree between bands; float32, like spread3's. """
+
+    columns = {'SOURCEID': np.arange(n) + 44000}
+    base = random.uniform(0.5, 250, n)
+    for band in 'jhk':
+        agrees = random.rand(n) < 0.6
+        period = np.where(agrees, base * random.uniform(0.93, 1.07, n),
+                          random.uniform(0.5, 250, n))
+        columns[band+'_lsp_per'] = period.astype(np.float32)
+        columns[band+'_lsp_pow'] = random.uniform(0, 25, n).astype(
+            np.float32)
+    columns['h_lsp_per'][:40] = np.nan
+    columns['k_lsp_pow'][20:60] = np.nan
+
+    return FakeTable(columns)
+
+
+def test_best_period_matches_old_chain():
+
+    spread = fake_spread()
+
+    periodics = best_period(periodic_selector(spread), reason_col='why')
+    expected = old_best_period(spread)
+
+    assert (periodics.SOURCEID == spread.SOURCEID[expected != -1]).all()
+    assert periodics.best_period.dtype == np.float32
+    assert (periodics.best_period == expected[expected != -1]).all()
+    assert set(periodics.why) == set(['JH', 'HK', 'JK', 'J', 'H', 'K'])
+
+
+def test_best_long_period_matches_old_chain():
+
+    spread = fake_spread()
+    override = dict((sourceid, float(sourceid % 97)) for sourceid in 
+                    random.choice(spread.SOURCEID, 200))
+
+    for kwargs in [{}, dict(min_period=20, max_period=100, 
+                            period_override=override)]:
+        periodics = best_long_period(long_periodic_selector(spread, **kwargs),
+                                     reason_col='why', **kwargs)
+        expected = old_best_period(spread, 
+                                   min_period=kwargs.get('min_period', 50),
+                                   max_period=kwargs.get('max_period', 200),
+                                   period_override=kwargs.get(
+                                       'period_override', {}))
+
+        assert (periodics.SOURCEID == 
+                spread.SOURCEID[expected != -1]).all()
+        assert periodics.best_period.dtype == np.float32
+        assert (periodics.best_period == expected[expected != -1]).all()
+
+    assert (periodics.why == 'override').sum() == len(override)
+
+
+def test_no_rule_fires():
+
+    spread = fake_spread()
+
+    # stars nothing picks get -1 and no reason, as the old chain gave
+    best, reason = select_periods(spread)
+    expected = old_best_period(spread)
+    assert (best == expected).all()
+    assert ((reason == '') == (expected == -1)).all()
+    assert (reason[:40] != 'JH').all() and (reason[:40] != 'HK').all()
+
+    # nothing can beat a power of 15 here
+    quiet = FakeTable(spread.columns)
+    for band in 'jhk':
+        quiet.columns[band+'_lsp_pow'] = np.zeros(len(spread))
+    assert len(periodic_selector(quiet)) == 0
+    assert (best_period(quiet).best_period == -1).all()
+
+
+def test_use_fap():
+
+    from periodogram import false_alarm_probability
+    from periodic_selector import agreement_fap, single_band_fap
+
+    spread = fake_spread()
+    n = len(spread)
+
+    # FAP columns, plus powers that pass 12 and 15 exactly where the 
+    # FAPs pass agreement_fap and single_band_fap, for the old chain
+    faps = FakeTable(spread.columns)
+    powers = FakeTable(spread.columns)
+    for band in 'jhk':
+        fap = 10**random.uniform(-5, -1, n)
+        fap[random.rand(n) < 0.05] = np.nan
+        faps.columns[band+'_lsp_fap'] = fap
+        faps.columns[band+'_lsp_pow'] = np.zeros(n)
+        powers.columns[band+'_lsp_pow'] = np.where(
+            fap < single_band_fap, 16, np.where(fap < agreement_fap, 13, 0))
+
+    best, reason = select_periods(faps, use_fap=True)
+    assert (best == old_best_period(powers)).all()
+    assert set(reason) == set(['', 'JH', 'HK', 'JK', 'J', 'H', 'K'])
+
+    # the default number of shuffles can reach the single-band threshold
+    import inspect
+    from periodogram import bootstrap_faps
+    args = inspect.getargspec(bootstrap_faps)
+    n_bootstrap = args.defaults[args.args.index('n_bootstrap') - 
+                                len(args.args)]
+    floor = false_alarm_probability(1e6, np.zeros(n_bootstrap))
+    assert floor < single_band_fap
+
+    only_j = FakeTable(faps.columns)
+    for band in 'jhk':
+        only_j.columns[band+'_lsp_fap'] = np.ones(n)
+    only_j.columns['j_lsp_fap'] = floor * np.ones(n)
+    periodics = best_period(periodic_selector(only_j, use_fap=True),
+                            reason_col='why', use_fap=True)
+    in_range = np.asarray(spread.j_lsp_per) < 50
+    assert len(periodics) == in_range.sum()
+    assert (periodics.why == 'J').all()
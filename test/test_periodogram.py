@@ -0,0 +1,234 @@
+from __future__ import division
+
+import numpy as np
+from scipy.signal import lombscargle
+
+from periodogram import lomb_scargle, frequency_grid, lsp_periods
+
+random = np.random.RandomState(7)
+
+
+def fake_photometry(n_stars=12, n_epochs=90, null_fraction=0.1):
+    """ Irregularly-sampled sinusoids, each star with its own period. """
+
+    periods = random.uniform(2.5, 30, n_stars)
+
+    sourceid, mjd, mags = [], [], {'j': [], 'h': [], 'k': []}
+    for i, period in enumerate(periods):
+        n = n_epochs - random.randint(0, 20)
+        times = 54000 + np.sort(random.uniform(0, 600, n))
+        sourceid.append(np.repeat(44000 + i, n))
+        mjd.append(times)
+        for band, amplitude in zip('jhk', [0.3, 0.2, 0.1]):
+            mag = (14 + amplitude*np.sin(2*np.pi*times/period) +
+                   random.normal(0, 0.02, n))
+            mag[random.rand(n) < null_fraction] = -9.99999488e+08
+            mags[band].append(mag)
+
+    photometry = np.rec.fromarrays(
+        [np.concatenate(sourceid), np.concatenate(mjd)] +
+        [np.concatenate(mags[band]) for band in 'jhk'],
+        names=['SOURCEID', 'MEANMJDOBS', 'JAPERMAG3', 'HAPERMAG3',
+               'KAPERMAG3'])
+
+    return photometry, periods
+
+
+def test_lomb_scargle_matches_scipy():
+
+    n_rows, n_epochs = 5, 60
+    times = 54000 + np.sort(random.uniform(0, 500, (n_rows, n_epochs)),
+                            axis=1)
+    values = random.normal(14, 0.1, (n_rows, n_epochs))
+    good = random.rand(n_rows, n_epochs) < 0.8
+
+    frequencies = frequency_grid(500.)
+    power = lomb_scargle(times, values, good, frequencies)
+
+    for row in range(n_rows):
+        t = times[row][good[row]]
+        y = values[row][good[row]] - values[row][good[row]].mean()
+        expected = lombscargle(t, y, 2*np.pi*frequencies) / y.var(ddof=1)
+
+        assert np.allclose(power[row], expected, rtol=1e-7, atol=1e-9)
+
+
+def test_lsp_periods_recovers_periods():
+
+    photometry, periods = fake_photometry()
+
+    serial = lsp_periods(photometry, batch_size=5)
+    parallel = lsp_periods(photometry, batch_size=5, n_workers=2)
+
+    assert (serial.SOURCEID == 44000 + np.arange(len(periods))).all()
+    for band in 'jhk':
+        assert np.allclose(serial[band+'_lsp_per'], periods, rtol=0.02)
+        assert (serial[band+'_lsp_pow'] > 15).all()
+        assert np.allclose(serial[band+'_lsp_per'],
+                           parallel[band+'_lsp_per'])
+        assert np.allclose(serial[band+'_lsp_pow'],
+                           parallel[band+'_lsp_pow'])
+
+
+def test_shared_basis():
+
+    import periodogram
+
+    # two "tiles" of stars: everyone in a tile has the same epochs
+    photometry, periods = fake_photometry(n_stars=6)
+    tile_times = [photometry.MEANMJDOBS[photometry.SOURCEID == 44000],
+                  photometry.MEANMJDOBS[photometry.SOURCEID == 44001]]
+    rows = []
+    for i in range(6):
+        times = tile_times[i % 2]
+        star = photometry[photometry.SOURCEID == 44000 + i % 2].copy()
+        star.SOURCEID = 45000 + i
+        # near-identical timestamps still count as the same cadence
+        star.MEANMJDOBS = times + random.uniform(-1e-6, 1e-6, len(times))
+        star.JAPERMAG3 = 14 + 0.3*np.sin(2*np.pi*times/periods[i])
+        rows.append(star)
+    tiled = np.concatenate([photometry] + rows).view(np.recarray)
+
+    periodogram.trig_basis_cache.clear()
+    periodogram.trig_basis_cache.hits = periodogram.trig_basis_cache.misses = 0
+
+    shared = lsp_periods(tiled, batch_size=4)
+    unshared = lsp_periods(tiled, batch_size=4, share_basis=False)
+
+    for band in 'jhk':
+        for column in [band+'_lsp_per', band+'_lsp_pow']:
+            assert np.allclose(shared[column], unshared[column], rtol=1e-6)
+
+    # 6 fake-photometry cadences (two of them shared by the new stars)
+    assert periodogram.trig_basis_cache.misses == 6
+    assert periodogram.trig_basis_cache.hits == 0
+
+    # least recently used bases go first
+    cache = periodogram.TrigBasisCache(max_bytes=1)
+    frequencies = frequency_grid(600.)
+    for times in tile_times + tile_times[:1]:
+        cache.basis(times, frequencies)
+    assert len(cache) == 1 and cache.misses == 3
+
+
+def test_bootstrap_faps():
+
+    import periodogram
+    from periodogram import bootstrap_faps
+
+    photometry, periods = fake_photometry(n_stars=4, null_fraction=0)
+    # a fifth star: pure noise, observed just like the first
+    noise = photometry[photometry.SOURCEID == 44000].copy()
+    noise.SOURCEID = 44004
+    for band in 'JHK':
+        noise[band+'APERMAG3'] = random.normal(14, 0.05, len(noise))
+    photometry = np.concatenate([photometry, noise]).view(np.recarray)
+
+    frequencies = frequency_grid(600.)
+    lsp = lsp_periods(photometry, frequencies=frequencies)
+
+    periodogram.null_peak_cache.clear()
+    faps = bootstrap_faps(photometry, lsp, n_bootstrap=200, seed=3,
+                          frequencies=frequencies, batch_size=2)
+
+    # 4 timestamp patterns (the noise star shares the first star's)
+    assert len(periodogram.null_peak_cache) == 4
+
+    for band in 'jhk':
+        assert (faps[band+'_lsp_fap'][:4] == 1/201).all()
+        assert faps[band+'_lsp_fap'][4] > 0.01
+
+    # same seed, same answers, however the work is split up
+    periodogram.null_peak_cache.clear()
+    again = bootstrap_faps(photometry, lsp, n_bootstrap=200, seed=3,
+                           frequencies=frequencies, n_workers=2,
+                           patterns_per_job=1)
+    for band in 'jhk':
+        assert (again[band+'_lsp_fap'] == faps[band+'_lsp_fap']).all()
+
+
+def test_multiband_periods():
+
+    from periodogram import multiband_power
+
+    photometry, periods = fake_photometry(n_stars=6)
+
+    # a faint star: the same weak signal in every band, in lots of noise
+    faint = photometry[photometry.SOURCEID == 44000].copy()
+    faint.SOURCEID = 44006
+    for band in 'JHK':
+        faint[band+'APERMAG3'] = (
+            16 + 0.04*np.sin(2*np.pi*faint.MEANMJDOBS/periods[0]) +
+            random.normal(0, 0.08, len(faint)))
+    photometry = np.concatenate([photometry, faint]).view(np.recarray)
+
+    shared = lsp_periods(photometry, batch_size=4, multiband=True)
+    unshared = lsp_periods(photometry, batch_size=4, multiband=True,
+                           share_basis=False)
+
+    for column in ['multiband_lsp_per', 'multiband_lsp_pow']:
+        assert np.allclose(shared[column], unshared[column], rtol=1e-6)
+
+    assert np.allclose(shared.multiband_lsp_per[:6], periods, rtol=0.02)
+    assert ((shared.multiband_lsp_pow[:6] > 0.5) &
+            (shared.multiband_lsp_pow[:6] <= 1)).all()
+
+    assert np.isclose(shared.multiband_lsp_per[6], periods[0], rtol=0.02)
+
+    # bands with too few points sit the joint fit out
+    power = np.array([[[2., 4.]], [[np.nan, np.nan]]])
+    assert np.allclose(multiband_power(power, [[11], [2]]), [[0.4, 0.8]])
+
+    # and so do bands with enough points but no variance at all
+    power = np.array([[[2., 4.]], [[np.nan, np.nan]]])
+    assert np.allclose(multiband_power(power, [[11], [20]]), [[0.4, 0.8]])
+
+    flat = photometry[photometry.SOURCEID == 44001].copy()
+    flat.SOURCEID = 44007
+    flat.KAPERMAG3 = 14.
+    no_k = flat.copy()
+    no_k.SOURCEID = 44008
+    no_k.KAPERMAG3 = np.nan
+    photometry = np.concatenate([photometry, flat, no_k]).view(np.recarray)
+    lsp = lsp_periods(photometry, sourceids=[44007, 44008], 
+                      multiband=True)
+    assert np.isnan(lsp.k_lsp_pow).all()
+    assert np.allclose(lsp.multiband_lsp_pow[0], lsp.multiband_lsp_pow[1])
+
+
+def test_short_periods_and_selector_input():
+
+    from periodic_selector import select_periods
+
+    photometry, periods = fake_photometry(n_stars=3, null_fraction=0)
+    for band in 'JHK':
+        photometry[band+'APERMAG3'] = 14 + 0.2*np.sin(
+            2*np.pi*photometry.MEANMJDOBS/0.8)
+
+    default = lsp_periods(photometry)
+    faster = lsp_periods(photometry, max_frequency=2.)
+
+    # a 0.8-day period is off the default grid, which stops at 2 days
+    assert (default.k_lsp_per >= 2).all()
+    assert np.allclose(faster.k_lsp_per, 0.8, rtol=0.01)
+
+    best, reason = select_periods(faster)
+    assert np.allclose(best, 0.8, rtol=0.01)
+    assert (reason == 'JH').all()
+
+
+def test_stars_without_photometry():
+
+    photometry, periods = fake_photometry(n_stars=3)
+    wanted = [44000, 99999, 44002]
+
+    for share_basis in [True, False]:
+        lsp = lsp_periods(photometry, sourceids=wanted, 
+                          share_basis=share_basis, multiband=True)
+
+        assert (lsp.SOURCEID == wanted).all()
+        for column in ['j_lsp_per', 'k_lsp_pow', 'multiband_lsp_per']:
+            assert np.isnan(lsp[column][1])
+            assert np.isfinite(lsp[column][[0, 2]]).all()
+        assert np.allclose(lsp.h_lsp_per[[0, 2]], periods[[0, 2]], 
+                           rtol=0.02)
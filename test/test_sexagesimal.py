@@ -0,0 +1,74 @@
+from __future__ import division
+
+import numpy as np
+
+try:
+    import coords
+except ImportError:
+    import astrolib.coords as coords
+
+from sexagesimal import columns_to_degrees, strings_to_degrees
+
+random = np.random.RandomState(0)
+n = 500
+
+rh = random.randint(0, 24, n).astype(float)
+rm = random.randint(0, 60, n).astype(float)
+rs = np.round(random.uniform(0, 60, n), 3)
+dd = random.randint(-89, 90, n).astype(float)
+dm = random.randint(0, 60, n).astype(float)
+ds = np.round(random.uniform(0, 60, n), 3)
+
+def test_three_columns_match_coords_position():
+
+    ra, dec = columns_to_degrees([rh, rm, rs], [dd, dm, ds])
+
+    for i in range(n):
+        # this is exactly how TableParameters used to do it
+        coord_string = ("%02d:%02d:%05.2f %03d:%02d:%05.2f" %
+                        (rh[i], rm[i], rs[i], dd[i], dm[i], ds[i]) )
+        expected = coords.Position(coord_string).dd()
+
+        assert ra[i] == expected[0]
+        assert dec[i] == expected[1]
+
+def test_four_columns_match_coords_position():
+
+    sign = np.where(dd < 0, '-', '+')
+    ra, dec = columns_to_degrees([rh, rm, rs], [sign, np.abs(dd), dm, ds])
+
+    for i in range(n):
+        coord_string = ("%02d:%02d:%05.2f %s%02d:%02d:%05.2f" %
+                        (rh[i], rm[i], rs[i], sign[i], abs(dd[i]), 
+                         dm[i], ds[i]) )
+        expected = coords.Position(coord_string).dd()
+
+        assert ra[i] == expected[0]
+        assert dec[i] == expected[1]
+
+def test_minus_zero_declination():
+
+    ra, dec = columns_to_degrees([[5.], [35.], [0.]], [[-0.], [30.], [0.]])
+    assert dec[0] == -0.5
+
+    ra, dec = columns_to_degrees([[5.], [35.], [0.]], 
+                                 [['-'], [0.], [30.], [0.]])
+    assert dec[0] == -0.5
+
+    ra, dec = strings_to_degrees(['05:35:00.0', '05 35 00'],
+                                 ['-00:30:00.0', '+00 30 00'])
+    assert (dec == np.array([-0.5, 0.5])).all()
+    assert (ra == 83.75).all()
+
+def test_strings_match_coords_position():
+
+    ra_strings = ["%02d:%02d:%06.3f" % x for x in zip(rh, rm, rs)]
+    dec_strings = ["%03d:%02d:%06.3f" % x for x in zip(dd, dm, ds)]
+
+    ra, dec = strings_to_degrees(ra_strings, dec_strings)
+
+    for i in range(n):
+        expected = coords.Position(ra_strings[i]+" "+dec_strings[i]).dd()
+
+        assert ra[i] == expected[0]
+        assert dec[i] == expected[1]
@@ -0,0 +1,101 @@
+from __future__ import division
+
+import os
+
+import numpy as np
+
+from simbad_batch import (simbad_names, SimbadClient, SimbadNameCache,
+                          _separation_arcsec)
+from simbad_mock import MockSimbadServer, read_fixture
+
+fixture = os.path.join(os.path.dirname(__file__), 'simbad_fixture.txt')
+
+fixture_ra, fixture_dec, fixture_names = read_fixture(fixture)
+
+# Half our "stars" sit near a fixture object, half are in empty sky
+random = np.random.RandomState(5)
+near = random.choice(len(fixture_ra), 60, replace=False)
+ra = np.concatenate((fixture_ra[near] + random.uniform(-1, 1, 60)/3600,
+                     83.6 + random.uniform(-0.01, 0.01, 60)))
+dec = np.concatenate((fixture_dec[near] + random.uniform(-1, 1, 60)/3600,
+                      -5.2 + random.uniform(-0.01, 0.01, 60)))
+
+def expected_names(max_match):
+
+    names = []
+    for r, d in zip(ra, dec):
+        separation = _separation_arcsec(r, d, fixture_ra, fixture_dec)
+        if separation.min() < max_match:
+            names.append(fixture_names[np.argmin(separation)])
+        else:
+            names.append('')
+    return names
+
+def test_simbad_names():
+
+    with MockSimbadServer(fixture) as server:
+        client = SimbadClient(url=server.url, max_per_second=0)
+
+        names = simbad_names(ra, dec, max_match=1., batch_size=25,
+                             n_workers=3, client=client)
+
+        assert server.n_requests == 5
+
+    assert list(names) == expected_names(1.)
+    assert (names != '').sum() > 20
+
+def test_retries_and_cache(tmpdir):
+
+    cache_filename = str(tmpdir.join('simbad_cache.txt'))
+
+    with MockSimbadServer(fixture, fail_first=2) as server:
+        client = SimbadClient(url=server.url, max_per_second=0,
+                              retry_wait=0.01)
+
+        names = simbad_names(ra, dec, max_match=1.5, batch_size=40,
+                             cache=cache_filename, client=client)
+        assert server.n_requests == 3 + 2
+        assert list(names) == expected_names(1.5)
+
+        # Everything is cached now, even for a smaller radius...
+        names = simbad_names(ra, dec, max_match=0.7,
+                             cache=cache_filename, client=client)
+        assert server.n_requests == 5
+        assert list(names) == expected_names(0.7)
+
+        # ... but not for a bigger one.
+        simbad_names(ra[:10], dec[:10], max_match=3.,
+                     cache=cache_filename, client=client)
+        assert server.n_requests == 6
+
+def test_resume_after_failure(tmpdir):
+
+    cache_filename = str(tmpdir.join('simbad_cache.txt'))
+
+    # a server that gives up on us: only some batches get through
+    with MockSimbadServer(fixture) as server:
+        client = SimbadClient(url=server.url, max_per_second=0,
+                              max_retries=0)
+        server.fail_first = 0
+        half = len(ra) // 2
+        simbad_names(ra[:half], dec[:half], cache=cache_filename, 
+                     client=client)
+
+        server.fail_first = server.n_requests + 100
+        try:
+            simbad_names(ra, dec, cache=cache_filename, client=client)
+        except IOError:
+            pass
+        else:
+            assert False, "expected the failed batches to raise"
+
+        server.fail_first = 0
+        n_before = server.n_requests
+        names = simbad_names(ra, dec, batch_size=100,
+                             cache=cache_filename, client=client)
+
+        # only the half that wasn't cached gets asked about
+        assert server.n_requests == n_before + 1
+
+    assert len(SimbadNameCache(cache_filename)) == len(ra)
+    assert list(names) == expected_names(1.)
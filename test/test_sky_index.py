@@ -0,0 +1,221 @@
+from __future__ import division
+
+import numpy as np
+
+from sky_index import (SkyIndex, nearest_match, nearest_match_xyz,
+                       radec_to_xyz, chord_to_angle, propagate_radec)
+
+# A fake field of stars around the ONC, in degrees.
+random = np.random.RandomState(42)
+ra = 83.8 + random.uniform(-0.5, 0.5, 5000)
+dec = -5.4 + random.uniform(-0.5, 0.5, 5000)
+
+index = SkyIndex(ra, dec, units='degrees')
+
+def brute_force_separation(ra0, dec0):
+
+    xyz = radec_to_xyz(np.radians(ra), np.radians(dec))
+    xyz0 = radec_to_xyz(np.radians(ra0), np.radians(dec0))
+
+    return np.degrees(chord_to_angle(np.sqrt(((xyz - xyz0)**2).sum(axis=1))))
+
+def test_cone():
+
+    rows = index.cone(83.8, -5.4, 0.1)
+
+    expected = np.where(brute_force_separation(83.8, -5.4) <= 0.1)[0]
+
+    assert (rows == expected).all()
+
+def test_batched_cone():
+
+    centers_ra = np.array([83.7, 83.9, 84.0])
+    centers_dec = np.array([-5.5, -5.3, -5.6])
+
+    rows_list = index.cone(centers_ra, centers_dec, 0.05)
+
+    assert len(rows_list) == 3
+    for rows, ra0, dec0 in zip(rows_list, centers_ra, centers_dec):
+        assert (rows == index.cone(ra0, dec0, 0.05)).all()
+
+def test_box():
+
+    rows = index.box(83.6, 83.9, -5.5, -5.2)
+
+    expected = np.where((ra >= 83.6) & (ra <= 83.9) &
+                        (dec >= -5.5) & (dec <= -5.2))[0]
+
+    assert (rows == expected).all()
+
+def test_box_whole_circle_and_wrapping():
+
+    sky_ra = random.uniform(0, 360, 100)
+    sky_dec = np.degrees(np.arcsin(random.uniform(-1, 1, 100)))
+    sky = SkyIndex(sky_ra, sky_dec, units='degrees')
+
+    assert (sky.box(0, 360, -90, 90) == np.arange(100)).all()
+    assert (sky.box(-180, 180, -90, 90) == np.arange(100)).all()
+    assert (sky.box(0, 360, 10, 40) == 
+            np.where((sky_dec >= 10) & (sky_dec <= 40))[0]).all()
+
+    # through RA=0, either way of writing it
+    expected = np.where(((sky_ra >= 300) | (sky_ra <= 60)) &
+                        (sky_dec >= -30) & (sky_dec <= 30))[0]
+    assert len(expected) > 0
+    assert (sky.box(300, 60, -30, 30) == expected).all()
+    assert (sky.box(-60, 60, -30, 30) == expected).all()
+
+    # more than half way round
+    expected = np.where((sky_ra >= 20) & (sky_ra <= 300) &
+                        (sky_dec >= -60) & (sky_dec <= 50))[0]
+    assert (sky.box(20, 300, -60, 50) == expected).all()
+
+def test_polygon():
+
+    # A small square polygon is almost exactly the box it outlines.
+    rows = index.polygon([83.6, 83.9, 83.9, 83.6], [-5.5, -5.5, -5.2, -5.2])
+    box_rows = index.box(83.6, 83.9, -5.5, -5.2)
+
+    assert abs(len(rows) - len(box_rows)) < 5
+    assert len(np.intersect1d(rows, box_rows)) >= len(box_rows) - 5
+
+    # A triangle contains only about half of its bounding box
+    triangle = index.polygon([83.6, 83.9, 83.6], [-5.5, -5.5, -5.2])
+    assert 0.4 < len(triangle) / len(box_rows) < 0.6
+
+def test_nearest_match():
+
+    # Perturb a subset of the field by up to ~1 arcsec and match it back
+    primary = np.arange(0, 5000, 7)
+    ra1 = ra[primary] + random.uniform(-1, 1, len(primary))/3600
+    dec1 = dec[primary] + random.uniform(-1, 1, len(primary))/3600
+
+    match_index, separation = nearest_match(ra1, dec1, index, max_match=1.0)
+
+    for i in range(len(primary)):
+        sep = brute_force_separation(ra1[i], dec1[i]) * 3600
+        if sep.min() < 1.0:
+            assert match_index[i] == np.argmin(sep)
+            assert np.isclose(separation[i], sep.min())
+        else:
+            assert match_index[i] == -1 and np.isnan(separation[i])
+
+def test_match_diagnostics():
+
+    # A generous radius, so that many positions have several candidates
+    ra1 = 83.8 + random.uniform(-0.4, 0.4, 300)
+    dec1 = -5.4 + random.uniform(-0.4, 0.4, 300)
+    xyz1 = radec_to_xyz(np.radians(ra1), np.radians(dec1))
+
+    match_index, separation, n_candidates, second_separation = \
+        nearest_match_xyz(xyz1, index, 60, return_diagnostics=True)
+
+    assert (n_candidates > 2).any()
+
+    for i in range(len(ra1)):
+        sep = np.sort(brute_force_separation(ra1[i], dec1[i]) * 3600)
+        assert n_candidates[i] == (sep < 60).sum()
+        if n_candidates[i] >= 2:
+            assert np.isclose(second_separation[i], sep[1])
+        else:
+            assert np.isnan(second_separation[i])
+
+def test_match_modes():
+
+    # Crowded enough that plenty of primaries fight over secondaries
+    ra1 = 83.8 + random.uniform(-0.2, 0.2, 2000)
+    dec1 = -5.4 + random.uniform(-0.2, 0.2, 2000)
+
+    nearest, _ = nearest_match(ra1, dec1, index, 60)
+    mutual, _ = nearest_match(ra1, dec1, index, 60, mode='mutual')
+    one_to_one, separation = nearest_match(ra1, dec1, index, 60,
+                                           mode='one-to-one')
+
+    assert np.bincount(nearest[nearest >= 0]).max() > 1
+
+    # brute force: walk down every candidate pair, closest first
+    pairs = []
+    for i in range(len(ra1)):
+        sep = brute_force_separation(ra1[i], dec1[i]) * 3600
+        for j in np.where(sep < 60)[0]:
+            pairs.append((sep[j], i, j))
+    pairs.sort()
+
+    expected = -np.ones(len(ra1), dtype=int)
+    taken = set()
+    for sep, i, j in pairs:
+        if expected[i] == -1 and j not in taken:
+            expected[i] = j
+            taken.add(j)
+
+    assert (one_to_one == expected).all()
+    assert np.bincount(one_to_one[one_to_one >= 0]).max() == 1
+
+    # mutual matches are nearest matches that nobody closer claimed
+    closest_claimant = {}
+    for sep, i, j in pairs:
+        closest_claimant.setdefault(j, i)
+
+    kept = mutual >= 0
+    assert (mutual[kept] == nearest[kept]).all()
+    assert np.bincount(mutual[kept]).max() == 1
+    for i in np.where(nearest >= 0)[0]:
+        assert kept[i] == (closest_claimant[nearest[i]] == i)
+
+def test_save_load_subset():
+
+    import os
+    import tempfile
+
+    ids = np.arange(len(ra)) + 440000000000
+    bright = random.rand(len(ra)) < 0.3
+
+    filename = os.path.join(tempfile.mkdtemp(), "index.npz")
+    index.save(filename, ids=ids, subsets={'bright': bright})
+
+    loaded = SkyIndex.load(filename)
+
+    assert loaded.units == 'degrees'
+    assert (loaded.ids == ids).all()
+    assert (loaded.cone(83.8, -5.4, 0.1) == index.cone(83.8, -5.4, 0.1)).all()
+
+    # matching against a subset is matching against just those rows
+    subset = loaded.subset('bright')
+    direct = SkyIndex(ra[bright], dec[bright], units='degrees')
+
+    ra1 = 83.8 + random.uniform(-0.4, 0.4, 300)
+    dec1 = -5.4 + random.uniform(-0.4, 0.4, 300)
+
+    subset_match, subset_sep = nearest_match(ra1, dec1, subset, 30.)
+    direct_match, direct_sep = nearest_match(ra1, dec1, direct, 30.)
+
+    assert (subset_match == direct_match).all()
+    assert (subset.ids == ids[bright]).all()
+
+def test_propagate_radec():
+
+    ra0 = np.radians(ra[:1000])
+    dec0 = np.radians(dec[:1000])
+    pmra = random.uniform(-2000, 2000, 1000)
+    pmdec = random.uniform(-2000, 2000, 1000)
+    years = random.uniform(-20, 20, 1000)
+
+    ra1, dec1 = propagate_radec(ra0, dec0, pmra, pmdec, years)
+
+    # each star moves by |pm| * years, in the direction of its motion
+    moved = chord_to_angle(np.sqrt(((radec_to_xyz(ra1, dec1) - 
+                                     radec_to_xyz(ra0, dec0))**2).sum(axis=1)))
+    expected = np.hypot(pmra, pmdec) * np.abs(years)
+    assert np.allclose(np.degrees(moved) * 3.6e6, expected, rtol=1e-6)
+
+    # ...and (to within a few mas, over these tens of arcseconds) 
+    # pmdec moves it north and pmra east
+    assert np.allclose((dec1 - dec0), np.radians(pmdec * years / 3.6e6), 
+                       rtol=0, atol=np.radians(5 / 3.6e6))
+    assert np.allclose((ra1 - ra0) * np.cos(dec0), 
+                       np.radians(pmra * years / 3.6e6), 
+                       rtol=0, atol=np.radians(5 / 3.6e6))
+
+    # no motion, or no time, means no change
+    still_ra, still_dec = propagate_radec(ra0, dec0, np.nan, 0., years)
+    assert np.allclose(still_ra, ra0) and np.allclose(still_dec, dec0)
@@ -0,0 +1,268 @@
+from __future__ import division
+
+import numpy as np
+import atpy
+
+from tablemate_core import (TableParameters, SecondaryByPrimaryView,
+                            index_secondary_by_primary)
+
+
+def make_table(columns):
+
+    table = atpy.Table()
+    for name, values in columns:
+        table.add_column(name, np.asarray(values))
+    return table
+
+
+def old_index_secondary_by_primary(mated_table, secondary_table):
+    """ index_secondary_by_primary() as it was, to compare against. """
+
+    secondary_indexed_by_primary = atpy.Table()
+
+    for name in mated_table.columns.keys[:2]:
+        secondary_indexed_by_primary.add_column(name, mated_table[name])
+
+    indices = mated_table.data[secondary_table.alias+"_index"]
+
+    for column_name in secondary_table.data.columns.keys:
+        target_column = secondary_table.data[column_name]
+        column = target_column[indices]
+        if issubclass(target_column.dtype.type, np.integer):
+            column[indices == -1] = -9999
+        else:
+            column[indices == -1] = np.nan
+        secondary_indexed_by_primary.add_column(column_name, column)
+
+    return secondary_indexed_by_primary
+
+
+def make_match():
+
+    secondary_data = make_table([
+        ('ra', [83.1, 83.2, 83.3]),
+        ('dec', [-5.1, -5.2, -5.3]),
+        ('ID', np.array([7, 8, 9], dtype=np.int32)),
+        ('flag', np.array([True, False, True])),
+        ('name', np.array(['abc', 'de', 'fgh']))])
+    secondary = TableParameters(secondary_data, 'S', 'Secondary',
+                                ['ra'], ['dec'], 'decimal degrees', 'ID')
+
+    mated_table = make_table([
+        ('P_ID', [100, 101, 102, 103]),
+        ('P_index', [0, 1, 2, 3]),
+        ('S_ID', [9, -1, 7, -1]),
+        ('S_index', [2, -1, 0, -1])])
+
+    return mated_table, secondary
+
+
+def test_index_secondary_by_primary_unchanged():
+
+    mated_table, secondary = make_match()
+
+    new = index_secondary_by_primary(mated_table, secondary)
+    old = old_index_secondary_by_primary(mated_table, secondary)
+
+    assert new.columns.keys == old.columns.keys
+    for name in old.columns.keys:
+        assert new[name].dtype == old[name].dtype
+        assert not isinstance(new[name], np.ma.MaskedArray)
+        same = (new[name] == old[name])
+        if new[name].dtype.kind == 'f':
+            same |= np.isnan(new[name]) & np.isnan(old[name])
+        assert same.all(), name
+
+
+def test_secondary_by_primary_view():
+
+    mated_table, secondary = make_match()
+
+    view = index_secondary_by_primary(mated_table, secondary, lazy=True)
+    assert isinstance(view, SecondaryByPrimaryView)
+
+    assert len(view) == 4
+    assert view.keys() == ['P_ID', 'P_index', 'ra', 'dec', 'ID', 'flag',
+                           'name']
+    assert 'flag' in view and 'nope' not in view
+
+    # only what's asked for gets built, and only once
+    assert view._columns == {}
+    ids = view.ID
+    assert view['ID'] is ids
+    assert list(view._columns.keys()) == ['ID']
+
+    assert ids.dtype == np.int32
+    assert (ids.mask == [False, True, False, True]).all()
+    assert (ids.compressed() == [9, 7]).all()
+    # the old fill values are still there, under the mask
+    assert (ids.data[ids.mask] == -9999).all()
+    assert np.isnan(view.ra.data[1])
+    assert (view.name.data == ['fgh', 'nan', 'abc', 'nan']).all()
+    assert (view['P_ID'] == [100, 101, 102, 103]).all()
+
+    try:
+        view['nope']
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("unknown columns should raise KeyError")
+
+    matched = view.where(view.P_index >= 2)
+    assert len(matched) == 2
+    assert (matched.ID.mask == [False, True]).all()
+    assert (matched.P_ID == [102, 103]).all()
+
+    plain = view.materialize(masked=False)
+    old = old_index_secondary_by_primary(mated_table, secondary)
+    assert (plain['flag'] == old['flag']).all()
+    assert (plain['ID'] == old['ID']).all()
+
+    # what table_maker does with its views: .filled() gives back exactly
+    # the old columns, fill values and dtypes included
+    for name in old.columns.keys:
+        filled = np.ma.filled(view[name])
+        assert not isinstance(filled, np.ma.MaskedArray)
+        assert filled.dtype == old[name].dtype
+        same = (filled == old[name])
+        if filled.dtype.kind == 'f':
+            same |= np.isnan(filled) & np.isnan(old[name])
+        assert same.all(), name
+
+
+def test_partitioned_slices_match_separate_matches():
+
+    from tablemate_core import tablemater, tablemater_partitioned
+
+    random = np.random.RandomState(4)
+
+    n = 60
+    ra = 83.8 + random.uniform(-0.05, 0.05, n)
+    dec = -5.4 + random.uniform(-0.05, 0.05, n)
+    kind = np.array(list('PDX'))[random.randint(0, 3, n)]
+    parent_data = make_table([('RA', ra), ('DEC', dec), 
+                              ('Name', np.arange(n) + 500), 
+                              ('Class', kind)])
+    parent = TableParameters(parent_data, 'Parent', 'Parent', ['RA'], 
+                             ['DEC'], 'decimal degrees', 'Name')
+
+    # half the parent's stars, a little bit off, plus some strangers
+    other_ra = np.concatenate([ra[::2] + 1e-5, 
+                               83.8 + random.uniform(-0.05, 0.05, 20)])
+    other_dec = np.concatenate([dec[::2] - 1e-5,
+                                -5.4 + random.uniform(-0.05, 0.05, 20)])
+    other = TableParameters(
+        make_table([('RA', other_ra), ('DEC', other_dec), 
+                    ('ID', np.arange(len(other_ra)) + 9000)]),
+        'Other', 'Other', ['RA'], ['DEC'], 'decimal degrees', 'ID')
+
+    mated, partitions = tablemater_partitioned(
+        parent, [other], 'Class', values=['P', 'D'], 
+        aliases={'P': 'Slice_P'})
+
+    assert list(partitions.keys()) == ['P', 'D']
+
+    # without an alias: the parent's rows, under the parent's names
+    d = partitions['D']
+    assert d.columns.keys == mated.columns.keys
+    assert (d['Parent_index'] == np.where(kind == 'D')[0]).all()
+
+    # with one: just what matching the slice on its own gives
+    slice_p = TableParameters(parent_data.where(kind == 'P'), 'Slice_P', 
+                              'Slice_P', ['RA'], ['DEC'], 
+                              'decimal degrees', 'Name')
+    separate = tablemater(slice_p, [other])
+
+    p = partitions['P']
+    assert (p['Other_index'] != -1).any()
+    assert p.columns.keys == separate.columns.keys
+    for name in separate.columns.keys:
+        assert (np.asarray(p[name]) == np.asarray(separate[name])).all(), name
+
+
+def test_survey_index_filename_follows_contents(tmpdir):
+
+    from tablemate_core import (survey_index_filename, write_survey_index,
+                                IndexedSurvey)
+
+    random = np.random.RandomState(8)
+    ra = np.radians(83.8 + random.uniform(-0.1, 0.1, 50))
+    dec = np.radians(-5.4 + random.uniform(-0.1, 0.1, 50))
+    ids = np.arange(50) + 44000
+    bright = random.rand(50) < 0.5
+    directory = str(tmpdir)
+
+    def filename(ra=ra, dec=dec, ids=ids, bright=bright):
+        table = make_table([('RA', ra), ('DEC', dec), ('SOURCEID', ids)])
+        return survey_index_filename(table, directory, 'survey', 
+                                     subsets={'bright': bright})
+
+    original = filename()
+    assert original == filename()
+    assert original.startswith(directory) and original.endswith('.npz')
+
+    # remaking the table, or changing a subset, gives a different index
+    moved = ra.copy()
+    moved[3] += 1e-7
+    assert filename(ra=moved) != original
+    assert filename(ids=ids[::-1]) != original
+    assert filename(bright=~bright) != original
+
+    table = make_table([('RA', ra), ('DEC', dec), ('SOURCEID', ids)])
+    write_survey_index(table, original, subsets={'bright': bright})
+    survey = IndexedSurvey(original, 'S', 'Survey', subset='bright')
+    assert len(survey) == bright.sum()
+    assert (survey.names_at(np.arange(len(survey))) == ids[bright]).all()
+
+
+def test_tablemater_at_an_epoch(tmpdir):
+
+    from sky_index import propagate_radec
+    from tablemate_core import tablemater
+
+    random = np.random.RandomState(5)
+
+    # the same stars, seen in 2007 and by a 2016-epoch catalog with 
+    # proper motions big enough to spoil a plain 1" match
+    n = 100
+    ra = 83.8 + random.uniform(-0.15, 0.15, n)
+    dec = -5.4 + random.uniform(-0.15, 0.15, n)
+    pmra = random.uniform(-300, 300, n)
+    pmdec = random.uniform(-300, 300, n)
+    ra16, dec16 = propagate_radec(np.radians(ra), np.radians(dec), 
+                                  pmra, pmdec, 9.)
+    epochs = 2016. * np.ones(n)
+    epochs[:5] = np.nan
+
+    old = TableParameters(
+        make_table([('RA', ra), ('DEC', dec), ('ID', np.arange(n))]),
+        'old', 'old', ['RA'], ['DEC'], 'decimal degrees', 'ID')
+    new = TableParameters(
+        make_table([('ra', np.degrees(ra16)), ('dec', np.degrees(dec16)),
+                    ('pmra', pmra), ('pmdec', pmdec), ('ep', epochs),
+                    ('src', np.arange(n) + 7)]),
+        'new', 'new', ['ra'], ['dec'], 'decimal degrees', 'src',
+        pm_cols=['pmra', 'pmdec'], epoch='ep')
+
+    as_catalogued = tablemater(old, [new])
+    moved = tablemater(old, [new], epoch=2007., cache_dir=str(tmpdir))
+
+    fast = np.hypot(pmra, pmdec) * 9 > 1000   # further than max_match
+    assert fast.sum() > 80
+    assert (as_catalogued['new_index'][fast[5:].nonzero()[0] + 5] == 
+            -1).all()
+    # rows with no epoch stay put, so only the slow ones still match
+    assert (moved['new_index'][5:] == np.arange(5, n)).all()
+    assert ((moved['new_index'][:5] == np.arange(5)) == ~fast[:5]).all()
+
+    # the moved positions are cached, and so is the match
+    assert list(new._propagated.keys()) == [2007.]
+    again = tablemater(old, [new], epoch=2007., cache_dir=str(tmpdir))
+    assert (again['new_index'] == moved['new_index']).all()
+
+    try:
+        tablemater(old, [new], epoch=np.nan)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("a NaN epoch should be refused")
@@ -0,0 +1,86 @@
+from __future__ import division
+
+import numpy as np
+
+from tiling import TileLayout, TiledTable
+
+random = np.random.RandomState(11)
+
+
+class FakeTable(object):
+    """ Just enough of an atpy.Table for TiledTable. """
+
+    def __init__(self, ra, dec):
+        self.RA = ra
+        self.DEC = dec
+
+    def where(self, rows):
+        return FakeTable(self.RA[rows], self.DEC[rows])
+
+
+def test_grid_matches_old_tile_edges():
+
+    min_ra, max_ra = 83.4171, 84.294
+    min_dec, max_dec = -5.9624, -4.841
+
+    layout = TileLayout.grid(min_ra, max_ra, min_dec, max_dec)
+
+    # the edges exactly as filter_by_tile used to work them out
+    tile_size_ra = (max_ra - min_ra) / 4
+    tile_size_dec = (max_dec - min_dec) / 4
+    for i in range(4):
+        assert layout.ra_lower[i] == (min_ra + tile_size_ra*i + 
+                                      tile_size_ra/10)
+        assert layout.ra_upper[i] == (min_ra + tile_size_ra*(i+1) - 
+                                      tile_size_ra/10)
+        assert layout.dec_lower[i] == (min_dec + tile_size_dec*i + 
+                                       tile_size_dec/10)
+        assert layout.dec_upper[i] == (min_dec + tile_size_dec*(i+1) - 
+                                       tile_size_dec/10)
+
+
+def test_tiled_table_matches_old_where_scans():
+
+    min_ra, max_ra = 83.4171, 84.294
+    min_dec, max_dec = -5.9624, -4.841
+    ra = random.uniform(min_ra, max_ra, 3000)
+    dec = random.uniform(min_dec, max_dec, 3000)
+    # a few stars sitting right on tile edges, and some off the grid
+    layout = TileLayout.grid(min_ra, max_ra, min_dec, max_dec)
+    ra[:4] = layout.ra_lower
+    dec[4:8] = layout.dec_upper
+    ra[8:10] = [80., 90.]
+
+    table = FakeTable(ra, dec)
+    tiled = TiledTable(table, layout)
+
+    assert len(tiled) == 16
+    assert (tiled.tile[:10] == -1).all()
+
+    tile_size_ra = (max_ra - min_ra) / 4
+    tile_size_dec = (max_dec - min_dec) / 4
+    for ra_i in range(4):
+        for dec_j in range(4):
+            tile_min_ra = min_ra + tile_size_ra*ra_i + tile_size_ra/10
+            tile_max_ra = min_ra + tile_size_ra*(ra_i+1) - tile_size_ra/10
+            tile_min_dec = min_dec + tile_size_dec*dec_j + tile_size_dec/10
+            tile_max_dec = (min_dec + tile_size_dec*(dec_j+1) - 
+                            tile_size_dec/10)
+            expected = np.where((ra > tile_min_ra) & (ra < tile_max_ra) &
+                                (dec > tile_min_dec) & 
+                                (dec < tile_max_dec))[0]
+
+            assert (tiled.rows(ra_i*4 + dec_j) == expected).all()
+            assert (tiled[ra_i*4 + dec_j].RA == ra[expected]).all()
+
+    assert sum(len(t.RA) for t in tiled.tables()) == (tiled.tile >= 0).sum()
+
+
+def test_layout_rejects_overlaps():
+
+    try:
+        TileLayout([0, 1], [1.5, 2], [0], [1])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("overlapping tiles should be refused")
@@ -0,0 +1,83 @@
+from __future__ import division
+
+import numpy as np
+import atpy
+
+from variability_map import residual_map_cube, ResidualMapCube
+
+
+def make_table(**columns):
+
+    table = atpy.Table()
+    for name, column in columns.items():
+        table.add_column(name, np.asarray(column))
+    return table
+
+
+def make_photometry(sourceid, mjd, ra, dec, mag):
+
+    n = len(sourceid)
+    columns = dict(SOURCEID=sourceid, MEANMJDOBS=mjd, 
+                   RA=np.radians(ra), DEC=np.radians(dec))
+    for band in 'JHK':
+        columns[band+'APERMAG3'] = mag
+        columns[band+'PPERRBITS'] = np.zeros(n, dtype=int)
+    return make_table(**columns)
+
+
+def test_residual_map_cube():
+
+    ra_edges = np.array([83.0, 83.5, 84.0])
+    dec_edges = np.array([-6.5, -5.5, -4.5])
+
+    # star 1 sits exactly on the grid's lower-left corner, star 2 on 
+    # its upper-right corner, star 3 inside, and star 4 off the grid.
+    # (Edges chosen to survive the trip through radians exactly.)
+    spreadsheet = make_table(
+        SOURCEID=[1, 2, 3, 4],
+        RA=np.radians([83.0, 84.0, 83.2, 85.0]),
+        DEC=np.radians([-6.5, -4.5, -5.8, -5.2]),
+        j_meanr=[14., 15., 16., 14.], h_meanr=[14., 15., 16., 14.],
+        k_meanr=[14., 15., 16., 14.])
+
+    photometry = make_photometry(
+        sourceid=[1, 2, 3, 4, 1, 3, 99],
+        mjd=[55000., 55000., 55000., 55000., 55001., 55001., 55001.],
+        ra=[83.0, 84.0, 83.2, 85.0, 83.0, 83.2, 83.2],
+        dec=[-6.5, -4.5, -5.8, -5.2, -6.5, -5.8, -5.8],
+        mag=[14.1, 15.2, 16.3, 14.5, 13.9, 16.1, 12.0])
+
+    cube = residual_map_cube(photometry, spreadsheet, bands='k',
+                             ra_edges=ra_edges, dec_edges=dec_edges)
+
+    assert (cube['mjd'] == [55000., 55001.]).all()
+    counts = cube['k_count']
+    assert counts.shape == (2, 2, 2)
+    assert counts.sum() == 5
+    assert counts[0, 0, 0] == 2 and counts[0, 1, 1] == 1
+    assert np.allclose(cube['k_mean'][0, 0, 0], (0.1 + 0.3) / 2)
+    assert np.allclose(cube['k_mean'][1, 0, 0], (-0.1 + 0.1) / 2)
+    assert np.allclose(cube['k_mean'][0, 1, 1], 0.2)
+    assert np.isnan(cube['k_mean'][1, 1, 1])
+
+    maps = ResidualMapCube(cube)
+    deviation = maps.deviation('k', [55000., 55000., 55002.],
+                               np.radians([83.0, 85.0, 83.0]),
+                               np.radians([-6.5, -5.2, -6.5]))
+    assert np.allclose(deviation[0], 0.2)
+    assert np.isnan(deviation[1:]).all()
+
+
+def test_residual_map_cube_no_constant_stars():
+
+    spreadsheet = make_table(SOURCEID=np.zeros(0, dtype=int),
+                             RA=np.zeros(0), DEC=np.zeros(0),
+                             k_meanr=np.zeros(0))
+    photometry = make_photometry([1, 2], [55000., 55001.], [83.2, 83.3],
+                                 [-5.8, -5.7], [14., 15.])
+
+    cube = residual_map_cube(photometry, spreadsheet, bands='k')
+
+    assert cube['k_count'].shape[0] == 2
+    assert cube['k_count'].sum() == 0
+    assert np.isnan(cube['k_mean']).all()
@@ -0,0 +1,195 @@
+"""
+A module for splitting tables of WFCAM data into spatial tiles.
+
+WFCAM observes our field as a mosaic of tiles that overlap a little at
+their edges. Stars in the overlap regions get observed on a different
+schedule than the rest of their tile, so we often want to look at each
+tile separately, skipping those margins.
+
+`TileLayout` describes where the tiles are and assigns every row of a
+table to a tile (or to -1, for margins and anything outside the layout)
+in one pass; `TiledTable` keeps those assignments as a compact column
+and hands back each tile's rows by slicing.
+
+"""
+
+from __future__ import division
+
+import numpy as np
+
+
+class TileLayout(object):
+    """
+    A rectangular layout of tiles in RA and Dec.
+
+    Tiles are laid out on a (possibly irregular) grid: along each axis,
+    tile number `i` covers `lower[i] < x < upper[i]`. Tiles must not
+    overlap along either axis, but there may be gaps between them.
+    Tile IDs run over Dec fastest: tile `ra_i * n_dec + dec_j`.
+
+    """
+
+    def __init__(self, ra_lower, ra_upper, dec_lower, dec_upper):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        ra_lower, ra_upper : array_like
+            Lower and upper RA edge of each column of tiles, ascending.
+        dec_lower, dec_upper : array_like
+            Lower and upper Dec edge of each row of tiles, ascending.
+            Use the same units as the tables you'll be assigning.
+
+        """
+
+        self.ra_lower = np.asarray(ra_lower, dtype=np.float64)
+        self.ra_upper = np.asarray(ra_upper, dtype=np.float64)
+        self.dec_lower = np.asarray(dec_lower, dtype=np.float64)
+        self.dec_upper = np.asarray(dec_upper, dtype=np.float64)
+
+        for lower, upper in ((self.ra_lower, self.ra_upper),
+                             (self.dec_lower, self.dec_upper)):
+            if len(lower) != len(upper):
+                raise ValueError("Each tile needs a lower and upper edge.")
+            if (np.any(upper <= lower) or
+                np.any(lower[1:] < upper[:-1])):
+                raise ValueError("Tiles must be ascending and not overlap.")
+
+        self.n_ra = len(self.ra_lower)
+        self.n_dec = len(self.dec_lower)
+        self.n_tiles = self.n_ra * self.n_dec
+
+    @classmethod
+    def grid(cls, min_ra, max_ra, min_dec, max_dec, n_ra=4, n_dec=4,
+             margin=0.1):
+        """
+        Makes an evenly-spaced grid of tiles, trimmed by a margin.
+
+        Parameters
+        ----------
+        min_ra, max_ra, min_dec, max_dec : float
+            Outer edges of the whole grid.
+        n_ra, n_dec : int, optional
+            Number of tiles along each axis. Default 4 by 4.
+        margin : float, optional
+            Fraction of a tile's width to trim off each of its edges,
+            so that overlap regions are avoided. Default 0.1.
+
+        Returns
+        -------
+        layout : TileLayout
+
+        """
+
+        tile_size_ra = (max_ra - min_ra) / n_ra
+        tile_size_dec = (max_dec - min_dec) / n_dec
+
+        # Dividing (rather than multiplying by `margin`) makes the
+        # default margins exactly tile_size/10, to the last bit, as 
+        # filter_by_tile always had them: 1/0.1 is exactly 10.
+        trim_ra = tile_size_ra / (1 / margin)
+        trim_dec = tile_size_dec / (1 / margin)
+
+        ra_i = np.arange(n_ra)
+        dec_j = np.arange(n_dec)
+
+        ra_lower = min_ra + tile_size_ra*ra_i + trim_ra
+        ra_upper = min_ra + tile_size_ra*(ra_i+1) - trim_ra
+
+        dec_lower = min_dec + tile_size_dec*dec_j + trim_dec
+        dec_upper = min_dec + tile_size_dec*(dec_j+1) - trim_dec
+
+        return cls(ra_lower, ra_upper, dec_lower, dec_upper)
+
+    def _axis_index(self, x, lower, upper):
+        """ Which tile along one axis is each `x` in? (-1 for none) """
+
+        # largest i with lower[i] < x
+        i = np.searchsorted(lower, x, side='left') - 1
+        i_safe = np.clip(i, 0, len(lower)-1)
+
+        inside = (i >= 0) & (x > lower[i_safe]) & (x < upper[i_safe])
+
+        return np.where(inside, i, -1)
+
+    def assign(self, ra, dec):
+        """
+        Assigns each position to a tile.
+
+        Parameters
+        ----------
+        ra, dec : array_like
+            Coordinates of each row.
+
+        Returns
+        -------
+        tile : np.ndarray of int
+            Tile ID of each row, or -1 if the row falls in a margin
+            or outside the layout. Stored as compactly as possible.
+
+        """
+
+        ra_i = self._axis_index(np.asarray(ra), self.ra_lower, self.ra_upper)
+        dec_j = self._axis_index(np.asarray(dec),
+                                 self.dec_lower, self.dec_upper)
+
+        tile = np.where((ra_i >= 0) & (dec_j >= 0),
+                        ra_i * self.n_dec + dec_j, -1)
+
+        return tile.astype(np.min_scalar_type(-self.n_tiles))
+
+
+class TiledTable(object):
+    """
+    A table whose rows have been assigned to tiles.
+
+    The rows are sorted by tile once; each tile's rows are then a
+    contiguous slice of that ordering, located by `offsets`.
+
+    """
+
+    def __init__(self, table, layout):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        table : atpy.Table
+            Table with RA, DEC columns (in the units of `layout`).
+        layout : TileLayout
+            How to split the table up.
+
+        """
+
+        self.table = table
+        self.layout = layout
+
+        self.tile = layout.assign(table.RA, table.DEC)
+
+        # -1s sort to the front; mergesort keeps each tile in table order
+        self.order = np.argsort(self.tile, kind='mergesort')
+
+        counts = np.bincount(self.tile[self.tile >= 0],
+                             minlength=layout.n_tiles)
+        n_outside = len(self.tile) - counts.sum()
+
+        self.offsets = n_outside + np.concatenate(([0], np.cumsum(counts)))
+
+    def __len__(self):
+        return self.layout.n_tiles
+
+    def rows(self, tile_id):
+        """ Indices into `self.table` of the rows in tile `tile_id`. """
+
+        return self.order[self.offsets[tile_id]:self.offsets[tile_id+1]]
+
+    def __getitem__(self, tile_id):
+        """ Returns the sub-table of rows in tile `tile_id`. """
+
+        return self.table.where(self.rows(tile_id))
+
+    def tables(self):
+        """ Returns a list of every tile's sub-table, in tile order. """
+
+        return [self[k] for k in range(len(self))]
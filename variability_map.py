@@ -420,3 +420,208 @@ def exposure_grader(data, spreadsheet, band, min_mag=17):
             ratio[i] = 0
         
     return dates, n_const, ratio
+
+
+# The default grid for residual maps: the same patch of sky that
+# mapmaker() plots, in cells of 0.05 degrees (3 arcminutes).
+residual_map_ra_edges = np.linspace(83.2, 84.3, 23)
+residual_map_dec_edges = np.linspace(-5.95, -4.9, 22)
+
+def _cell_index(edges, x):
+    """
+    Which cell along one axis of a grid each `x` is in (-1 for none).
+
+    Cells include their lower edge, and the last cell its upper edge 
+    too (like np.histogram), so nothing on an edge falls through.
+
+    """
+
+    x = np.asarray(x)
+    i = np.searchsorted(edges, x, side='right') - 1
+    i[x == edges[-1]] = len(edges) - 2
+
+    return np.where((i >= 0) & (i < len(edges) - 1), i, -1)
+
+def residual_map_cube(data, spreadsheet, bands='jhk', min_mag=17,
+                      ra_edges=residual_map_ra_edges,
+                      dec_edges=residual_map_dec_edges):
+    """
+    Bins constant-star deviations onto an RA/Dec grid, per exposure.
+
+    This is the number-crunching half of mapmaker(): instead of a 
+    scatter plot per night, every exposure's deviations are averaged 
+    into the cells of a fixed grid, for all exposures at once (one 
+    histogram pass per band rather than a loop over nights and stars).
+
+    Parameters
+    ----------
+    data : atpy.Table
+        Table that contains all the photometry data.
+    spreadsheet : atpy.Table
+        Table that contains median photometry and stuff, for the 
+        constant stars only.
+    bands : str, optional
+        Which bands to map. Default 'jhk'.
+    min_mag : float, optional
+        Ignore datapoints fainter than this. Default 17.
+    ra_edges, dec_edges : array_like, optional
+        Cell edges of the grid, in decimal degrees.
+
+    Returns
+    -------
+    cube : dict
+        'mjd' : np.ndarray of the exposures' MEANMJDOBS (sorted);
+        'ra_edges', 'dec_edges' : the grid edges;
+        '<band>_mean' : float32 array (exposure x RA cell x Dec cell)
+            of the mean deviation from `<band>_meanr`, NaN where empty;
+        '<band>_count' : int32 array of how many stars went into each.
+
+    """
+
+    ra_edges = np.asarray(ra_edges, dtype=np.float64)
+    dec_edges = np.asarray(dec_edges, dtype=np.float64)
+    n_ra = len(ra_edges) - 1
+    n_dec = len(dec_edges) - 1
+    n_cells = n_ra * n_dec
+
+    mjd = np.unique(data.MEANMJDOBS)
+    n_exposures = len(mjd)
+
+    # Look up each spreadsheet star by SOURCEID and find its grid cell.
+    ref_order = np.argsort(spreadsheet.SOURCEID)
+    ref_sourceids = spreadsheet.SOURCEID[ref_order]
+
+    ref_ra_i = _cell_index(ra_edges, np.degrees(spreadsheet.RA))
+    ref_dec_j = _cell_index(dec_edges, np.degrees(spreadsheet.DEC))
+    ref_cell = np.where((ref_ra_i >= 0) & (ref_dec_j >= 0),
+                        ref_ra_i * n_dec + ref_dec_j, -1)[ref_order]
+
+    cube = {'mjd': mjd, 'ra_edges': ra_edges, 'dec_edges': dec_edges}
+
+    for band in bands:
+
+        col = band.upper()+"APERMAG3"
+        bandmean = band.lower()+"_meanr"
+
+        # relevant data
+        rdata = band_cut(data, band, max_flag=256)
+        rdata = rdata.where(rdata.data[col] < min_mag)
+
+        ref_i = np.searchsorted(ref_sourceids, rdata.SOURCEID)
+        if len(ref_sourceids) > 0:
+            ref_i[ref_i == len(ref_sourceids)] = 0
+            is_constant = ref_sourceids[ref_i] == rdata.SOURCEID
+        else:
+            # no constant stars at all: every cell stays empty
+            is_constant = np.zeros(len(ref_i), dtype=bool)
+
+        ref_rows = ref_order[ref_i[is_constant]]
+        cell = ref_cell[ref_i[is_constant]]
+        exposure = np.searchsorted(mjd, rdata.MEANMJDOBS[is_constant])
+
+        deviation = (rdata.data[col][is_constant] - 
+                     spreadsheet.data[bandmean][ref_rows])
+
+        on_grid = cell >= 0
+        flat_bin = (exposure * n_cells + cell)[on_grid]
+
+        counts = np.bincount(flat_bin, minlength=n_exposures * n_cells)
+        sums = np.bincount(flat_bin, deviation[on_grid],
+                           minlength=n_exposures * n_cells)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = sums / counts
+
+        shape = (n_exposures, n_ra, n_dec)
+        cube[band+'_mean'] = mean.reshape(shape).astype(np.float32)
+        cube[band+'_count'] = counts.reshape(shape).astype(np.int32)
+
+    return cube
+
+
+def write_residual_map_cube(cube, filename):
+    """ Saves the output of residual_map_cube() as a compressed .npz. """
+
+    np.savez_compressed(filename, **cube)
+
+
+class ResidualMapCube(object):
+    """
+    Spatial systematics per exposure, as computed by residual_map_cube().
+
+    Load one with `ResidualMapCube(filename)` and ask it for the 
+    deviation of any band, at any exposure, at any position -- without
+    touching the photometry again.
+
+    """
+
+    def __init__(self, cube):
+        """
+        Initializing method.
+
+        Parameters
+        ----------
+        cube : dict or str
+            Output of residual_map_cube(), or the name of a file written
+            by write_residual_map_cube().
+
+        """
+
+        if isinstance(cube, str):
+            cube = dict(np.load(cube))
+
+        self.cube = cube
+        self.mjd = cube['mjd']
+        self.ra_edges = cube['ra_edges']
+        self.dec_edges = cube['dec_edges']
+
+    def map(self, band, mjd):
+        """ Returns the (RA cell x Dec cell) mean-deviation map of one exposure. """
+
+        exposure = np.searchsorted(self.mjd, mjd)
+
+        if exposure == len(self.mjd) or self.mjd[exposure] != mjd:
+            raise ValueError("No exposure at MJD %s" % str(mjd))
+
+        return self.cube[band.lower()+'_mean'][exposure]
+
+    def deviation(self, band, mjd, ra, dec):
+        """
+        Looks up the local mean deviation for many datapoints at once.
+
+        Parameters
+        ----------
+        band : str {'j'|'h'|'k'}
+            Which band to use.
+        mjd : array_like
+            MEANMJDOBS of each datapoint.
+        ra, dec : array_like
+            Position of each datapoint, in radians (like our tables).
+
+        Returns
+        -------
+        deviation : np.ndarray
+            Mean deviation of the constant stars in the same grid cell 
+            and exposure; NaN off the grid or where there is no data.
+
+        """
+
+        mean = self.cube[band.lower()+'_mean']
+        n_exposures, n_ra, n_dec = mean.shape
+
+        mjd = np.atleast_1d(mjd)
+        deviation = np.nan * np.ones(len(mjd))
+        if n_exposures == 0:
+            return deviation
+
+        exposure = np.searchsorted(self.mjd, mjd)
+        exposure_safe = np.clip(exposure, 0, n_exposures-1)
+
+        ra_i = _cell_index(self.ra_edges, np.degrees(np.atleast_1d(ra)))
+        dec_j = _cell_index(self.dec_edges, np.degrees(np.atleast_1d(dec)))
+
+        valid = (self.mjd[exposure_safe] == mjd) & (ra_i >= 0) & (dec_j >= 0)
+
+        deviation[valid] = mean[exposure[valid], ra_i[valid], dec_j[valid]]
+
+        return deviation
@@ -12,6 +12,7 @@ import atpy
 
 from tablemate_comparisons import ukvar_spread
 from official_star_counter import maxvars, autovars_true
+from tiling import TileLayout, TiledTable
 
 dropbox_bo_data = os.path.expanduser("~/Dropbox/Bo_Tom/data/")
 
@@ -21,6 +22,22 @@ source_photometry = atpy.Table(
 variables_photometry = source_photometry.where(
     np.in1d(source_photometry.SOURCEID, ukvar_spread.SOURCEID))
 
+def maxvars_tile_layout():
+    """
+    The 4x4 tile layout of our field, skipping 10% margins on each edge.
+
+    Uses the spatial extent of the `maxvars` spreadsheet to figure out
+    where the bounds of the tiles are.
+
+    """
+
+    return TileLayout.grid(maxvars.RA.min(), maxvars.RA.max(),
+                           maxvars.DEC.min(), maxvars.DEC.max(),
+                           n_ra=4, n_dec=4, margin=0.1)
+
+# We only assign tiles once per session; see `filter_by_tile()`.
+_tiled_tables = {}
+
 def filter_by_tile():
     """
     Splits the input data tables into 16 tiles, avoiding overlap regions.
@@ -41,41 +58,14 @@ def filter_by_tile():
         
     """
 
-    vp = variables_photometry
-
-    max_ra = maxvars.RA.max()
-    min_ra = maxvars.RA.min()
-    max_dec = maxvars.DEC.max()
-    min_dec = maxvars.DEC.min()
-
-    tile_size_ra = (max_ra - min_ra) / 4
-    tile_size_dec = (max_dec - min_dec) / 4
-
-    tile_tables = []
-    tile_spreadsheets = []
-    
-    for ra_i in range(4):
-
-        for dec_j in range(4):
-
-            tile_min_ra = min_ra + tile_size_ra*ra_i + tile_size_ra/10
-            tile_max_ra = min_ra + tile_size_ra*(ra_i+1) - tile_size_ra/10
-
-            tile_min_dec = min_dec + tile_size_dec*dec_j + tile_size_dec/10
-            tile_max_dec = min_dec + tile_size_dec*(dec_j+1) - tile_size_dec/10
-
-            tile_photometry = vp.where(
-                (vp.RA > tile_min_ra) & (vp.RA < tile_max_ra) &
-                (vp.DEC > tile_min_dec) & (vp.DEC < tile_max_dec) )
+    if not _tiled_tables:
+        layout = maxvars_tile_layout()
 
-            tile_spreadsheet = ukvar_spread.where(
-                (ukvar_spread.RA > tile_min_ra) & 
-                (ukvar_spread.RA < tile_max_ra) &
-                (ukvar_spread.DEC > tile_min_dec) & 
-                (ukvar_spread.DEC < tile_max_dec) )
+        _tiled_tables['photometry'] = TiledTable(variables_photometry, layout)
+        _tiled_tables['spreadsheet'] = TiledTable(ukvar_spread, layout)
 
-            tile_tables.append(tile_photometry)
-            tile_spreadsheets.append(tile_spreadsheet)
+    tile_tables = _tiled_tables['photometry'].tables()
+    tile_spreadsheets = _tiled_tables['spreadsheet'].tables()
 
     return tile_tables, tile_spreadsheets
 